@@ -2,12 +2,18 @@
 """
 PenPals Application Entry Point
 Simple wrapper around main.py for deployment and production use.
+
+    python src/app.py                                   # development server
+    python src/app.py --server gunicorn --workers 4     # pre-forked WSGI workers
+    python src/app.py --server uvicorn --workers 4      # ASGI workers
 """
 
+import argparse
 import os
 import sys
+import threading
 from app.helper import PenpalsHelper
-from app.main import application
+from app.main import create_app, warmup
 
 def find_available_port():
     """Find an available port for the application"""
@@ -17,8 +23,45 @@ def find_available_port():
         return 5001
     return port
 
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="PenPals backend server")
+    parser.add_argument('--warmup', action='store_true',
+                        help="Load the database schema, ChromaDB and the embedding model in the background "
+                             "at startup; /api/health/ready fails until this has finished")
+    parser.add_argument('--server', choices=['dev', 'gunicorn', 'uvicorn'],
+                        default=os.environ.get('SERVER', 'dev'),
+                        help="dev: single-process Flask server; gunicorn: pre-forked WSGI workers; "
+                             "uvicorn: ASGI workers")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes for gunicorn/uvicorn")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="Threads per gunicorn worker")
+    return parser.parse_args()
+
+def run_production_server(args, host, port):
+    """Replace this process with gunicorn, or run uvicorn workers"""
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    if args.warmup:
+        # Read by every worker's create_app()
+        os.environ['REQUIRE_WARMUP'] = 'True'
+    
+    if args.server == 'gunicorn':
+        command = ['gunicorn', '-c', os.path.join(src_dir, 'gunicorn.conf.py'),
+                   '--pythonpath', src_dir, '--bind', f"{host}:{port}"]
+        if args.workers:
+            command += ['--workers', str(args.workers)]
+        if args.threads:
+            command += ['--threads', str(args.threads)]
+        command.append('wsgi:application')
+        os.execvp(command[0], command)
+    
+    import uvicorn
+    uvicorn.run('asgi:application', host=host, port=port, workers=args.workers or 1, app_dir=src_dir)
+
 def main():
     """Main application entry point"""
+    args = parse_args()
     
     # Determine port
     port = int(os.environ.get('PORT', find_available_port()))
@@ -26,10 +69,22 @@ def main():
     debug = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     
     print(f"Starting PenPals backend server...")
+    print(f"Server: {args.server}")
     print(f"Host: {host}")
     print(f"Port: {port}")
     print(f"Debug mode: {debug}")
     
+    if args.server != 'dev':
+        run_production_server(args, host, port)
+        return
+    
+    config = {'REQUIRE_WARMUP': True} if args.warmup else None
+    application = create_app(config)
+    
+    if args.warmup:
+        # Serve liveness probes right away while the model loads
+        threading.Thread(target=warmup, args=(application,), name="warmup", daemon=True).start()
+    
     try:
         application.run(host=host, port=port, debug=debug)
     except KeyboardInterrupt:
@@ -3,12 +3,15 @@ Account management endpoints for teacher accounts.
 Handles account CRUD operations, password updates, and multi-classroom management.
 """
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash
 from ..model import db
 from ..model.account import Account
 from ..helper import PenpalsHelper
+from ..streaming import JsonStream
+from ..repository.account_repository import AccountRepository
+from ..repository.profile_repository import ProfileRepository
+from ..security.password_service import PasswordServiceBusy, password_service
 
 account_bp = Blueprint('account', __name__)
 
@@ -16,7 +19,7 @@ account_bp = Blueprint('account', __name__)
 @account_bp.route('/api/account', methods=['GET'])
 @jwt_required()
 def get_account():
-    """Get current account details with all classrooms"""
+    """Get current account details with one page of classrooms (?limit=&cursor=)"""
     try:
         account_id = get_jwt_identity()
         account = Account.query.get(account_id)
@@ -24,10 +27,15 @@ def get_account():
         if not account:
             return jsonify({"msg": "Account not found"}), 404
         
-        classrooms = []
-        for classroom in account.classrooms:
-            classroom_data = PenpalsHelper.format_classroom_response(classroom)
-            classrooms.append(classroom_data)
+        try:
+            limit, cursor = PenpalsHelper.parse_page_args(
+                request.args, current_app.config['DEFAULT_PAGE_SIZE'], current_app.config['MAX_PAGE_SIZE']
+            )
+        except ValueError as e:
+            return jsonify({"msg": str(e)}), 400
+        
+        profiles, next_cursor = ProfileRepository.get_account_profiles(account.id, limit, cursor)
+        classrooms = [PenpalsHelper.format_classroom_response(classroom) for classroom in profiles]
         
         return jsonify({
             "account": {
@@ -35,9 +43,10 @@ def get_account():
                 "email": account.email,
                 "organization": account.organization,
                 "created_at": account.created_at.isoformat(),
-                "classroom_count": len(classrooms)
+                "classroom_count": ProfileRepository.count_account_profiles(account.id)
             },
-            "classrooms": classrooms
+            "classrooms": classrooms,
+            "next_cursor": next_cursor
         }), 200
     
     except Exception as e:
@@ -79,28 +88,21 @@ def update_account():
         
         if 'password' in data:
             password = data['password']
-            if not password or len(password) < 8:
+            failures = password_service.policy_failures(password or '')
+            if 'length' in failures:
                 return jsonify({"msg": "Password must be at least 8 characters long"}), 400
             
             # Enhanced password validation
-            capital_letters = [chr(i) for i in range(ord('A'), ord('Z')+1)]
-            lowercase_letters = [chr(i) for i in range(ord('a'), ord('z')+1)]
-            digits = [str(i) for i in range(10)]
-            
-            has_upper = any(c in capital_letters for c in password)
-            has_lower = any(c in lowercase_letters for c in password)
-            has_digit = any(c in digits for c in password)
-            has_special = any(
-                c not in capital_letters and c not in lowercase_letters and c not in digits
-                for c in password
-            )
-            
-            if not (has_upper and has_lower and has_digit and has_special):
+            if failures:
                 return jsonify({
                     "msg": "Password must include one uppercase, one lowercase, one digit, and one special character."
                 }), 400
             
-            account.password_hash = generate_password_hash(password)
+            try:
+                account.password_hash = password_service.hash(password)
+            except PasswordServiceBusy:
+                db.session.rollback()
+                return jsonify({"msg": "Server busy, please try again"}), 503
         
         db.session.commit()
         
@@ -130,10 +132,11 @@ def delete_account():
             return jsonify({"msg": "Account not found"}), 404
         
         # Get classroom count for confirmation
-        classroom_count = account.classrooms.count()
+        classroom_count = ProfileRepository.count_account_profiles(account.id)
         
         db.session.delete(account)
         db.session.commit()
+        AccountRepository.invalidate(account_id)
         
         return jsonify({
             "msg": "Account deleted successfully",
@@ -148,7 +151,10 @@ def delete_account():
 @account_bp.route('/api/account/classrooms', methods=['GET'])
 @jwt_required()
 def get_account_classrooms():
-    """Get all classrooms for the current account with enhanced details"""
+    """
+    Get one page of classrooms for the current account with enhanced details (?limit=&cursor=).
+    With ?stream=true all classrooms after the cursor are streamed as NDJSON.
+    """
     try:
         account_id = get_jwt_identity()
         account = Account.query.get(account_id)
@@ -156,18 +162,40 @@ def get_account_classrooms():
         if not account:
             return jsonify({"msg": "Account not found"}), 404
         
-        classrooms = []
-        for classroom in account.classrooms:
-            friends_count = classroom.sent_relations.count()
-            classroom_data = PenpalsHelper.format_classroom_response(classroom)
-            classroom_data["friends_count"] = friends_count
-            classrooms.append(classroom_data)
+        try:
+            limit, cursor = PenpalsHelper.parse_page_args(
+                request.args, current_app.config['DEFAULT_PAGE_SIZE'], current_app.config['MAX_PAGE_SIZE']
+            )
+        except ValueError as e:
+            return jsonify({"msg": str(e)}), 400
+        
+        if JsonStream.requested(request.args.get('stream')):
+            def stream_classrooms():
+                for rows in AccountRepository.iter_classroom_pages(
+                        account.id, current_app.config['STREAM_BATCH_SIZE'], cursor):
+                    for classroom, friends_count in rows:
+                        classroom_data = PenpalsHelper.format_classroom_response(classroom)
+                        classroom_data["friends_count"] = friends_count
+                        yield classroom_data
+            
+            return JsonStream.ndjson(stream_classrooms())
+        
+        page = AccountRepository.get_cached_classrooms(account.id, cursor, limit)
+        if page is None:
+            rows, next_cursor = AccountRepository.get_classrooms_with_friend_counts(account.id, limit, cursor)
+            classrooms = []
+            for classroom, friends_count in rows:
+                classroom_data = PenpalsHelper.format_classroom_response(classroom)
+                classroom_data["friends_count"] = friends_count
+                classrooms.append(classroom_data)
+            page = {
+                "classrooms": classrooms,
+                "total_count": ProfileRepository.count_account_profiles(account.id),
+                "next_cursor": next_cursor
+            }
+            AccountRepository.cache_classrooms(account.id, cursor, limit, page)
         
-        return jsonify({
-            "classrooms": classrooms,
-            "total_count": len(classrooms),
-            "account_id": account.id
-        }), 200
+        return jsonify(dict(page, account_id=account.id)), 200
     
     except Exception as e:
         return jsonify({"msg": "Internal server error", "error": str(e)}), 500
@@ -184,20 +212,13 @@ def get_account_stats():
         if not account:
             return jsonify({"msg": "Account not found"}), 404
         
-        total_classrooms = account.classrooms.count()
-        total_connections = 0
-        all_interests = set()
-        
-        for classroom in account.classrooms:
-            total_connections += classroom.sent_relations.count()
-            if classroom.interests:
-                all_interests.update(classroom.interests)
+        stats = AccountRepository.get_account_stats(account.id)
         
         return jsonify({
             "account_id": account.id,
-            "total_classrooms": total_classrooms,
-            "total_connections": total_connections,
-            "unique_interests": len(all_interests),
+            "total_classrooms": stats["total_classrooms"],
+            "total_connections": stats["total_connections"],
+            "unique_interests": stats["unique_interests"],
             "account_created": account.created_at.isoformat()
         }), 200
     
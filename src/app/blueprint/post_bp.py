@@ -0,0 +1,341 @@
+"""
+Post feed endpoints.
+Classrooms post messages; feeds list a profile's own posts or its friends'
+posts newest first, keyset-paginated with an opaque cursor.
+"""
+
+from datetime import datetime
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..model import db
+from ..model.post import Post
+from ..model.profile import Profile
+from ..helper import PenpalsHelper
+from ..chromadb.chromadb_service import ChromaDBService
+from ..chromadb.embedding_cache import embedding_cache
+from ..repository.post_repository import PostRepository
+from ..search.post_index import PostIndex
+from ..worker.coalescing_queue import CoalescingWorkQueue
+
+post_bp = Blueprint('post', __name__)
+
+POST_MAX_LENGTH = 5000
+POST_SEARCH_MAX_RESULTS = 100
+
+chroma_service = ChromaDBService(collection_name="penpal_posts", embedding_cache=embedding_cache)
+post_index = PostIndex(chroma_service)
+
+# Posts are embedded in the background so writes do not wait on the embedding model
+# (configured from POST_INDEX_WORKERS and POST_INDEX_OUTBOX_PATH by create_app)
+post_index_queue = CoalescingWorkQueue("post-index")
+post_index_queue.register_handler("upsert", post_index.upsert)
+post_index_queue.register_handler("delete", post_index.delete)
+post_index_queue.register_handler("delete_profile", post_index.delete_profiles)
+
+
+def queue_post_index(post):
+    """
+    Schedule embedding of a new or edited post.
+    
+    Args:
+        post: Post model instance with an assigned ID
+    """
+    post_index_queue.enqueue(PostIndex.document_id(post.id), "upsert", PostIndex.job_payload(post))
+
+
+def queue_post_removal(post_id):
+    """
+    Schedule removal of a deleted post from the index.
+    
+    Args:
+        post_id: Post ID
+    """
+    post_index_queue.enqueue(PostIndex.document_id(post_id), "delete")
+
+
+def queue_profile_posts_removal(profile_id):
+    """
+    Schedule removal of every post of a deleted profile from the index.
+    
+    Args:
+        profile_id: Profile ID
+    """
+    post_index_queue.enqueue(f"profile_posts_{profile_id}", "delete_profile", profile_id)
+
+
+def _parse_time(value):
+    """Parse an optional ISO 8601 timestamp from request data"""
+    if value in (None, ''):
+        return None
+    if not isinstance(value, str):
+        raise ValueError("since and until must be ISO 8601 timestamps")
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError("since and until must be ISO 8601 timestamps")
+
+
+@post_bp.cli.command('reindex')
+def reindex_posts_command():
+    """Embed every post that is missing from the post index or changed since it was indexed"""
+    totals = {"embedded": 0, "skipped": 0}
+    batch = []
+    for post in Post.query.order_by(Post.id).yield_per(256):
+        batch.append((PostIndex.document_id(post.id), PostIndex.job_payload(post)))
+        if len(batch) == 256:
+            for key, count in post_index.upsert(batch).items():
+                totals[key] += count
+            batch = []
+    if batch:
+        for key, count in post_index.upsert(batch).items():
+            totals[key] += count
+    print(f"Embedded {totals['embedded']} posts, {totals['skipped']} already up to date")
+
+
+def _page_args():
+    """Read the page size and the decoded post cursor from the query string"""
+    return PenpalsHelper.parse_page_args(
+        request.args, current_app.config['DEFAULT_PAGE_SIZE'], current_app.config['MAX_PAGE_SIZE'],
+        cursor_type=PostRepository.decode_cursor
+    )
+
+
+@post_bp.route('/api/profiles/<int:profile_id>/posts', methods=['POST'])
+@jwt_required()
+def create_post(profile_id):
+    """Publish a post as a profile (only owner can post)"""
+    try:
+        account_id = get_jwt_identity()
+        profile = Profile.query.get(profile_id)
+        
+        if not profile:
+            return jsonify({"msg": "Profile not found"}), 404
+        
+        if profile.account_id != int(account_id):
+            return jsonify({"msg": "Not authorized to post as this profile"}), 403
+        
+        data = request.json
+        if not data:
+            return jsonify({"msg": "No data provided"}), 400
+        
+        content = data.get('content')
+        if not isinstance(content, str) or not content.strip():
+            return jsonify({"msg": "content must be a non-empty string"}), 400
+        if len(content) > POST_MAX_LENGTH:
+            return jsonify({"msg": f"content too long (max {POST_MAX_LENGTH} characters)"}), 400
+        
+        post = Post(profile_id=profile.id, content=content.strip())
+        db.session.add(post)
+        db.session.commit()
+        PostRepository.invalidate_follower_timelines(profile.id)
+        queue_post_index(post)
+        
+        return jsonify({
+            "msg": "Post created successfully",
+            "post": PenpalsHelper.format_post_response(post, profile)
+        }), 201
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"msg": "Internal server error", "error": str(e)}), 500
+
+
+@post_bp.route('/api/profiles/<int:profile_id>/posts', methods=['GET'])
+@jwt_required()
+def get_profile_posts(profile_id):
+    """Get one page of a profile's posts, newest first (?limit=&cursor=)"""
+    try:
+        profile = Profile.query.get(profile_id)
+        
+        if not profile:
+            return jsonify({"msg": "Profile not found"}), 404
+        
+        try:
+            limit, cursor = _page_args()
+        except ValueError as e:
+            return jsonify({"msg": str(e)}), 400
+        
+        rows, next_cursor = PostRepository.get_profile_posts(profile.id, limit, cursor)
+        
+        return jsonify({
+            "profile_id": profile.id,
+            "posts": [PenpalsHelper.format_post_response(post, author) for post, author in rows],
+            "next_cursor": next_cursor
+        }), 200
+    
+    except Exception as e:
+        return jsonify({"msg": "Internal server error", "error": str(e)}), 500
+
+
+@post_bp.route('/api/profiles/<int:profile_id>/timeline', methods=['GET'])
+@jwt_required()
+def get_profile_timeline(profile_id):
+    """Get one page of the posts of a profile's friends, newest first (?limit=&cursor=; only owner can view)"""
+    try:
+        account_id = get_jwt_identity()
+        profile = Profile.query.get(profile_id)
+        
+        if not profile:
+            return jsonify({"msg": "Profile not found"}), 404
+        
+        if profile.account_id != int(account_id):
+            return jsonify({"msg": "Not authorized to view the timeline of this profile"}), 403
+        
+        try:
+            limit, cursor = _page_args()
+        except ValueError as e:
+            return jsonify({"msg": str(e)}), 400
+        
+        cached = False
+        if cursor is None and limit <= PostRepository.TIMELINE_HEAD_SIZE:
+            # First pages come from the per-profile head, which is cached when enabled
+            head = PostRepository.get_cached_timeline_head(profile.id)
+            cached = head is not None
+            if head is None:
+                rows, next_cursor = PostRepository.get_timeline(profile.id, PostRepository.TIMELINE_HEAD_SIZE)
+                head = {
+                    "posts": [PenpalsHelper.format_post_response(post, author) for post, author in rows],
+                    "cursors": [PostRepository.encode_cursor(post) for post, _ in rows],
+                    "next_cursor": next_cursor
+                }
+                PostRepository.cache_timeline_head(profile.id, head)
+            page = PostRepository.slice_timeline_head(head, limit)
+        else:
+            rows, next_cursor = PostRepository.get_timeline(profile.id, limit, cursor)
+            page = {
+                "posts": [PenpalsHelper.format_post_response(post, author) for post, author in rows],
+                "next_cursor": next_cursor
+            }
+        
+        return jsonify(dict(page, profile_id=profile.id, cached=cached)), 200
+    
+    except Exception as e:
+        return jsonify({"msg": "Internal server error", "error": str(e)}), 500
+
+
+@post_bp.route('/api/posts/<int:post_id>', methods=['PUT'])
+@jwt_required()
+def update_post(post_id):
+    """Edit a post's content (only the owner of the author profile can edit)"""
+    try:
+        account_id = get_jwt_identity()
+        post = Post.query.get(post_id)
+        
+        if not post:
+            return jsonify({"msg": "Post not found"}), 404
+        
+        if post.profile.account_id != int(account_id):
+            return jsonify({"msg": "Not authorized to edit this post"}), 403
+        
+        data = request.json
+        if not data:
+            return jsonify({"msg": "No data provided"}), 400
+        
+        content = data.get('content')
+        if not isinstance(content, str) or not content.strip():
+            return jsonify({"msg": "content must be a non-empty string"}), 400
+        if len(content) > POST_MAX_LENGTH:
+            return jsonify({"msg": f"content too long (max {POST_MAX_LENGTH} characters)"}), 400
+        
+        post.content = content.strip()
+        db.session.commit()
+        PostRepository.invalidate_follower_timelines(post.profile_id)
+        queue_post_index(post)
+        
+        return jsonify({
+            "msg": "Post updated successfully",
+            "post": PenpalsHelper.format_post_response(post, post.profile)
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"msg": "Internal server error", "error": str(e)}), 500
+
+
+@post_bp.route('/api/posts/search', methods=['POST'])
+@jwt_required()
+def search_posts():
+    """
+    Semantic search over posts, optionally scoped to classrooms and a time window
+    Expected JSON format:
+    {
+        "query": "search text",
+        "n_results": 10,  // optional, defaults to 10
+        "profile_ids": [1, 2],  // optional, only posts by these profiles
+        "since": "2024-01-01T00:00:00",  // optional, ISO 8601 (UTC when no offset)
+        "until": "2024-02-01T00:00:00"  // optional
+    }
+    """
+    try:
+        data = request.json
+        if not data or not isinstance(data.get('query'), str) or not data['query'].strip():
+            return jsonify({"msg": "query must be a non-empty string"}), 400
+        
+        n_results = data.get('n_results', 10)
+        if not isinstance(n_results, int) or n_results < 1:
+            return jsonify({"msg": "n_results must be a positive integer"}), 400
+        n_results = min(n_results, POST_SEARCH_MAX_RESULTS)
+        
+        profile_ids = data.get('profile_ids')
+        if profile_ids is None and data.get('profile_id') is not None:
+            profile_ids = [data['profile_id']]
+        if profile_ids is not None and (
+                not isinstance(profile_ids, list) or not all(isinstance(pid, int) for pid in profile_ids)):
+            return jsonify({"msg": "profile_ids must be a list of integers"}), 400
+        
+        try:
+            since = _parse_time(data.get('since'))
+            until = _parse_time(data.get('until'))
+        except ValueError as e:
+            return jsonify({"msg": str(e)}), 400
+        
+        result = post_index.search(data['query'].strip(), n_results, profile_ids, since, until)
+        if result['status'] != 'success':
+            return jsonify({"msg": "Search failed", "error": result.get('message')}), 500
+        
+        hydrated, missing_post_ids = PostRepository.hydrate_search_hits(result['results'])
+        # Posts deleted while their removal was pending are dropped from the index now
+        for missing_id in missing_post_ids:
+            queue_post_removal(missing_id)
+        
+        posts = []
+        for hit, post, author in hydrated:
+            post_data = PenpalsHelper.format_post_response(post, author)
+            post_data["similarity"] = round(hit["similarity"], 4)
+            posts.append(post_data)
+        
+        return jsonify({
+            "results": posts,
+            "total_results": len(posts),
+            "missing_post_ids": missing_post_ids
+        }), 200
+    
+    except Exception as e:
+        return jsonify({"msg": "Internal server error", "error": str(e)}), 500
+
+
+@post_bp.route('/api/posts/<int:post_id>', methods=['DELETE'])
+@jwt_required()
+def delete_post(post_id):
+    """Delete a post (only the owner of the author profile can delete)"""
+    try:
+        account_id = get_jwt_identity()
+        post = Post.query.get(post_id)
+        
+        if not post:
+            return jsonify({"msg": "Post not found"}), 404
+        
+        if post.profile.account_id != int(account_id):
+            return jsonify({"msg": "Not authorized to delete this post"}), 403
+        
+        author_id = post.profile_id
+        db.session.delete(post)
+        db.session.commit()
+        PostRepository.invalidate_follower_timelines(author_id)
+        queue_post_removal(post_id)
+        
+        return jsonify({"msg": "Post deleted successfully"}), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"msg": "Internal server error", "error": str(e)}), 500
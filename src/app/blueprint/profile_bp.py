@@ -4,17 +4,227 @@ Handles profile CRUD operations, semantic interest matching via ChromaDB,
 and automatic bidirectional connections between profiles.
 """
 
-from flask import Blueprint, jsonify, request
+import json
+import os
+import numpy as np
+from flask import Blueprint, current_app, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.exc import IntegrityError
 from ..model import db
 from ..model.account import Account
+from ..model.profile import Profile
+from ..model.relation import Relation
 from ..helper import PenpalsHelper
+from ..streaming import JsonStream
 from ..chromadb.chromadb_service import ChromaDBService
+from ..chromadb.embedding_cache import EmbeddingCache, embedding_cache
+from ..repository.profile_repository import ProfileRepository
+from ..repository.account_repository import AccountRepository
+from ..repository.post_repository import PostRepository
+from .post_bp import post_index, post_index_queue, queue_profile_posts_removal
+from ..worker.coalescing_queue import CoalescingWorkQueue
+from ..cache.ttl_cache import VersionedTTLCache
+from ..search.profile_search import ProfileSearchPipeline
+from ..search.interest_vocabulary import interest_vocabulary
+from ..search.suggestions import SuggestionEngine
+from ..repository.suggestion_repository import SuggestionRepository
 
 
 profile_bp = Blueprint('profile', __name__)
 
-chroma_service = ChromaDBService(persist_directory="./chroma_db", collection_name="profile_interests")
+# Interests come from a small, constantly repeating vocabulary, so embeddings are cached by content
+chroma_service = ChromaDBService(collection_name="profile_interests", embedding_cache=embedding_cache)
+
+# Ranking weights default to SEARCH_WEIGHTS, e.g. "semantic=0.5,interests=0.2,distance=0.2,availability=0.1"
+search_pipeline = ProfileSearchPipeline(
+    chroma_service,
+    weights=os.getenv('SEARCH_WEIGHTS') or None,
+    overfetch=int(os.getenv('SEARCH_OVERFETCH', str(ProfileSearchPipeline.DEFAULT_OVERFETCH))),
+    distance_scale_km=float(os.getenv('SEARCH_DISTANCE_SCALE_KM', '1000'))
+)
+
+# Search results, invalidated by bumping the version on every profile or index write
+# (size, TTL and store come from SEARCH_CACHE_* and CACHE_STORE in init_app)
+search_cache = VersionedTTLCache(maxsize=512, ttl=60.0)
+
+# Upper bound on (from, to) pairs accepted by one bulk connection request
+BULK_CONNECTIONS_MAX_PAIRS = int(os.getenv('BULK_CONNECTIONS_MAX_PAIRS', '500'))
+
+# Interest re-indexing runs in the background so profile writes do not wait on embedding
+# (configured from REINDEX_WORKERS and REINDEX_OUTBOX_PATH by create_app)
+reindex_queue = CoalescingWorkQueue("profile-reindex")
+
+
+def _upsert_profile_documents(jobs):
+    """Embed the latest interests of every queued profile in one batch"""
+    result = chroma_service.upsert_batch(
+        [payload["document"] for _, payload in jobs],
+        [payload["metadata"] for _, payload in jobs],
+        [key for key, _ in jobs]
+    )
+    search_cache.bump_version()
+    if result['status'] != 'success':
+        raise RuntimeError(result.get('message'))
+
+
+def _delete_profile_documents(jobs):
+    """Remove queued profiles from the interest index"""
+    result = chroma_service.delete_documents([key for key, _ in jobs])
+    search_cache.bump_version()
+    if result['status'] != 'success':
+        raise RuntimeError(result.get('message'))
+
+
+def _job_profile_ids(jobs):
+    """Profile IDs of re-index jobs, which are keyed profile_<id>"""
+    return [int(key.rpartition('_')[2]) for key, _ in jobs]
+
+
+def _reindex_queued_profiles(jobs):
+    """Queue handler: index profiles, then refresh the suggestions their new entries affect"""
+    _upsert_profile_documents(jobs)
+    for profile_id in _job_profile_ids(jobs):
+        queue_suggestion_change(profile_id)
+
+
+def _remove_queued_profiles(jobs):
+    """Queue handler: remove profiles from the index, then refresh the suggestions listing them"""
+    _delete_profile_documents(jobs)
+    for profile_id in _job_profile_ids(jobs):
+        queue_suggestion_change(profile_id)
+
+
+reindex_queue.register_handler("upsert", _reindex_queued_profiles)
+reindex_queue.register_handler("delete", _remove_queued_profiles)
+
+# Suggested penpals are materialized per profile and refreshed in the background
+suggestion_engine = SuggestionEngine(
+    search_pipeline,
+    top_k=int(os.getenv('SUGGESTIONS_TOP_K', str(SuggestionEngine.DEFAULT_TOP_K)))
+)
+
+# Configured from SUGGESTION_WORKERS and SUGGESTION_OUTBOX_PATH by create_app
+suggestion_queue = CoalescingWorkQueue("profile-suggestions")
+suggestion_queue.register_handler("refresh", suggestion_engine.handle_jobs)
+
+
+def _refresh_changed_suggestions(jobs):
+    """Queue handler: refresh changed profiles, then every other list they can appear in"""
+    for profile_id in suggestion_engine.handle_change_jobs(jobs):
+        queue_suggestion_refresh(profile_id)
+
+
+suggestion_queue.register_handler("changed", _refresh_changed_suggestions)
+
+
+def queue_suggestion_refresh(profile_id):
+    """
+    Schedule recomputation of a profile's suggested penpals.
+    
+    Args:
+        profile_id: Profile ID
+    """
+    suggestion_queue.enqueue(f"suggest_{profile_id}", "refresh", profile_id)
+
+
+def queue_suggestion_change(profile_id):
+    """
+    Schedule recomputation of a changed profile's suggested penpals and of
+    every other profile's list it appears in or may now rank in.
+    
+    Args:
+        profile_id: Profile ID
+    """
+    suggestion_queue.enqueue(f"suggest_changed_{profile_id}", "changed", profile_id)
+
+
+def profile_index_metadata(profile):
+    """
+    Metadata stored with a profile's interests, used by search pre-filters.
+    Unknown coordinates and class sizes are left out, since ChromaDB cannot filter on null.
+    
+    Args:
+        profile: Profile model instance with an assigned ID
+    
+    Returns:
+        Metadata dictionary
+    """
+    metadata = {
+        "profile_id": profile.id,
+        "account_id": profile.account_id,
+        "profile_name": profile.name,
+        "location": profile.location or ""
+    }
+    if profile.latitude is not None and profile.longitude is not None:
+        metadata["latitude"] = float(profile.latitude)
+        metadata["longitude"] = float(profile.longitude)
+    if profile.class_size is not None:
+        metadata["class_size"] = int(profile.class_size)
+    return metadata
+
+
+def queue_profile_reindex(profile):
+    """
+    Schedule (re-)indexing of a profile's interests.
+    Profiles without interests are removed from the index instead.
+    
+    Args:
+        profile: Profile model instance with an assigned ID
+    """
+    if not profile.interests:
+        queue_profile_removal(profile.id)
+        return
+    reindex_queue.enqueue(f"profile_{profile.id}", "upsert", {
+        "document": " ".join(profile.interests),
+        "metadata": profile_index_metadata(profile)
+    })
+
+
+def queue_profile_removal(profile_id):
+    """
+    Schedule removal of a profile from the interest index.
+    
+    Args:
+        profile_id: Profile ID
+    """
+    reindex_queue.enqueue(f"profile_{profile_id}", "delete")
+
+
+@profile_bp.cli.command('reindex')
+def reindex_profiles_command():
+    """Rebuild the interest index (and its filter metadata) for every profile"""
+    upserts, deletes = [], []
+    for profile in Profile.query.order_by(Profile.id).yield_per(256):
+        key = f"profile_{profile.id}"
+        if profile.interests:
+            upserts.append((key, {
+                "document": " ".join(profile.interests),
+                "metadata": profile_index_metadata(profile)
+            }))
+        else:
+            deletes.append((key, None))
+    
+    for start in range(0, len(upserts), 256):
+        _upsert_profile_documents(upserts[start:start + 256])
+    if deletes:
+        _delete_profile_documents(deletes)
+    print(f"Reindexed {len(upserts)} profiles, removed {len(deletes)} without interests")
+
+
+@profile_bp.cli.command('suggest')
+def refresh_suggestions_command():
+    """Recompute suggested penpals for every profile"""
+    profile_ids = [profile_id for (profile_id,) in db.session.query(Profile.id).order_by(Profile.id)]
+    for start in range(0, len(profile_ids), 100):
+        suggestion_engine.refresh(profile_ids[start:start + 100])
+    print(f"Refreshed suggestions of {len(profile_ids)} profiles")
+
+
+@profile_bp.cli.command('retry-dead-letters')
+def retry_dead_letters_command():
+    """Queue the background jobs that ran out of retries again"""
+    for queue in (reindex_queue, suggestion_queue, post_index_queue):
+        print(f"{queue.name}: queued {queue.retry_dead_letters()} dead letters again")
 
 
 @profile_bp.route('/api/profiles', methods=['POST'])
@@ -69,33 +279,21 @@ def create_profile():
             account_id=account.id,
             name=name,
             location=data.get('location', '').strip() or None,
-            lattitude=latitude,  # keeping original typo for consistency
-            longitude=longitude,
+            latitude=PenpalsHelper.parse_coordinate(latitude),
+            longitude=PenpalsHelper.parse_coordinate(longitude),
             class_size=class_size,
             availability=availability,
             interests=interests
         )
         
         db.session.add(profile)
-        db.session.flush()
+        db.session.commit()
+        AccountRepository.invalidate(account_id)
+        search_cache.bump_version()
         
-        # Store interests in ChromaDB for semantic matching
+        # Store interests in ChromaDB for semantic matching; suggestions are refreshed once indexed
         if interests:
-            interests_text = " ".join(interests)
-            chroma_result = chroma_service.add_documents(
-                documents=[interests_text],
-                metadatas=[{
-                    "profile_id": profile.id,
-                    "profile_name": profile.name,
-                    "location": profile.location or ""
-                }],
-                ids=[f"profile_{profile.id}"]
-            )
-            
-            if chroma_result['status'] != 'success':
-                print(f"ChromaDB add warning: {chroma_result.get('message')}")
-        
-        db.session.commit()
+            queue_profile_reindex(profile)
         
         profile_data = PenpalsHelper.format_profile_response(profile)
         
@@ -146,6 +344,9 @@ def update_profile(profile_id):
             return jsonify({"msg": "No data provided"}), 400
         
         old_interests = profile.interests or []
+        old_name = profile.name
+        old_metadata = profile_index_metadata(profile)
+        old_match_fields = (profile.latitude, profile.longitude, profile.location, profile.availability)
         
         # Validate and update fields
         if 'name' in data:
@@ -161,12 +362,12 @@ def update_profile(profile_id):
             profile.location = location.strip() if location else None
         
         if 'latitude' in data or 'longitude' in data:
-            new_lat = data.get('latitude', profile.lattitude)
+            new_lat = data.get('latitude', profile.latitude)
             new_lng = data.get('longitude', profile.longitude)
             if not PenpalsHelper.validate_coordinates(new_lat, new_lng):
                 return jsonify({"msg": "Invalid coordinates"}), 400
-            profile.lattitude = new_lat
-            profile.longitude = new_lng
+            profile.latitude = PenpalsHelper.parse_coordinate(new_lat)
+            profile.longitude = PenpalsHelper.parse_coordinate(new_lng)
         
         if 'class_size' in data:
             class_size = data['class_size']
@@ -190,29 +391,24 @@ def update_profile(profile_id):
             interests = PenpalsHelper.sanitize_interests(raw_interests)
             profile.interests = interests
         
-        # Update ChromaDB if interests changed
         new_interests = profile.interests or []
-        if old_interests != new_interests:
-            try:
-                # Delete old entry
-                chroma_service.delete_documents([f"profile_{profile.id}"])
-                
-                # Add new entry if interests exist
-                if new_interests:
-                    interests_text = " ".join(new_interests)
-                    chroma_service.add_documents(
-                        documents=[interests_text],
-                        metadatas=[{
-                            "profile_id": profile.id,
-                            "profile_name": profile.name,
-                            "location": profile.location or ""
-                        }],
-                        ids=[f"profile_{profile.id}"]
-                    )
-            except Exception as e:
-                print(f"ChromaDB update error: {e}")
+        index_changed = old_interests != new_interests or old_metadata != profile_index_metadata(profile)
+        match_fields = (profile.latitude, profile.longitude, profile.location, profile.availability)
+        suggestions_changed = old_interests != new_interests or old_match_fields != match_fields
         
         db.session.commit()
+        AccountRepository.invalidate(account_id)
+        search_cache.bump_version()
+        # Cached timeline heads of friends show the author's name
+        if profile.name != old_name:
+            PostRepository.invalidate_follower_timelines(profile.id)
+        
+        # Update ChromaDB if interests (or the metadata stored with them) changed;
+        # suggestions depending on the profile are refreshed once it is re-indexed
+        if index_changed:
+            queue_profile_reindex(profile)
+        elif suggestions_changed:
+            queue_suggestion_change(profile.id)
         
         profile_data = PenpalsHelper.format_profile_response(profile)
         
@@ -241,16 +437,23 @@ def delete_profile(profile_id):
             return jsonify({"msg": "Not authorized to delete this profile"}), 403
         
         # Get connection count for confirmation
-        connections_count = profile.sent_relations.count()
-        
-        # Remove from ChromaDB
-        try:
-            chroma_service.delete_documents([f"profile_{profile.id}"])
-        except Exception as e:
-            print(f"ChromaDB delete error: {e}")
+        connections_count = ProfileRepository.count_friends(profile.id)
+        friend_account_ids = ProfileRepository.get_friend_account_ids(profile.id)
+        friend_ids = ProfileRepository.get_friend_ids(profile.id)
+        # Suggestion rows are deleted with the profile, so find the lists it was in first
+        linked_profile_ids = SuggestionRepository.get_linked_profile_ids([profile.id])
         
         db.session.delete(profile)
         db.session.commit()
+        AccountRepository.invalidate(account_id, *friend_account_ids)
+        PostRepository.invalidate_timelines(*friend_ids)
+        search_cache.bump_version()
+        for linked_profile_id in linked_profile_ids:
+            queue_suggestion_refresh(linked_profile_id)
+        
+        # Remove from ChromaDB
+        queue_profile_removal(profile_id)
+        queue_profile_posts_removal(profile_id)
         
         return jsonify({
             "msg": "Profile deleted successfully",
@@ -265,7 +468,13 @@ def delete_profile(profile_id):
 @profile_bp.route('/api/profiles/search', methods=['POST'])
 @jwt_required()
 def search_profiles():
-    """Search for profiles by interests using semantic search"""
+    """
+    Search for profiles by interests.
+    Optional filters: latitude/longitude (or profile_id to search from a classroom),
+    max_distance_km, min_class_size, max_class_size, location and availability.
+    Results are ranked by a weighted mix of semantic similarity, interest overlap,
+    distance and availability overlap; `weights` overrides the configured weights.
+    """
     try:
         data = request.json
         if not data:
@@ -287,47 +496,163 @@ def search_profiles():
         if not search_query:
             return jsonify({"msg": "No valid interests provided"}), 400
         
-        # Search using ChromaDB
-        result = chroma_service.query_documents(search_query, n_results)
+        # Searching from a classroom defaults to its coordinates and availability
+        profile_id = data.get('profile_id')
+        if profile_id is not None:
+            origin = Profile.query.get(profile_id)
+            if not origin:
+                return jsonify({"msg": "Profile not found"}), 404
+            data = dict(data)
+            if data.get('latitude') is None and data.get('longitude') is None:
+                data['latitude'], data['longitude'] = origin.latitude, origin.longitude
+            if not data.get('availability'):
+                data['availability'] = origin.availability
+        
+        try:
+            filters = ProfileSearchPipeline.parse_filters(data)
+            weights = ProfileSearchPipeline.parse_weights(data['weights']) if data.get('weights') else None
+        except ValueError as e:
+            return jsonify({"msg": str(e)}), 400
+        
+        cache_key = (
+            isinstance(interests, list),
+            EmbeddingCache.normalize(search_query),
+            n_results,
+            profile_id,
+            json.dumps(filters, sort_keys=True),
+            json.dumps(weights, sort_keys=True)
+        )
+        cache_version = search_cache.version
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            return jsonify(dict(cached, cached=True)), 200
+        
+        manual_terms = search_interests if isinstance(interests, list) else [search_query]
+        result = search_pipeline.search(search_query, manual_terms, n_results, filters, weights,
+                                        exclude_profile_ids=[profile_id] if profile_id is not None else None)
         
         if result['status'] != 'success':
             return jsonify({"msg": "Search failed", "error": result.get('message')}), 500
         
-        # Get profile details from database
         matched_profiles = []
-        if result.get('results'):
-            for search_result in result['results']:
-                metadata = search_result['metadata']
-                profile_id = metadata['profile_id']
-                profile = Profile.query.get(profile_id)
-                
-                if profile:
-                    profile_data = PenpalsHelper.format_profile_response(profile)
-                    profile_data["similarity_score"] = round(search_result['similarity'], 3)
-                    
-                    # Add manual similarity calculation as well
-                    manual_similarity = PenpalsHelper.calculate_interest_similarity(
-                        search_interests if isinstance(interests, list) else [search_query],
-                        profile.interests or []
-                    )
-                    profile_data["manual_similarity"] = round(manual_similarity, 3)
-                    
-                    matched_profiles.append(profile_data)
-        
-        return jsonify({
+        for profile, scores in result['results']:
+            profile_data = PenpalsHelper.format_profile_response(profile)
+            profile_data["score"] = round(scores["score"], 3)
+            profile_data["similarity_score"] = round(scores["semantic"], 3)
+            profile_data["manual_similarity"] = round(scores["interests"], 3)
+            profile_data["availability_overlap"] = round(scores["availability"], 3)
+            if scores["distance_km"] is not None:
+                profile_data["distance_km"] = round(scores["distance_km"], 2)
+            matched_profiles.append(profile_data)
+        
+        missing_profile_ids = result['missing_profile_ids']
+        # Profiles deleted while their removal was pending are dropped from the index now
+        for missing_id in missing_profile_ids:
+            queue_profile_removal(missing_id)
+        
+        response = {
             "matched_profiles": matched_profiles,
             "search_query": search_query,
-            "total_results": len(matched_profiles)
-        }), 200
+            "total_results": len(matched_profiles),
+            "candidates": result['candidates'],
+            "missing_profile_ids": missing_profile_ids,
+            "weights": {key: round(value, 3) for key, value in result['weights'].items()},
+            "timings_ms": result['timings_ms'],
+            "cached": False
+        }
+        search_cache.set(cache_key, response, cache_version)
+        
+        return jsonify(response), 200
         
     except Exception as e:
         return jsonify({"msg": "Search error", "error": str(e)}), 500
 
 
+@profile_bp.route('/api/profiles/nearby', methods=['GET'])
+@jwt_required()
+def get_nearby_profiles():
+    """
+    Find the classrooms closest to a point
+    Query parameters: either `profile_id`, or `latitude` and `longitude`;
+    `radius_km` (default 100) and `limit` (default 20, max 100) are optional.
+    """
+    try:
+        profile_id = request.args.get('profile_id', type=int)
+        radius_km = request.args.get('radius_km', 100.0, type=float)
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        
+        if profile_id is not None:
+            profile = Profile.query.get(profile_id)
+            if not profile:
+                return jsonify({"msg": "Profile not found"}), 404
+            latitude, longitude = profile.latitude, profile.longitude
+            if latitude is None or longitude is None:
+                return jsonify({"msg": "Profile has no coordinates"}), 400
+        else:
+            latitude = request.args.get('latitude')
+            longitude = request.args.get('longitude')
+            if not PenpalsHelper.validate_coordinates(latitude, longitude):
+                return jsonify({"msg": "Invalid coordinates"}), 400
+            latitude, longitude = PenpalsHelper.parse_coordinate(latitude), PenpalsHelper.parse_coordinate(longitude)
+            if latitude is None or longitude is None:
+                return jsonify({"msg": "profile_id or latitude and longitude are required"}), 400
+        
+        if radius_km <= 0 or limit < 1:
+            return jsonify({"msg": "radius_km and limit must be positive"}), 400
+        
+        nearby = ProfileRepository.find_nearby(latitude, longitude, radius_km, limit,
+                                               exclude_profile_id=profile_id)
+        
+        profiles = []
+        for profile, distance in nearby:
+            profile_data = PenpalsHelper.format_profile_response(profile)
+            profile_data["distance_km"] = round(distance, 2)
+            profiles.append(profile_data)
+        
+        return jsonify({
+            "center": {"latitude": latitude, "longitude": longitude},
+            "radius_km": radius_km,
+            "profiles": profiles,
+            "total_results": len(profiles)
+        }), 200
+    
+    except Exception as e:
+        return jsonify({"msg": "Internal server error", "error": str(e)}), 500
+
+
+@profile_bp.route('/api/profiles/search/cache', methods=['GET'])
+@jwt_required()
+def get_search_cache_stats():
+    """Get hit/miss counters of the search result cache"""
+    try:
+        return jsonify({"search_cache": search_cache.stats()}), 200
+    
+    except Exception as e:
+        return jsonify({"msg": "Internal server error", "error": str(e)}), 500
+
+
+@profile_bp.route('/api/profiles/index/status', methods=['GET'])
+@jwt_required()
+def get_index_status():
+    """Get depth and lag of the background re-index queues"""
+    try:
+        return jsonify({
+            "queue": reindex_queue.status(),
+            "suggestion_queue": suggestion_queue.status(),
+            "post_index_queue": post_index_queue.status(),
+            "post_index": post_index.stats(),
+            "embedding_cache": embedding_cache.stats(),
+            "interest_vocabulary": interest_vocabulary.stats()
+        }), 200
+    
+    except Exception as e:
+        return jsonify({"msg": "Internal server error", "error": str(e)}), 500
+
+
 @profile_bp.route('/api/profiles/<int:profile_id>/connect', methods=['POST'])
 @jwt_required()
 def connect_profiles(profile_id):
-    """Add a profile as a friend (automatic bidirectional connection)"""
+    """Add a profile as a friend (one symmetric friendship row)"""
     try:
         account_id = get_jwt_identity()
         data = request.json
@@ -354,22 +679,28 @@ def connect_profiles(profile_id):
         if from_profile_id == profile_id:
             return jsonify({"msg": "Cannot connect profile to itself"}), 400
         
-        # Check if friendship already exists
-        existing_relation = Relation.query.filter_by(
-            from_profile_id=from_profile_id,
-            to_profile_id=profile_id
+        # A friendship is a single row in canonical (lower ID, higher ID) order
+        low_id, high_id = Relation.canonical_pair(from_profile_id, profile_id)
+        existing_relation = db.session.query(Relation.id).filter_by(
+            from_profile_id=low_id,
+            to_profile_id=high_id
         ).first()
         
         if existing_relation:
             return jsonify({"msg": "Profiles are already friends"}), 409
         
-        # Create bidirectional friendship
-        relation1 = Relation(from_profile_id=from_profile_id, to_profile_id=profile_id)
-        relation2 = Relation(from_profile_id=profile_id, to_profile_id=from_profile_id)
-        
-        db.session.add(relation1)
-        db.session.add(relation2)
-        db.session.commit()
+        db.session.add(Relation(from_profile_id=low_id, to_profile_id=high_id))
+        SuggestionRepository.delete_pair(from_profile_id, profile_id)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent request created the same friendship
+            db.session.rollback()
+            return jsonify({"msg": "Profiles are already friends"}), 409
+        AccountRepository.invalidate(account_id, to_profile.account_id)
+        PostRepository.invalidate_timelines(from_profile_id, profile_id)
+        queue_suggestion_refresh(from_profile_id)
+        queue_suggestion_refresh(profile_id)
         
         return jsonify({
             "msg": "Profiles are now friends!",
@@ -388,42 +719,102 @@ def connect_profiles(profile_id):
 @profile_bp.route('/api/profiles/<int:profile_id>/friends', methods=['GET'])
 @jwt_required()
 def get_profile_friends(profile_id):
-    """Get all friends for a profile"""
+    """
+    Get one page of a profile's friends (?limit=&cursor=), sorted by interest similarity within the page.
+    With ?stream=true all friends after the cursor are streamed as NDJSON in connection order.
+    """
     try:
         profile = Profile.query.get(profile_id)
         
         if not profile:
             return jsonify({"msg": "Profile not found"}), 404
         
-        friends = []
-        for relation in profile.sent_relations:
-            friend = relation.to_profile
-            friend_data = {
-                "id": friend.id,
-                "name": friend.name,
-                "location": friend.location,
-                "class_size": friend.class_size,
-                "interests": friend.interests,
-                "friends_since": relation.created_at.isoformat()
-            }
-            
-            # Calculate interest similarity
-            similarity = PenpalsHelper.calculate_interest_similarity(
-                profile.interests or [],
-                friend.interests or []
+        try:
+            limit, cursor = PenpalsHelper.parse_page_args(
+                request.args, current_app.config['DEFAULT_PAGE_SIZE'], current_app.config['MAX_PAGE_SIZE']
             )
-            friend_data["interest_similarity"] = round(similarity, 3)
+        except ValueError as e:
+            return jsonify({"msg": str(e)}), 400
+        
+        if JsonStream.requested(request.args.get('stream')):
+            def stream_friends():
+                for rows in ProfileRepository.iter_friend_pages(
+                        profile.id, current_app.config['STREAM_BATCH_SIZE'], cursor):
+                    similarities = interest_vocabulary.jaccard_many(
+                        profile.interests, [friend.interests for _, friend in rows]
+                    )
+                    for (relation, friend), similarity in zip(rows, similarities):
+                        friend_data = PenpalsHelper.format_friend_response(relation, friend)
+                        friend_data["interest_similarity"] = round(float(similarity), 3)
+                        yield friend_data
             
-            friends.append(friend_data)
+            return JsonStream.ndjson(stream_friends())
+        
+        friend_rows, next_cursor = ProfileRepository.get_friends(profile.id, limit=limit, cursor=cursor)
+        
+        # Score every friend against the profile in one vectorized pass
+        similarities = interest_vocabulary.jaccard_many(
+            profile.interests, [friend.interests for _, friend in friend_rows]
+        )
         
         # Sort friends by similarity score (descending)
-        friends.sort(key=lambda x: x["interest_similarity"], reverse=True)
+        friends = []
+        for i in np.argsort(-similarities, kind='stable'):
+            relation, friend = friend_rows[i]
+            friend_data = PenpalsHelper.format_friend_response(relation, friend)
+            friend_data["interest_similarity"] = round(float(similarities[i]), 3)
+            friends.append(friend_data)
         
         return jsonify({
             "profile_id": profile_id,
             "profile_name": profile.name,
             "friends": friends,
-            "friends_count": len(friends)
+            "friends_count": len(friends),
+            "next_cursor": next_cursor
+        }), 200
+    
+    except Exception as e:
+        return jsonify({"msg": "Internal server error", "error": str(e)}), 500
+
+
+@profile_bp.route('/api/profiles/<int:profile_id>/suggestions', methods=['GET'])
+@jwt_required()
+def get_profile_suggestions(profile_id):
+    """Get the precomputed suggested penpals of a profile (only owner can view)"""
+    try:
+        account_id = get_jwt_identity()
+        profile = Profile.query.get(profile_id)
+        
+        if not profile:
+            return jsonify({"msg": "Profile not found"}), 404
+        
+        if profile.account_id != int(account_id):
+            return jsonify({"msg": "Not authorized to view suggestions for this profile"}), 403
+        
+        limit = min(request.args.get('limit', suggestion_engine.top_k, type=int), suggestion_engine.top_k)
+        if limit < 1:
+            return jsonify({"msg": "limit must be a positive integer"}), 400
+        
+        rows = SuggestionRepository.get_suggestions(profile.id, limit)
+        
+        # Profiles created before suggestions existed are computed on first request
+        pending = not rows and bool(profile.interests)
+        if pending:
+            queue_suggestion_refresh(profile.id)
+        
+        suggestions = []
+        for suggestion, suggested in rows:
+            suggestion_data = PenpalsHelper.format_profile_response(suggested)
+            suggestion_data["rank"] = suggestion.rank
+            suggestion_data["score"] = round(suggestion.score, 3)
+            suggestions.append(suggestion_data)
+        
+        return jsonify({
+            "profile_id": profile_id,
+            "suggestions": suggestions,
+            "total_results": len(suggestions),
+            "computed_at": rows[0][0].computed_at.isoformat() if rows else None,
+            "pending": pending
         }), 200
     
     except Exception as e:
@@ -451,29 +842,138 @@ def disconnect_profiles(profile_id):
         if not from_profile or from_profile.account_id != int(account_id):
             return jsonify({"msg": "Not authorized to disconnect from this profile"}), 403
         
-        # Find and delete both directions of the relationship
-        relation1 = Relation.query.filter_by(
-            from_profile_id=from_profile_id,
-            to_profile_id=profile_id
-        ).first()
-        
-        relation2 = Relation.query.filter_by(
-            from_profile_id=profile_id,
-            to_profile_id=from_profile_id
-        ).first()
+        # Delete the single friendship row in one statement
+        low_id, high_id = Relation.canonical_pair(from_profile_id, profile_id)
+        deleted = Relation.query.filter_by(
+            from_profile_id=low_id,
+            to_profile_id=high_id
+        ).delete(synchronize_session=False)
         
-        if not relation1 and not relation2:
+        if not deleted:
+            db.session.rollback()
             return jsonify({"msg": "No friendship exists between these profiles"}), 404
         
-        if relation1:
-            db.session.delete(relation1)
-        if relation2:
-            db.session.delete(relation2)
+        to_account_id = db.session.query(Profile.account_id).filter_by(id=profile_id).scalar()
         
         db.session.commit()
+        AccountRepository.invalidate(account_id, to_account_id)
+        PostRepository.invalidate_timelines(from_profile_id, profile_id)
+        # The ex-friends become suggestion candidates again
+        queue_suggestion_refresh(from_profile_id)
+        queue_suggestion_refresh(profile_id)
         
         return jsonify({"msg": "Profiles disconnected successfully"}), 200
     
     except Exception as e:
         db.session.rollback()
         return jsonify({"msg": "Internal server error", "error": str(e)}), 500
+
+
+@profile_bp.route('/api/profiles/connections/bulk', methods=['POST'])
+@jwt_required()
+def bulk_update_connections():
+    """
+    Connect and disconnect many profile pairs in one transaction
+    Body: {"connect": [{"from_profile_id": 1, "to_profile_id": 2}, ...], "disconnect": [...]}
+    Every from_profile_id must belong to the current account. Each pair gets its own
+    status in `results`; the response is 207 when some pairs were rejected.
+    """
+    try:
+        account_id = int(get_jwt_identity())
+        data = request.json
+        
+        if not data:
+            return jsonify({"msg": "No data provided"}), 400
+        
+        requests_by_action = {action: data.get(action) or [] for action in ('connect', 'disconnect')}
+        if not all(isinstance(pairs, list) for pairs in requests_by_action.values()):
+            return jsonify({"msg": "connect and disconnect must be lists of pairs"}), 400
+        
+        total_pairs = sum(len(pairs) for pairs in requests_by_action.values())
+        if total_pairs == 0:
+            return jsonify({"msg": "No pairs provided"}), 400
+        if total_pairs > BULK_CONNECTIONS_MAX_PAIRS:
+            return jsonify({"msg": f"Too many pairs (max {BULK_CONNECTIONS_MAX_PAIRS})"}), 400
+        
+        # Parse every pair, keeping request order for the response
+        results = []
+        for action, pairs in requests_by_action.items():
+            for pair in pairs:
+                result = {"action": action}
+                try:
+                    result["from_profile_id"] = int(pair['from_profile_id'])
+                    result["to_profile_id"] = int(pair['to_profile_id'])
+                except (KeyError, TypeError, ValueError):
+                    result["status"] = "invalid"
+                results.append(result)
+        
+        # Ownership and existence of every profile in one query
+        owners = ProfileRepository.get_profile_owners(
+            profile_id for result in results if "status" not in result
+            for profile_id in (result["from_profile_id"], result["to_profile_id"])
+        )
+        
+        seen = set()
+        for result in results:
+            if "status" in result:
+                continue
+            from_id, to_id = result["from_profile_id"], result["to_profile_id"]
+            if owners.get(from_id) != account_id:
+                result["status"] = "not_authorized"
+            elif to_id not in owners:
+                result["status"] = "not_found"
+            elif from_id == to_id:
+                result["status"] = "self"
+            else:
+                result["pair"] = Relation.canonical_pair(from_id, to_id)
+                if result["pair"] in seen:
+                    result["status"] = "duplicate"
+                seen.add(result["pair"])
+        
+        pending = [result for result in results if "status" not in result]
+        existing = ProfileRepository.get_existing_relations(result["pair"] for result in pending)
+        
+        to_insert, to_delete = [], []
+        for result in pending:
+            if result["action"] == "connect":
+                if result["pair"] in existing:
+                    result["status"] = "already_friends"
+                else:
+                    result["status"] = "connected"
+                    to_insert.append(result["pair"])
+            else:
+                if result["pair"] in existing:
+                    result["status"] = "disconnected"
+                    to_delete.append(result["pair"])
+                else:
+                    result["status"] = "not_friends"
+        
+        ProfileRepository.insert_relations(to_insert)
+        ProfileRepository.delete_relations(to_delete)
+        SuggestionRepository.delete_pairs(to_insert)
+        db.session.commit()
+        
+        changed_profile_ids = {profile_id for pair in to_insert + to_delete for profile_id in pair}
+        AccountRepository.invalidate(account_id, *{owners[profile_id] for profile_id in changed_profile_ids})
+        PostRepository.invalidate_timelines(*changed_profile_ids)
+        # New friends leave the suggestion lists and ex-friends become candidates again
+        for profile_id in changed_profile_ids:
+            queue_suggestion_refresh(profile_id)
+        
+        summary = {}
+        for result in results:
+            result.pop("pair", None)
+            summary[result["status"]] = summary.get(result["status"], 0) + 1
+        
+        rejected = {"invalid", "not_authorized", "not_found", "self", "duplicate"}
+        status_code = 207 if any(result["status"] in rejected for result in results) else 200
+        
+        return jsonify({
+            "msg": "Connections updated",
+            "results": results,
+            "summary": summary
+        }), status_code
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"msg": "Internal server error", "error": str(e)}), 500
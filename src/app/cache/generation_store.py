@@ -0,0 +1,80 @@
+"""
+Shared cache generations.
+Every worker process keeps its own cache entries; invalidating a key bumps
+its generation in a SQLite file shared by the workers of a host, and entries
+stored under an older generation are treated as missing by every worker.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+
+class SqliteGenerationStore:
+    """Generation counters in a SQLite file; a counter that was never bumped is 0"""
+
+    def __init__(self, path: str, namespace: str):
+        """
+        Initialize the store (the file is opened on first use)
+
+        Args:
+            path: SQLite file path
+            namespace: Prefix keeping the tokens of different caches apart
+        """
+        self.path: str = path
+        self.namespace: str = namespace
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def current(self, token: str) -> int:
+        """
+        Get the generation of a token
+
+        Args:
+            token: Invalidation token, e.g. the repr of a cache key
+
+        Returns:
+            Current generation
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT generation FROM cache_generations WHERE token = ?", (f"{self.namespace}:{token}",)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, token: str) -> int:
+        """
+        Invalidate every entry stored under a token, in every process
+
+        Args:
+            token: Invalidation token
+
+        Returns:
+            The new generation
+        """
+        with self._lock:
+            return self._connect().execute(
+                "INSERT INTO cache_generations (token, generation) VALUES (?, 1) "
+                "ON CONFLICT(token) DO UPDATE SET generation = generation + 1 RETURNING generation",
+                (f"{self.namespace}:{token}",)
+            ).fetchone()[0]
+
+    def reset_after_fork(self) -> None:
+        # The parent's connection must not be used from this process
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_generations "
+                "(token TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+            )
+            self._connection = connection
+        return self._connection
@@ -0,0 +1,218 @@
+"""
+In-process TTL cache with LRU eviction.
+With a shared generation store, invalidations reach the caches of every
+worker process on the host.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+from .generation_store import SqliteGenerationStore
+
+
+class TTLCache:
+    """Thread-safe mapping whose entries expire after `ttl` seconds"""
+    def __init__(self, maxsize: int = 1024, ttl: float = 5.0,
+                 generations: Optional[SqliteGenerationStore] = None):
+        """
+        Initialize the cache
+
+        Args:
+            maxsize: Maximum number of entries; least recently used entries are evicted first
+            ttl: Seconds an entry stays valid. A ttl of 0 disables the cache
+            generations: Optional store shared with other processes; without one,
+                         invalidate() only affects this process
+        """
+        self.maxsize: int = maxsize
+        self.ttl: float = ttl
+        self.generations: Optional[SqliteGenerationStore] = generations
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, config_prefix: str) -> None:
+        """
+        Read size, TTL and the invalidation store from Flask app config and drop every entry
+
+        Args:
+            app: Flask application; uses <PREFIX>_SIZE, <PREFIX>_TTL, CACHE_STORE
+                 ("sqlite" shares invalidations between the workers of a host,
+                 "memory" keeps them per process) and CACHE_STORE_PATH
+            config_prefix: Config key prefix, e.g. "SEARCH_CACHE"
+
+        Raises:
+            ValueError: When CACHE_STORE is unknown
+        """
+        self.maxsize = int(app.config.get(f"{config_prefix}_SIZE", self.maxsize))
+        self.ttl = float(app.config.get(f"{config_prefix}_TTL", self.ttl))
+        store = app.config.get('CACHE_STORE', 'memory')
+        if store == 'sqlite':
+            self.generations = SqliteGenerationStore(app.config['CACHE_STORE_PATH'], config_prefix.lower())
+        elif store == 'memory':
+            self.generations = None
+        else:
+            raise ValueError(f"Unknown CACHE_STORE '{store}'")
+        self.clear()
+
+    def reset_after_fork(self) -> None:
+        """Re-create the lock and the store handle in a freshly forked worker"""
+        self._lock = threading.Lock()
+        if self.generations is not None:
+            self.generations.reset_after_fork()
+
+    def _generation(self, key: Hashable) -> int:
+        """Shared generation an entry for `key` must carry to be valid (0 without a store)"""
+        return self.generations.current(repr(key)) if self.generations is not None else 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.maxsize > 0
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """
+        Get a cached value
+
+        Args:
+            key: Cache key
+            default: Value returned when the key is missing or expired
+
+        Returns:
+            The cached value or `default`
+        """
+        if not self.enabled:
+            return default
+        generation = self._generation(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic() or entry[2] != generation:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value
+
+        Args:
+            key: Cache key
+            value: Value to cache
+        """
+        if not self.enabled:
+            return
+        generation = self._generation(key)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value, generation)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Drop a single entry if present, in every process sharing the generation store
+
+        Args:
+            key: Cache key
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.generations is not None:
+            self.generations.bump(repr(key))
+
+    def clear(self) -> None:
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters
+
+        Returns:
+            Dictionary with size, limits and hit/miss counters
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "shared": self.generations is not None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+class VersionedTTLCache(TTLCache):
+    """
+    TTLCache whose entries are tied to a version stamp.
+
+    Callers read `version` before computing a value and store it with
+    `set(key, value, version)`. `bump_version()` drops every entry, and
+    results computed against an older version are never stored.
+    """
+    VERSION_TOKEN = 'version'
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 5.0,
+                 generations: Optional[SqliteGenerationStore] = None):
+        super().__init__(maxsize=maxsize, ttl=ttl, generations=generations)
+        self._version: int = 0
+
+    @property
+    def version(self) -> int:
+        """Current version stamp (shared by every process when a generation store is set)"""
+        if self.generations is not None:
+            return self.generations.current(self.VERSION_TOKEN)
+        return self._version
+
+    def _generation(self, key: Hashable) -> int:
+        # Keys already carry the version stamp
+        return 0
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        return super().get((self.version, key), default)
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None) -> None:
+        """
+        Store a value unless it was computed against an older version
+
+        Args:
+            key: Cache key
+            value: Value to cache
+            version: Version read before computing the value (defaults to current)
+        """
+        current = self.version
+        if version is not None and version != current:
+            return
+        super().set((current, key), value)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop((self.version, key), None)
+
+    def bump_version(self) -> int:
+        """
+        Invalidate every entry
+
+        Returns:
+            The new version stamp
+        """
+        if self.generations is not None:
+            version = self.generations.bump(self.VERSION_TOKEN)
+        else:
+            with self._lock:
+                self._version += 1
+                version = self._version
+        with self._lock:
+            self._entries.clear()
+        return version
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["version"] = self.version
+        return stats
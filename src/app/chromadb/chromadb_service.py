@@ -1,27 +1,90 @@
 """ChromaDB vector storage"""
-from typing import List, Dict, Optional, Any
-import uuid
-import chromadb
-from chromadb.api.types import Metadata
+from typing import List, Dict, Optional, Any, Iterable, Iterator, Callable, Tuple, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from itertools import islice, repeat
+import hashlib
+import json
+if TYPE_CHECKING:
+    from chromadb.api.types import Metadata
+else:
+    # chromadb itself is only imported when the first client is opened
+    Metadata = Dict[str, Any]
+from .embedding_cache import EmbeddingCache
+from .client_registry import ChromaClientRegistry, chroma_registry
 
 
 class ChromaDBService:
     """Service for managing document embeddings with ChromaDB"""
-    def __init__(self, persist_directory: str = "./chroma_db", collection_name: str = "documents"):
+    DEFAULT_BATCH_SIZE = 64
+    DEFAULT_MAX_WORKERS = 2
+    # Chunks fetched per requested result when collapsing chunks into their documents
+    COLLAPSE_FETCH_FACTOR = 4
+    # Metadata key holding the hash of the text a vector was embedded from
+    CONTENT_HASH_KEY = 'content_hash'
+    # Metadata key holding the ID of the document a chunk belongs to
+    PARENT_ID_KEY = 'parent_id'
+
+    def __init__(self, persist_directory: Optional[str] = None, collection_name: str = "documents",
+                 embedding_cache: Optional[EmbeddingCache] = None,
+                 registry: Optional[ChromaClientRegistry] = None):
         """
-        Initialize ChromaDB client and collection
+        Initialize the service. The client and collection are opened lazily
+        through the shared registry, so construction does not touch disk.
         
         Args:
-            persist_directory: Directory to persist ChromaDB data
+            persist_directory: Directory to persist ChromaDB data (defaults to the
+                               registry's CHROMA_PERSIST_DIRECTORY)
             collection_name: Name of the collection to use
+            embedding_cache: Optional cache used to precompute embeddings instead
+                             of letting ChromaDB embed every call
+            registry: Client registry to use (defaults to the process-wide one)
         """
-        self.client: Any = chromadb.PersistentClient(path=persist_directory)
+        self.persist_directory: Optional[str] = persist_directory
         self.collection_name: str = collection_name
-        # Get or create collection with default embedding function
-        self.collection: Any = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
-        )
+        self.embedding_cache: Optional[EmbeddingCache] = embedding_cache
+        self.registry: ChromaClientRegistry = registry or chroma_registry
+
+    @property
+    def client(self) -> Any:
+        return self.registry.get_client(self.persist_directory)
+
+    @property
+    def collection(self) -> Any:
+        return self.registry.get_collection(self.collection_name, self.persist_directory)
+
+    def _embed(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """Precompute embeddings through the cache, or None to let ChromaDB embed"""
+        if self.embedding_cache is None:
+            return None
+        return self.embedding_cache.embed(texts)
+
+    @staticmethod
+    def content_hash(document: str) -> str:
+        """
+        Hash of a document's text, stored under CONTENT_HASH_KEY to detect unchanged re-uploads
+        
+        Args:
+            document: Document text
+        
+        Returns:
+            Hex SHA-256 of the UTF-8 text
+        """
+        return hashlib.sha256(document.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def content_id(document: str) -> str:
+        """
+        Default ID of a document, derived from its text so that uploading the
+        same text again targets the same vector instead of adding a copy
+        
+        Args:
+            document: Document text
+        
+        Returns:
+            Document ID
+        """
+        return ChromaDBService.content_hash(document)
 
     def add_documents(self, documents: List[str], metadatas: Optional[List[Metadata]] = None,
                       ids: Optional[List[str]] = None) -> Dict[str, Any]:
@@ -31,21 +94,23 @@ class ChromaDBService:
         Args:
             documents: List of text documents to embed and store
             metadatas: Optional list of metadata dictionaries for each document
-            ids: Optional list of document IDs. If not provided, UUIDs will be generated
+            ids: Optional list of document IDs. If not provided, IDs are derived
+                 from the documents' content (see content_id)
         
         Returns:
             Dictionary with status and document IDs
         """
         try:
-            # Generate IDs if not provided
+            # Derive IDs from content if not provided
             if ids is None:
-                ids = [str(uuid.uuid4()) for _ in documents]
+                ids = [self.content_id(document) for document in documents]
             # Prepare metadatas if not provided
             if metadatas is None:
                 metadatas = [{} for _ in documents]
-            # Add to collection (ChromaDB will generate embeddings automatically)
+            # Add to collection (ChromaDB generates embeddings unless the cache provides them)
             self.collection.add(
                 documents=documents,
+                embeddings=self._embed(documents),
                 metadatas=metadatas,
                 ids=ids
             )
@@ -60,8 +125,403 @@ class ChromaDBService:
                 "message": str(e)
             }
 
+    @staticmethod
+    def iter_rows(documents: Iterable[str], metadatas: Optional[Iterable[Metadata]] = None,
+                  ids: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, Optional[Metadata], str]]:
+        """
+        Lazily zip documents with their metadata and IDs
+        
+        Args:
+            documents: Iterable of text documents
+            metadatas: Optional iterable of metadata dictionaries, aligned with documents
+            ids: Optional iterable of document IDs. If not provided, IDs are derived
+                 from the documents' content (see content_id)
+        
+        Yields:
+            Tuple of (document, metadata or None, ID)
+        """
+        metadata_iter = iter(metadatas) if metadatas is not None else repeat(None)
+        if ids is not None:
+            yield from zip(documents, metadata_iter, ids)
+            return
+        for document, metadata in zip(documents, metadata_iter):
+            yield document, metadata, ChromaDBService.content_id(document)
+
+    def iter_deduplicated_rows(self, rows: Iterable[Tuple[str, Optional[Metadata], str]],
+                               skipped: List[Dict[str, str]], skip_existing: bool = True,
+                               batch_size: Optional[int] = None,
+                               stored_id: Optional[Callable[[str], str]] = None,
+                               parent_key: Optional[str] = None,
+                               kept_keys: Iterable[str] = ()
+                               ) -> Iterator[Tuple[str, Metadata, str]]:
+        """
+        Lazily drop rows that would not change the collection and stamp the
+        others with their content hash
+        
+        A row whose ID already appeared earlier in the input is dropped as
+        "duplicate". With `skip_existing`, a row whose ID is stored with the
+        same content hash is not embedded again: it is dropped as "unchanged",
+        or, when it comes with metadata other than the stored one, as
+        "metadata_updated" once the stored metadata was replaced in place (see
+        update_metadatas). A row without metadata keeps the stored metadata.
+        Stored metadata is looked up and updated once per batch of rows.
+        
+        Args:
+            rows: Iterable of (document, metadata or None, ID) rows
+            skipped: List receiving {"id", "reason"} for each dropped row as rows are consumed
+            skip_existing: Whether to look up and skip rows stored with the same content
+            batch_size: Rows per lookup (defaults to DEFAULT_BATCH_SIZE)
+            stored_id: Optional mapping of a row ID to the ID whose metadata holds
+                       its hash, e.g. the first chunk of a chunked document
+            parent_key: Optional metadata key under which the stored children of
+                        a row (e.g. its chunks) hold the row's ID
+            kept_keys: Further stored metadata keys that belong to the stored
+                       records rather than the row (e.g. a chunk's index)
+        
+        Yields:
+            Tuple of (document, metadata including CONTENT_HASH_KEY, ID)
+        
+        Raises:
+            RuntimeError: When stored metadata cannot be read or updated
+        """
+        batch_size = max(1, batch_size or self.DEFAULT_BATCH_SIZE)
+        stored_id = stored_id or (lambda document_id: document_id)
+        own_keys = {self.CONTENT_HASH_KEY, *kept_keys}
+        if parent_key is not None:
+            own_keys.add(parent_key)
+        rows = iter(rows)
+        seen = set()
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            stored: Dict[str, Any] = {}
+            if skip_existing:
+                result = self.get_metadatas(list(dict.fromkeys(stored_id(row[2]) for row in batch)))
+                if result['status'] != 'success':
+                    raise RuntimeError(result.get('message'))
+                stored = result['metadatas']
+            changed = []
+            metadata_changes: Dict[str, Metadata] = {}
+            for document, metadata, document_id in batch:
+                if document_id in seen:
+                    skipped.append({"id": document_id, "reason": "duplicate"})
+                    continue
+                seen.add(document_id)
+                digest = self.content_hash(document)
+                stored_metadata = stored.get(stored_id(document_id)) or {}
+                if stored_metadata.get(self.CONTENT_HASH_KEY) == digest:
+                    current = {key: value for key, value in stored_metadata.items() if key not in own_keys}
+                    if metadata is None or metadata == current:
+                        skipped.append({"id": document_id, "reason": "unchanged"})
+                    else:
+                        metadata_changes[document_id] = dict(metadata, **{self.CONTENT_HASH_KEY: digest})
+                        skipped.append({"id": document_id, "reason": "metadata_updated"})
+                    continue
+                metadata = dict(metadata or {})
+                metadata[self.CONTENT_HASH_KEY] = digest
+                changed.append((document, metadata, document_id))
+            if metadata_changes:
+                result = self.update_metadatas(metadata_changes, parent_key, kept_keys)
+                if result['status'] != 'success':
+                    raise RuntimeError(result.get('message'))
+            yield from changed
+
+    def iter_upsert_batch(self, documents: Iterable[str], metadatas: Optional[Iterable[Metadata]] = None,
+                          ids: Optional[Iterable[str]] = None, batch_size: Optional[int] = None,
+                          max_workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Upsert documents chunk by chunk, yielding one progress entry per chunk
+        (see iter_upsert_rows)
+        
+        Args:
+            documents: Iterable of text documents to embed and store
+            metadatas: Optional iterable of metadata dictionaries, aligned with documents
+            ids: Optional iterable of document IDs. If not provided, IDs are derived
+                 from the documents' content (see content_id)
+            batch_size: Documents per collection call (defaults to DEFAULT_BATCH_SIZE)
+            max_workers: Chunks embedded concurrently (defaults to DEFAULT_MAX_WORKERS)
+        
+        Returns:
+            Iterator of dictionaries per chunk with chunk index, status, and the chunk's document IDs
+        """
+        return self.iter_upsert_rows(self.iter_rows(documents, metadatas, ids), batch_size, max_workers)
+
+    def iter_upsert_rows(self, rows: Iterable[Tuple[str, Optional[Metadata], str]],
+                         batch_size: Optional[int] = None,
+                         max_workers: Optional[int] = None,
+                         parent_key: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Upsert (document, metadata, ID) rows chunk by chunk, yielding one progress entry per chunk
+        
+        At most `max_workers` chunks are embedded concurrently and no further
+        input is read until a slot frees up, so memory stays bounded by
+        roughly `batch_size * max_workers` documents whatever the input size.
+        Entries are yielded in input order.
+        
+        With `parent_key`, rows are children (e.g. the chunks of a document)
+        carrying their parent's ID under that metadata key. Once every row has
+        been upserted, the children each parent had stored before that are not
+        part of its new version are deleted, along with any copy stored whole
+        under the parent's own ID. A parent with a failed child keeps its old
+        children, so a failed upsert never loses a stored document.
+        
+        Args:
+            rows: Iterable of (document, metadata or None, ID) rows, e.g. from a generator
+            batch_size: Documents per collection call (defaults to DEFAULT_BATCH_SIZE)
+            max_workers: Chunks embedded concurrently (defaults to DEFAULT_MAX_WORKERS)
+            parent_key: Optional metadata key under which rows store their parent's ID
+        
+        Yields:
+            Dictionary per chunk with chunk index, status, and the chunk's document IDs
+        
+        Raises:
+            RuntimeError: When stale children cannot be deleted
+        """
+        batch_size = max(1, batch_size or self.DEFAULT_BATCH_SIZE)
+        max_workers = max(1, max_workers or self.DEFAULT_MAX_WORKERS)
+        # parent ID -> IDs of its new children, and parents with a failed child
+        children: Dict[str, List[str]] = {}
+        failed_parents = set()
+        parent_of: Dict[str, str] = {}
+        if parent_key is not None:
+            rows = self._iter_recording_children(rows, parent_key, children, parent_of)
+        rows = iter(rows)
+        
+        def upsert_chunk(index: int, chunk: List[tuple]) -> Dict[str, Any]:
+            chunk_documents = [row[0] for row in chunk]
+            # Chroma rejects empty metadata dicts, None means "no metadata"
+            chunk_metadatas = [row[1] or None for row in chunk]
+            chunk_ids = [row[2] for row in chunk]
+            try:
+                self.collection.upsert(
+                    documents=chunk_documents,
+                    embeddings=self._embed(chunk_documents),
+                    metadatas=chunk_metadatas if any(chunk_metadatas) else None,
+                    ids=chunk_ids
+                )
+                return {"chunk": index, "status": "success", "ids": chunk_ids}
+            except Exception as e:
+                return {"chunk": index, "status": "error", "ids": chunk_ids, "message": str(e)}
+        
+        def completed(chunk_result: Dict[str, Any]) -> Dict[str, Any]:
+            if chunk_result["status"] != "success":
+                failed_parents.update(parent_of[document_id] for document_id in chunk_result["ids"]
+                                      if document_id in parent_of)
+            return chunk_result
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = deque()
+            index = 0
+            while True:
+                chunk = list(islice(rows, batch_size))
+                if not chunk:
+                    break
+                # Backpressure: wait for the oldest chunk before reading more input
+                if len(in_flight) >= max_workers:
+                    yield completed(in_flight.popleft().result())
+                in_flight.append(executor.submit(upsert_chunk, index, chunk))
+                index += 1
+            while in_flight:
+                yield completed(in_flight.popleft().result())
+        
+        if parent_key is not None:
+            replaced = [parent_id for parent_id in children if parent_id not in failed_parents]
+            for start in range(0, len(replaced), batch_size):
+                self._delete_stale_children(
+                    {parent_id: children[parent_id] for parent_id in replaced[start:start + batch_size]},
+                    parent_key
+                )
+    
+    @staticmethod
+    def _iter_recording_children(rows: Iterable[Tuple[str, Optional[Metadata], str]], parent_key: str,
+                                 children: Dict[str, List[str]],
+                                 parent_of: Dict[str, str]) -> Iterator[Tuple[str, Optional[Metadata], str]]:
+        """Pass rows through, recording each child's ID under its parent as it is read"""
+        for row in rows:
+            parent_id = (row[1] or {}).get(parent_key)
+            if parent_id is not None:
+                children.setdefault(parent_id, []).append(row[2])
+                parent_of[row[2]] = parent_id
+            yield row
+    
+    def _delete_stale_children(self, children: Dict[str, List[str]], parent_key: str) -> None:
+        """
+        Delete the stored children of parents that are not among their new
+        children, and whole copies stored under the parents' own IDs
+        
+        Args:
+            children: New child IDs per parent ID
+            parent_key: Metadata key under which children store their parent's ID
+        
+        Raises:
+            RuntimeError: When the stored children cannot be read or deleted
+        """
+        try:
+            stored = self.collection.get(where={parent_key: {"$in": list(children)}}, include=["metadatas"])
+        except Exception as e:
+            raise RuntimeError(str(e))
+        stale = [parent_id for parent_id in children]
+        for document_id, metadata in zip(stored['ids'], stored['metadatas']):
+            if document_id not in children.get((metadata or {}).get(parent_key), ()):
+                stale.append(document_id)
+        result = self.delete_documents(stale)
+        if result['status'] != 'success':
+            raise RuntimeError(result.get('message'))
+
+    def upsert_batch(self, documents: Iterable[str], metadatas: Optional[Iterable[Metadata]] = None,
+                     ids: Optional[Iterable[str]] = None, batch_size: Optional[int] = None,
+                     max_workers: Optional[int] = None,
+                     progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Upsert documents in bounded chunks and report per-item status
+        
+        Args:
+            documents: Iterable of text documents to embed and store
+            metadatas: Optional iterable of metadata dictionaries, aligned with documents
+            ids: Optional iterable of document IDs. If not provided, IDs are derived
+                 from the documents' content (see content_id)
+            batch_size: Documents per collection call (defaults to DEFAULT_BATCH_SIZE)
+            max_workers: Chunks embedded concurrently (defaults to DEFAULT_MAX_WORKERS)
+            progress_callback: Optional callable invoked with each chunk result as it completes
+        
+        Returns:
+            Dictionary with overall status ("success", "partial" or "error"),
+            document IDs and a per-item status list
+        """
+        return self.upsert_rows(self.iter_rows(documents, metadatas, ids), batch_size, max_workers,
+                                progress_callback)
+
+    def upsert_rows(self, rows: Iterable[Tuple[str, Optional[Metadata], str]],
+                    batch_size: Optional[int] = None, max_workers: Optional[int] = None,
+                    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    parent_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Upsert (document, metadata, ID) rows in bounded chunks and report per-item status
+        
+        Args:
+            rows: Iterable of (document, metadata or None, ID) rows, e.g. from a generator
+            batch_size: Documents per collection call (defaults to DEFAULT_BATCH_SIZE)
+            max_workers: Chunks embedded concurrently (defaults to DEFAULT_MAX_WORKERS)
+            progress_callback: Optional callable invoked with each chunk result as it completes
+            parent_key: Optional metadata key under which rows store their parent's ID;
+                        stale children of the parents are deleted (see iter_upsert_rows)
+        
+        Returns:
+            Dictionary with overall status ("success", "partial" or "error"),
+            document IDs and a per-item status list
+        """
+        items = []
+        chunks = 0
+        failed = 0
+        try:
+            for chunk_result in self.iter_upsert_rows(rows, batch_size, max_workers, parent_key):
+                chunks += 1
+                if progress_callback is not None:
+                    progress_callback(chunk_result)
+                for document_id in chunk_result["ids"]:
+                    item = {"id": document_id, "status": chunk_result["status"]}
+                    if chunk_result["status"] != "success":
+                        item["message"] = chunk_result.get("message")
+                        failed += 1
+                    items.append(item)
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
+        
+        if failed == 0:
+            status = "success"
+        elif failed == len(items):
+            status = "error"
+        else:
+            status = "partial"
+        return {
+            "status": status,
+            "message": f"Upserted {len(items) - failed} of {len(items)} documents in {chunks} chunks",
+            "document_ids": [item["id"] for item in items if item["status"] == "success"],
+            "items": items
+        }
+
+    def iter_query_documents(self, query_text: str, n_results: int = 5,
+                             where: Optional[Dict[str, Any]] = None,
+                             collapse_parents: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Query the ChromaDB collection and yield the matches one at a time
+        
+        The collection is queried when the first match is requested; each match
+        is formatted only as it is consumed, so a streaming caller never holds
+        a second, formatted copy of the result.
+        
+        With `collapse_parents`, chunks of the same document (sharing a
+        PARENT_ID_KEY in their metadata) are merged into their best-ranked hit,
+        whose id becomes the parent's ID and which keeps the chunk's ID as
+        `chunk_id`. The collection is over-fetched by COLLAPSE_FETCH_FACTOR so
+        that up to n_results distinct documents remain after merging.
+        
+        Args:
+            query_text: The text query to search for
+            n_results: Number of results to return
+            where: Optional metadata filter
+            collapse_parents: Whether to return one match per parent document
+        
+        Yields:
+            Dictionary per match with id, document, metadata, distance and similarity
+        
+        Raises:
+            Exception: Errors from the embedding function or the collection
+        """
+        # Query the collection (ChromaDB embeds the query unless the cache provides it)
+        query_embeddings = self._embed([query_text])
+        if query_embeddings is not None:
+            query_kwargs = {"query_embeddings": query_embeddings}
+        else:
+            query_kwargs = {"query_texts": [query_text]}
+        results: Any = self.collection.query(
+            n_results=n_results * self.COLLAPSE_FETCH_FACTOR if collapse_parents else n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"],
+            **query_kwargs
+        )
+        yield from self._iter_matches(results, 0, n_results, collapse_parents)
+
+    @staticmethod
+    def _iter_matches(results: Any, index: int, n_results: int, collapse_parents: bool,
+                      parent_key: str = PARENT_ID_KEY) -> Iterator[Dict[str, Any]]:
+        """
+        Format the matches of the `index`-th query of a collection.query result;
+        with `collapse_parents`, matches sharing `parent_key` metadata are merged
+        """
+        seen_parents = set()
+        count = 0
+        for document_id, document, metadata, distance in zip(
+            results['ids'][index], results['documents'][index],
+            results['metadatas'][index], results['distances'][index]
+        ):
+            if count == n_results:
+                return
+            match = {
+                "id": document_id,
+                "document": document,
+                "metadata": metadata,
+                "distance": distance,
+                "similarity": 1 - distance  # Convert distance to similarity
+            }
+            if collapse_parents:
+                # Matches come best first, so the first chunk seen stands for its document
+                parent_id = (metadata or {}).get(parent_key, document_id)
+                if parent_id in seen_parents:
+                    continue
+                seen_parents.add(parent_id)
+                match["chunk_id"] = document_id
+                match["id"] = parent_id
+            count += 1
+            yield match
+
     def query_documents(self, query_text: str, n_results: int = 5,
-                        where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                        where: Optional[Dict[str, Any]] = None,
+                        collapse_parents: bool = False) -> Dict[str, Any]:
         """
         Query the ChromaDB collection for similar documents
         
@@ -69,28 +529,14 @@ class ChromaDBService:
             query_text: The text query to search for
             n_results: Number of results to return
             where: Optional metadata filter
+            collapse_parents: Whether to return one match per parent document
+                              (see iter_query_documents)
         
         Returns:
             Dictionary with query results
         """
         try:
-            # Query the collection (ChromaDB will generate query embedding automatically)
-            results: Any = self.collection.query(
-                query_texts=[query_text],
-                n_results=n_results,
-                where=where,
-                include=["documents", "metadatas", "distances"]
-            )
-            # Format results
-            formatted_results = []
-            for i in range(len(results['ids'][0])):
-                formatted_results.append({
-                    "id": results['ids'][0][i],
-                    "document": results['documents'][0][i],
-                    "metadata": results['metadatas'][0][i],
-                    "distance": results['distances'][0][i],
-                    "similarity": 1 - results['distances'][0][i]  # Convert distance to similarity
-                })
+            formatted_results = list(self.iter_query_documents(query_text, n_results, where, collapse_parents))
             return {
                 "status": "success",
                 "query": query_text,
@@ -103,6 +549,64 @@ class ChromaDBService:
                 "message": str(e)
             }
 
+    def query_batch(self, queries: List[Dict[str, Any]], collapse_parents: bool = False) -> Dict[str, Any]:
+        """
+        Run several similarity queries with as few collection calls as possible
+        
+        ChromaDB applies one `where` and one `n_results` to every text of a
+        query call, so queries are grouped by filter: each group is embedded as
+        one batch and answered by one call fetching the group's largest
+        n_results, then cut down per query. With an embedding cache every query
+        text is embedded in a single batch up front.
+        
+        Args:
+            queries: List of dictionaries with "query" text and optional
+                     "n_results" (default 5) and "where" filter
+            collapse_parents: Whether to return one match per parent document
+                              (see iter_query_documents)
+        
+        Returns:
+            Dictionary with status and "results": one entry per query, in input
+            order, with the query text, its matches and their count
+        """
+        try:
+            groups: Dict[str, List[int]] = {}
+            for index, query in enumerate(queries):
+                where_key = json.dumps(query.get('where'), sort_keys=True)
+                groups.setdefault(where_key, []).append(index)
+            
+            texts = [query['query'] for query in queries]
+            embeddings = self._embed(texts)
+            counts = [query.get('n_results', 5) for query in queries]
+            results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+            
+            for indexes in groups.values():
+                n_results = max(counts[index] for index in indexes)
+                if embeddings is not None:
+                    query_kwargs = {"query_embeddings": [embeddings[index] for index in indexes]}
+                else:
+                    query_kwargs = {"query_texts": [texts[index] for index in indexes]}
+                group_results: Any = self.collection.query(
+                    n_results=n_results * self.COLLAPSE_FETCH_FACTOR if collapse_parents else n_results,
+                    where=queries[indexes[0]].get('where'),
+                    include=["documents", "metadatas", "distances"],
+                    **query_kwargs
+                )
+                for position, index in enumerate(indexes):
+                    matches = list(self._iter_matches(group_results, position, counts[index], collapse_parents))
+                    results[index] = {"query": texts[index], "results": matches, "count": len(matches)}
+            
+            return {
+                "status": "success",
+                "results": results,
+                "count": len(results)
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
+
     def delete_documents(self, ids: List[str]) -> Dict[str, Any]:
         """
         Delete documents from the collection
@@ -126,6 +630,98 @@ class ChromaDBService:
                 "message": str(e)
             }
 
+    def delete_where(self, where: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Delete every document whose metadata matches a filter
+        
+        Args:
+            where: Metadata filter, e.g. {"profile_id": 12}
+        
+        Returns:
+            Dictionary with status
+        """
+        try:
+            self.collection.delete(where=where)
+            return {
+                "status": "success",
+                "message": "Deleted matching documents"
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
+
+    def get_metadatas(self, ids: List[str]) -> Dict[str, Any]:
+        """
+        Fetch the stored metadata of documents without their embeddings
+        
+        Args:
+            ids: Document IDs to look up
+        
+        Returns:
+            Dictionary with status and "metadatas" mapping each stored ID to its
+            metadata (IDs that are not stored are absent)
+        """
+        try:
+            if not ids:
+                return {"status": "success", "metadatas": {}}
+            result: Any = self.collection.get(ids=ids, include=["metadatas"])
+            return {
+                "status": "success",
+                "metadatas": dict(zip(result['ids'], result['metadatas']))
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
+
+    def update_metadatas(self, metadatas: Dict[str, Metadata], parent_key: Optional[str] = None,
+                         kept_keys: Iterable[str] = ()) -> Dict[str, Any]:
+        """
+        Replace the metadata of stored documents without embedding them again
+        
+        Args:
+            metadatas: New metadata per document ID
+            parent_key: Optional metadata key under which the stored children of
+                        a document (e.g. its chunks) hold its ID; the children
+                        are updated instead of the document's own ID
+            kept_keys: Stored metadata keys left as they are (parent_key always is)
+        
+        Returns:
+            Dictionary with status and the IDs of the updated records
+        """
+        try:
+            if parent_key is None:
+                stored = self.collection.get(ids=list(metadatas), include=["metadatas"])
+                owners = stored['ids']
+            else:
+                stored = self.collection.get(where={parent_key: {"$in": list(metadatas)}}, include=["metadatas"])
+                owners = [(metadata or {}).get(parent_key) for metadata in stored['metadatas']]
+                kept_keys = (parent_key, *kept_keys)
+            updated_ids, updated_metadatas = [], []
+            for document_id, owner, current in zip(stored['ids'], owners, stored['metadatas']):
+                current = current or {}
+                updated = {key: current[key] for key in kept_keys if key in current}
+                updated.update(metadatas[owner])
+                # Chroma merges metadata on update; None removes a key
+                updated.update({key: None for key in current if key not in updated})
+                updated_ids.append(document_id)
+                updated_metadatas.append(updated)
+            if updated_ids:
+                self.collection.update(ids=updated_ids, metadatas=updated_metadatas)
+            return {
+                "status": "success",
+                "message": f"Updated metadata of {len(updated_ids)} documents",
+                "updated_ids": updated_ids
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
+
     def get_collection_info(self) -> Dict[str, Any]:
         """
         Get information about the collection
@@ -154,7 +750,7 @@ class ChromaDBService:
         Args:
             document_id: ID of the document to update
             document: New document text
-            metadata: Optional new metadata
+            metadata: Optional new metadata (the stored content hash is updated either way)
         
         Returns:
             Dictionary with status
@@ -165,9 +761,13 @@ class ChromaDBService:
                 "ids": [document_id],
                 "documents": [document]
             }
-            if metadata is not None:
-                # metadata is guarded by the if-check above, so it's non-None here
-                update_kwargs["metadatas"] = [metadata]  # type: ignore[assignment]
+            embeddings = self._embed([document])
+            if embeddings is not None:
+                update_kwargs["embeddings"] = embeddings  # type: ignore[assignment]
+            # Without new metadata only the hash key is overwritten, the other keys are kept
+            metadata = dict(metadata or {})
+            metadata[self.CONTENT_HASH_KEY] = self.content_hash(document)
+            update_kwargs["metadatas"] = [metadata]  # type: ignore[assignment]
             self.collection.update(**update_kwargs)
             return {
                 "status": "success",
@@ -0,0 +1,101 @@
+"""Process-wide registry of ChromaDB clients and collection handles"""
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+
+class ChromaClientRegistry:
+    """
+    Opens at most one PersistentClient per persist directory and hands out
+    cached collection handles. Nothing touches disk until the first handle
+    is requested.
+    """
+    DEFAULT_PERSIST_DIRECTORY = "./chroma_db"
+
+    def __init__(self, persist_directory: Optional[str] = None, embedding_function: Optional[Any] = None):
+        """
+        Initialize the registry
+
+        Args:
+            persist_directory: Default persist directory, usually set from app config by init_app
+            embedding_function: Embedding function of new collection handles
+                                (defaults to ChromaDB's default model)
+        """
+        self.persist_directory: str = persist_directory or self.DEFAULT_PERSIST_DIRECTORY
+        self.embedding_function: Optional[Any] = embedding_function
+        self._clients: Dict[str, Any] = {}
+        self._collections: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """
+        Read settings from Flask app config
+
+        Args:
+            app: Flask application; uses CHROMA_PERSIST_DIRECTORY and CHROMA_EMBEDDING_FUNCTION
+        """
+        self.persist_directory = app.config.get('CHROMA_PERSIST_DIRECTORY', self.persist_directory)
+        self.embedding_function = app.config.get('CHROMA_EMBEDDING_FUNCTION', self.embedding_function)
+
+    def get_client(self, persist_directory: Optional[str] = None) -> Any:
+        """
+        Get the shared client for a persist directory, opening it on first use
+
+        Args:
+            persist_directory: Directory to persist ChromaDB data (defaults to the configured one)
+
+        Returns:
+            ChromaDB PersistentClient
+        """
+        path = os.path.abspath(persist_directory or self.persist_directory)
+        with self._lock:
+            client = self._clients.get(path)
+            if client is None:
+                import chromadb
+                client = chromadb.PersistentClient(path=path)
+                self._clients[path] = client
+            return client
+
+    def get_collection(self, name: str, persist_directory: Optional[str] = None) -> Any:
+        """
+        Get a cached handle to a collection, creating the collection if needed
+
+        Args:
+            name: Collection name
+            persist_directory: Directory to persist ChromaDB data (defaults to the configured one)
+
+        Returns:
+            ChromaDB collection using cosine distance
+        """
+        path = os.path.abspath(persist_directory or self.persist_directory)
+        key = (path, name)
+        collection = self._collections.get(key)
+        if collection is not None:
+            return collection
+        client = self.get_client(path)
+        with self._lock:
+            collection = self._collections.get(key)
+            if collection is None:
+                # Get or create collection with the configured (or default) embedding function
+                options = {}
+                if self.embedding_function is not None:
+                    options["embedding_function"] = self.embedding_function
+                collection = client.get_or_create_collection(
+                    name=name,
+                    metadata={"hnsw:space": "cosine"},
+                    **options
+                )
+                self._collections[key] = collection
+            return collection
+
+    def reset(self) -> None:
+        """
+        Forget all clients and handles, e.g. in a worker process after fork.
+        They are reopened on next use.
+        """
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._collections = {}
+
+
+chroma_registry = ChromaClientRegistry()
@@ -0,0 +1,153 @@
+"""
+Document chunking.
+Long documents are split into overlapping windows of whole sentences before
+they are embedded, so each vector covers a passage the embedding model can
+represent. Tokens are approximated by whitespace-separated words.
+"""
+
+import re
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from .chromadb_service import ChromaDBService
+
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+PARENT_ID_KEY = ChromaDBService.PARENT_ID_KEY
+CHUNK_INDEX_KEY = 'chunk_index'
+
+
+class DocumentChunker:
+    """Split documents into sentence windows of bounded size with overlap"""
+    CHUNK_ID_SEPARATOR = '#'
+
+    def __init__(self, max_tokens: int = 200, overlap_tokens: int = 40):
+        """
+        Initialize the chunker
+
+        Args:
+            max_tokens: Maximum words per chunk
+            overlap_tokens: Words of trailing sentences repeated at the start of
+                            the next chunk (kept below max_tokens)
+
+        Raises:
+            ValueError: When max_tokens is not positive or overlap_tokens is negative
+        """
+        if max_tokens < 1 or overlap_tokens < 0:
+            raise ValueError("max_tokens must be positive and overlap_tokens non-negative")
+        self.max_tokens: int = max_tokens
+        self.overlap_tokens: int = min(overlap_tokens, max_tokens - 1)
+
+    @staticmethod
+    def chunk_id(parent_id: str, index: int) -> str:
+        """ID of the `index`-th chunk of a document"""
+        return f"{parent_id}{DocumentChunker.CHUNK_ID_SEPARATOR}{index}"
+
+    @staticmethod
+    def parent_of(chunk_id: str) -> str:
+        """ID of the document a chunk ID belongs to (the ID itself when it is not a chunk ID)"""
+        parent_id, separator, index = chunk_id.rpartition(DocumentChunker.CHUNK_ID_SEPARATOR)
+        return parent_id if separator and index.isdigit() else chunk_id
+
+    @staticmethod
+    def iter_sentences(text: str) -> Iterator[List[str]]:
+        """
+        Lazily split text into sentences
+
+        Args:
+            text: Document text
+
+        Yields:
+            Words of each non-empty sentence
+        """
+        start = 0
+        for match in _SENTENCE_BREAK.finditer(text):
+            words = text[start:match.start()].split()
+            if words:
+                yield words
+            start = match.end()
+        words = text[start:].split()
+        if words:
+            yield words
+
+    def _pieces(self, text: str) -> Iterator[List[str]]:
+        """Sentences, with sentences longer than max_tokens cut into overlapping word windows"""
+        stride = self.max_tokens - self.overlap_tokens
+        for words in self.iter_sentences(text):
+            if len(words) <= self.max_tokens:
+                yield words
+                continue
+            for start in range(0, len(words) - self.overlap_tokens, stride):
+                yield words[start:start + self.max_tokens]
+
+    def chunk_text(self, text: str) -> Iterator[str]:
+        """
+        Lazily split a document into chunks of whole sentences.
+
+        Chunks hold at most max_tokens words; each one starts with the trailing
+        sentences of the previous chunk that fit in overlap_tokens words.
+        A sentence longer than max_tokens is split into word windows.
+
+        Args:
+            text: Document text
+
+        Yields:
+            Chunk texts, at least one for non-blank text
+        """
+        window: List[List[str]] = []
+        size = 0
+        for piece in self._pieces(text):
+            if window and size + len(piece) > self.max_tokens:
+                yield ' '.join(word for sentence in window for word in sentence)
+                # Keep the trailing sentences that fit in the overlap and leave room for the piece
+                kept: List[List[str]] = []
+                kept_size = 0
+                for sentence in reversed(window):
+                    if kept_size + len(sentence) > min(self.overlap_tokens, self.max_tokens - len(piece)):
+                        break
+                    kept.insert(0, sentence)
+                    kept_size += len(sentence)
+                window, size = kept, kept_size
+            window.append(piece)
+            size += len(piece)
+        if window:
+            yield ' '.join(word for sentence in window for word in sentence)
+
+    def iter_chunks(self, documents: Iterable[str], metadatas: Optional[Iterable[Optional[Dict[str, Any]]]] = None,
+                    ids: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, Dict[str, Any], str]]:
+        """
+        Lazily chunk documents into rows for ChromaDBService.iter_upsert_rows (see iter_row_chunks)
+
+        Args:
+            documents: Iterable of document texts
+            metadatas: Optional iterable of metadata dictionaries, aligned with documents
+            ids: Optional iterable of document IDs. If not provided, IDs are derived
+                 from the documents' content
+
+        Returns:
+            Iterator of (chunk text, chunk metadata, chunk ID) tuples
+        """
+        return self.iter_row_chunks(ChromaDBService.iter_rows(documents, metadatas, ids))
+
+    def iter_row_chunks(self, rows: Iterable[Tuple[str, Optional[Dict[str, Any]], str]]
+                        ) -> Iterator[Tuple[str, Dict[str, Any], str]]:
+        """
+        Lazily chunk (document, metadata, ID) rows into chunk rows
+
+        Each chunk carries its document's metadata plus `parent_id` and
+        `chunk_index`, and gets the ID "<parent ID>#<chunk index>". A blank
+        document is kept as a single chunk.
+
+        Args:
+            rows: Iterable of (document, metadata or None, ID) rows
+
+        Yields:
+            Tuple of (chunk text, chunk metadata, chunk ID)
+        """
+        for document, metadata, parent_id in rows:
+            chunks = self.chunk_text(document)
+            first = next(chunks, None)
+            for index, chunk in enumerate(chain([document if first is None else first], chunks)):
+                chunk_metadata = dict(metadata or {})
+                chunk_metadata[PARENT_ID_KEY] = parent_id
+                chunk_metadata[CHUNK_INDEX_KEY] = index
+                yield chunk, chunk_metadata, self.chunk_id(parent_id, index)
@@ -0,0 +1,208 @@
+"""Content-addressed embedding cache in front of the ChromaDB embedding function"""
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+class EmbeddingCache:
+    """
+    LRU cache of embeddings keyed by the SHA-256 of the normalized text.
+
+    Texts are normalized (lowercased, whitespace collapsed) before hashing and
+    embedding, so "Football  Music" and "football music" share one vector.
+    With `persist_path` set, vectors are also kept in a SQLite file and
+    survive restarts.
+
+    One instance (`embedding_cache`) is shared by every ChromaDBService, so
+    profiles, posts and documents reuse each other's vectors.
+    """
+    def __init__(self, embedding_function: Optional[Any] = None, maxsize: int = 10000,
+                 persist_path: Optional[str] = None):
+        """
+        Initialize the cache (the embedding model is loaded on first miss)
+
+        Args:
+            embedding_function: Callable mapping a list of texts to vectors.
+                                Defaults to ChromaDB's default embedding function
+            maxsize: Maximum number of vectors kept in memory
+            persist_path: Optional SQLite file for on-disk persistence
+        """
+        self.maxsize: int = maxsize
+        self.persist_path: Optional[str] = persist_path
+        self._embedding_function: Optional[Any] = embedding_function
+        self._entries: "OrderedDict[str, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+
+    def init_app(self, app) -> None:
+        """
+        Read settings from Flask app config and drop the vectors held in memory
+
+        Args:
+            app: Flask application; uses EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_PATH
+                 (empty keeps vectors in memory only) and CHROMA_EMBEDDING_FUNCTION when set
+        """
+        embedding_function = app.config.get('CHROMA_EMBEDDING_FUNCTION')
+        if embedding_function is not None:
+            self._embedding_function = embedding_function
+        with self._lock:
+            self.maxsize = int(app.config.get('EMBEDDING_CACHE_SIZE', self.maxsize))
+            self.persist_path = app.config.get('EMBEDDING_CACHE_PATH', self.persist_path) or None
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Normalize text before hashing and embedding
+
+        Args:
+            text: Raw text
+
+        Returns:
+            Lowercased text with collapsed whitespace
+        """
+        return ' '.join(text.lower().split())
+
+    @staticmethod
+    def key(text: str) -> str:
+        """
+        Content address of a text
+
+        Args:
+            text: Raw text
+
+        Returns:
+            Hex SHA-256 of the normalized text
+        """
+        return hashlib.sha256(EmbeddingCache.normalize(text).encode('utf-8')).hexdigest()
+
+    @property
+    def embedding_function(self) -> Any:
+        if self._embedding_function is None:
+            from chromadb.utils import embedding_functions
+            self._embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        return self._embedding_function
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Get embeddings for texts, running the model only for unseen texts
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One vector per input text, in input order
+        """
+        keys = [self.key(text) for text in texts]
+        vectors: Dict[str, array] = {}
+        missing: Dict[str, str] = {}
+
+        with self._lock:
+            for text, key in zip(texts, keys):
+                if key in vectors or key in missing:
+                    continue
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    vectors[key] = vector
+                    self.hits += 1
+                else:
+                    missing[key] = self.normalize(text)
+
+        if missing:
+            for key, vector in self._load_from_disk(list(missing)).items():
+                vectors[key] = vector
+                del missing[key]
+                self.disk_hits += 1
+
+        if missing:
+            miss_keys = list(missing)
+            embedded = self.embedding_function([missing[key] for key in miss_keys])
+            new_vectors = {key: array('f', [float(x) for x in vector]) for key, vector in zip(miss_keys, embedded)}
+            vectors.update(new_vectors)
+            self.misses += len(new_vectors)
+            self._save_to_disk(new_vectors)
+
+        with self._lock:
+            for key, vector in vectors.items():
+                self._entries[key] = vector
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return [vectors[key].tolist() for key in keys]
+
+    def reset_after_fork(self) -> None:
+        """Drop the lock and SQLite connection inherited from a parent process"""
+        self._lock = threading.Lock()
+        self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters
+
+        Returns:
+            Dictionary with size and hit/miss counters
+        """
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                "persistent": bool(self.persist_path)
+            }
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if not self.persist_path:
+            return None
+        if self._db is None:
+            persist_dir = os.path.dirname(self.persist_path)
+            if persist_dir:
+                os.makedirs(persist_dir, exist_ok=True)
+            self._db = sqlite3.connect(self.persist_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        return self._db
+
+    def _load_from_disk(self, keys: List[str]) -> Dict[str, array]:
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return {}
+            placeholders = ",".join("?" for _ in keys)
+            rows = db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", keys).fetchall()
+        loaded = {}
+        for key, blob in rows:
+            vector = array('f')
+            vector.frombytes(blob)
+            loaded[key] = vector
+        return loaded
+
+    def _save_to_disk(self, vectors: Dict[str, array]) -> None:
+        with self._lock:
+            db = self._connect()
+            if db is None or not vectors:
+                return
+            db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, vector.tobytes()) for key, vector in vectors.items()]
+            )
+
+
+# Configured from EMBEDDING_CACHE_SIZE and EMBEDDING_CACHE_PATH by create_app
+embedding_cache = EmbeddingCache()
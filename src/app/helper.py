@@ -1,11 +1,13 @@
 import socket
 import re
-from typing import List, Dict, Optional, Tuple
+import math
+from typing import Any, Callable, List, Dict, Optional, Tuple
 from datetime import datetime, timezone
 
 
 class PenpalsHelper:
     """Static helper class for PenPals application utilities"""
+    EARTH_RADIUS_KM = 6371.0088
     
     @staticmethod
     def find_open_port(start_port: int = 5000, end_port: int = 6000) -> int:
@@ -41,26 +43,99 @@ class PenpalsHelper:
         return bool(re.match(pattern, email))
     
     @staticmethod
-    def validate_coordinates(latitude: Optional[str], longitude: Optional[str]) -> bool:
+    def validate_coordinates(latitude, longitude) -> bool:
         """
         Validate latitude and longitude coordinates.
+        Each coordinate is optional; every supplied one must be a number in range.
         
         Args:
-            latitude: Latitude as string
-            longitude: Longitude as string
+            latitude: Latitude as number or string
+            longitude: Longitude as number or string
             
         Returns:
             True if coordinates are valid, False otherwise
         """
-        if not latitude or not longitude:
-            return True  # Optional fields
+        for value, limit in ((latitude, 90.0), (longitude, 180.0)):
+            if value is None or (isinstance(value, str) and not value.strip()):
+                continue  # Optional fields
+            parsed = PenpalsHelper.parse_coordinate(value)
+            if parsed is None or not -limit <= parsed <= limit:
+                return False
+        return True
+    
+    @staticmethod
+    def parse_coordinate(value) -> Optional[float]:
+        """
+        Convert a coordinate from request data to a float.
         
+        Args:
+            value: Coordinate as number or string
+            
+        Returns:
+            Float value, or None when not provided or not a number
+        """
+        if value is None or isinstance(value, bool) or (isinstance(value, str) and not value.strip()):
+            return None
         try:
-            lat = float(latitude)
-            lng = float(longitude)
-            return -90 <= lat <= 90 and -180 <= lng <= 180
+            return float(value)
         except (ValueError, TypeError):
-            return False
+            return None
+    
+    @staticmethod
+    def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+        """
+        Great-circle distance between two points.
+        
+        Args:
+            lat1: Latitude of the first point in degrees
+            lng1: Longitude of the first point in degrees
+            lat2: Latitude of the second point in degrees
+            lng2: Longitude of the second point in degrees
+            
+        Returns:
+            Distance in kilometres
+        """
+        phi1, phi2 = math.radians(lat1), math.radians(lat2)
+        d_phi = phi2 - phi1
+        d_lambda = math.radians(lng2 - lng1)
+        a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+        return 2 * PenpalsHelper.EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+    
+    @staticmethod
+    def bounding_box(latitude: float, longitude: float,
+                     radius_km: float) -> Tuple[float, float, List[Tuple[float, float]]]:
+        """
+        Latitude range and longitude ranges enclosing a circle on the globe.
+        
+        Args:
+            latitude: Centre latitude in degrees
+            longitude: Centre longitude in degrees
+            radius_km: Circle radius in kilometres
+            
+        Returns:
+            Tuple of (min latitude, max latitude, list of (min longitude, max longitude)).
+            There are two longitude ranges when the box crosses the antimeridian.
+        """
+        d_lat = math.degrees(radius_km / PenpalsHelper.EARTH_RADIUS_KM)
+        min_lat = max(-90.0, latitude - d_lat)
+        max_lat = min(90.0, latitude + d_lat)
+        
+        # Near a pole every longitude is within reach
+        if min_lat <= -90.0 or max_lat >= 90.0:
+            return min_lat, max_lat, [(-180.0, 180.0)]
+        
+        sin_ratio = math.sin(radius_km / PenpalsHelper.EARTH_RADIUS_KM) / math.cos(math.radians(latitude))
+        if sin_ratio >= 1.0:
+            return min_lat, max_lat, [(-180.0, 180.0)]
+        d_lng = math.degrees(math.asin(sin_ratio))
+        
+        min_lng = longitude - d_lng
+        max_lng = longitude + d_lng
+        if min_lng < -180.0:
+            return min_lat, max_lat, [(min_lng + 360.0, 180.0), (-180.0, max_lng)]
+        if max_lng > 180.0:
+            return min_lat, max_lat, [(min_lng, 180.0), (-180.0, max_lng - 360.0)]
+        return min_lat, max_lat, [(min_lng, max_lng)]
     
     @staticmethod
     def sanitize_interests(interests: List[str]) -> List[str]:
@@ -93,45 +168,102 @@ class PenpalsHelper:
         return unique_interests[:10]  # Limit to 10 interests
     
     @staticmethod
-    def format_classroom_response(classroom, include_friends: bool = False) -> Dict:
+    def format_profile_response(profile, include_friends: bool = False,
+                                friend_rows: Optional[List[Tuple]] = None) -> Dict:
         """
-        Format classroom data for API responses.
+        Format profile data for API responses.
         
         Args:
-            classroom: Profile/Classroom model instance
+            profile: Profile model instance
             include_friends: Whether to include friends list
+            friend_rows: Optional (relation, friend) rows from ProfileRepository.get_friends;
+                         loaded with one joined query when omitted
             
         Returns:
-            Formatted classroom dictionary
+            Formatted profile dictionary
         """
         response = {
-            "id": classroom.id,
-            "name": classroom.name,
-            "location": classroom.location,
-            "latitude": classroom.lattitude,  # Keep original typo for consistency
-            "longitude": classroom.longitude,
-            "class_size": classroom.class_size,
-            "availability": classroom.availability,
-            "interests": classroom.interests,
-            "created_at": classroom.account.created_at.isoformat() if hasattr(classroom, 'account') else None
+            "id": profile.id,
+            "name": profile.name,
+            "location": profile.location,
+            "latitude": profile.latitude,
+            "longitude": profile.longitude,
+            "class_size": profile.class_size,
+            "availability": profile.availability,
+            "interests": profile.interests,
+            "created_at": profile.account.created_at.isoformat() if profile.account else None
         }
         
         if include_friends:
-            friends = []
-            for relation in classroom.sent_relations:
-                friend = relation.to_profile
-                friends.append({
-                    "id": friend.id,
-                    "name": friend.name,
-                    "location": friend.location,
-                    "interests": friend.interests,
-                    "friends_since": relation.created_at.isoformat()
-                })
+            if friend_rows is None:
+                # Imported here because the repository depends on this helper
+                from .repository.profile_repository import ProfileRepository
+                friend_rows, _ = ProfileRepository.get_friends(profile.id)
+            friends = [PenpalsHelper.format_friend_response(relation, friend)
+                       for relation, friend in friend_rows]
             response["friends"] = friends
             response["friends_count"] = len(friends)
         
         return response
     
+    @staticmethod
+    def format_classroom_response(classroom, include_friends: bool = False,
+                                  friend_rows: Optional[List[Tuple]] = None) -> Dict:
+        """
+        Format classroom data for API responses.
+        
+        Args:
+            classroom: Profile/Classroom model instance
+            include_friends: Whether to include friends list
+            friend_rows: Optional (relation, friend) rows from ProfileRepository.get_friends
+            
+        Returns:
+            Formatted classroom dictionary
+        """
+        return PenpalsHelper.format_profile_response(classroom, include_friends=include_friends,
+                                                     friend_rows=friend_rows)
+    
+    @staticmethod
+    def format_friend_response(relation, friend) -> Dict:
+        """
+        Format one friend row for API responses.
+        
+        Args:
+            relation: Relation model instance linking the profile to the friend
+            friend: Profile model instance of the friend
+            
+        Returns:
+            Formatted friend dictionary
+        """
+        return {
+            "id": friend.id,
+            "name": friend.name,
+            "location": friend.location,
+            "class_size": friend.class_size,
+            "interests": friend.interests,
+            "friends_since": relation.created_at.isoformat()
+        }
+    
+    @staticmethod
+    def format_post_response(post, author) -> Dict:
+        """
+        Format one post for API responses.
+        
+        Args:
+            post: Post model instance
+            author: Profile model instance that wrote the post
+            
+        Returns:
+            Formatted post dictionary
+        """
+        return {
+            "id": post.id,
+            "profile_id": author.id,
+            "profile_name": author.name,
+            "content": post.content,
+            "created_at": post.created_at.isoformat()
+        }
+    
     @staticmethod
     def calculate_interest_similarity(interests1: List[str], interests2: List[str]) -> float:
         """
@@ -155,6 +287,38 @@ class PenpalsHelper:
         
         return intersection / union if union > 0 else 0.0
     
+    @staticmethod
+    def parse_page_args(args, default_size: int, max_size: int,
+                        cursor_type: Callable[[str], Any] = int) -> Tuple[int, Any]:
+        """
+        Read keyset pagination arguments from a query string.
+        
+        Args:
+            args: Request args with optional `limit` and `cursor`
+            default_size: Page size when `limit` is not given
+            max_size: Largest page size served; larger limits are clamped
+            cursor_type: Converts the cursor string, raising ValueError when it is invalid
+            
+        Returns:
+            Tuple of (page size, converted cursor or None)
+            
+        Raises:
+            ValueError: When limit is not a positive integer or the cursor is invalid
+        """
+        limit = args.get('limit', default_size)
+        cursor = args.get('cursor')
+        try:
+            limit = int(limit)
+        except (ValueError, TypeError):
+            raise ValueError("limit must be an integer")
+        try:
+            cursor = cursor_type(cursor) if cursor not in (None, '') else None
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor")
+        if limit < 1:
+            raise ValueError("limit must be a positive integer")
+        return min(limit, max_size), cursor
+    
     @staticmethod
     def get_current_utc_timestamp() -> datetime:
         """
@@ -0,0 +1,61 @@
+"""
+Flask JSON provider backed by orjson.
+orjson is an optional dependency: without it, or for values it cannot
+encode, serialization falls back to Flask's standard library provider.
+"""
+
+from typing import Any
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes with orjson when it is installed"""
+    # orjson always writes UTF-8; escaping non-ASCII would only cost time
+    ensure_ascii = False
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """
+        Serialize data as JSON to a string
+
+        Args:
+            obj: Data to serialize
+            kwargs: json.dumps arguments; only `indent` and `separators` are
+                    handled by orjson, anything else uses the standard library
+
+        Returns:
+            JSON string
+        """
+        if orjson is None or not kwargs.keys() <= {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+
+        # Dates keep Flask's HTTP-date format by going through self.default
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        except TypeError:
+            # e.g. integers beyond 64 bits or float subclasses
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        """
+        Deserialize JSON from a string or bytes
+
+        Args:
+            s: Text or UTF-8 bytes
+            kwargs: json.loads arguments (the standard library is used when given)
+
+        Returns:
+            Deserialized data
+        """
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
@@ -2,14 +2,21 @@
 Main Flask application for PenPals backend.
 Handles authentication, basic profile operations, and ChromaDB document management.
 Account and classroom management is handled by separate blueprints.
+
+Use create_app() to build the application. Heavy resources (database schema,
+ChromaDB clients, the embedding model) are initialized on first use, or up
+front by warmup().
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Blueprint, current_app, jsonify, request
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import timedelta
+from typing import Any, Dict, Optional
+import math
 import os
+import threading
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -18,60 +25,275 @@ from .model.account import Account
 from .model.profile import Profile
 from .model.relation import Relation
 from .model.post import Post
+from .model.suggestion import Suggestion
 from .model import db
+from .model.migrations import register_migration_commands
+from .helper import PenpalsHelper
+from .json_provider import FastJSONProvider
+from .streaming import JsonStream
+from .repository.profile_repository import ProfileRepository
+from .repository.account_repository import account_cache
+from .repository.post_repository import timeline_cache
 
 from .blueprint.account_bp import account_bp
-from .blueprint.profile_bp import profile_bp
+from .blueprint.post_bp import post_bp, post_index_queue
+from .blueprint.profile_bp import profile_bp, reindex_queue, suggestion_engine, suggestion_queue
+from .blueprint.profile_bp import chroma_service as profile_chroma_service
+from .blueprint.profile_bp import search_cache
 
 from .chromadb.chromadb_service import ChromaDBService
+from .chromadb.client_registry import chroma_registry
+from .chromadb.embedding_cache import embedding_cache
+from .chromadb.document_chunker import DocumentChunker, PARENT_ID_KEY, CHUNK_INDEX_KEY
+from .search.interest_vocabulary import interest_vocabulary
+from .security.password_service import PasswordService, PasswordServiceBusy, password_service
+from .security.rate_limiter import login_rate_limiter
 
-def print_tables():
-    with application.app_context():
-        print("Registered tables:", [table.name for table in db.metadata.sorted_tables])
 
+main_bp = Blueprint('main', __name__)
 
-application = Flask(__name__)
-CORS(application)
-print_tables()
+chroma_service = ChromaDBService(collection_name="penpals_documents", embedding_cache=embedding_cache)
 
+_init_lock = threading.Lock()
 
-application.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
-application.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production')
-application.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
 
-db_uri = os.getenv('SQLALCHEMY_DATABASE_URI', 'sqlite:///penpals_db/penpals.db')
-if db_uri.startswith('sqlite:///') and not db_uri.startswith('sqlite:////'):
-    rel_path = db_uri.replace('sqlite:///', '', 1)
-    # Ensure the directory exists
-    db_dir = os.path.dirname(rel_path)
-    if db_dir:
-        os.makedirs(db_dir, exist_ok=True)
-    abs_path = os.path.abspath(rel_path)
-    db_uri = f'sqlite:///{abs_path}'
-application.config['SQLALCHEMY_DATABASE_URI'] = db_uri
-application.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def default_config() -> Dict[str, Any]:
+    """
+    Build the default configuration from environment variables.
+    
+    Returns:
+        Dictionary of Flask config values
+    """
+    db_uri = os.getenv('SQLALCHEMY_DATABASE_URI', 'sqlite:///penpals_db/penpals.db')
+    if db_uri.startswith('sqlite:///') and not db_uri.startswith('sqlite:////'):
+        rel_path = db_uri.replace('sqlite:///', '', 1)
+        abs_path = os.path.abspath(rel_path)
+        db_uri = f'sqlite:///{abs_path}'
+    # Local state files (queue outboxes) live next to the SQLite database
+    if db_uri.startswith('sqlite:///'):
+        data_dir = os.path.dirname(db_uri.replace('sqlite:///', '', 1))
+    else:
+        data_dir = os.path.abspath('penpals_db')
+    
+    return {
+        'SECRET_KEY': os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production'),
+        'JWT_SECRET_KEY': os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production'),
+        'JWT_ACCESS_TOKEN_EXPIRES': timedelta(hours=24),
+        'SQLALCHEMY_DATABASE_URI': db_uri,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'CHROMA_PERSIST_DIRECTORY': os.getenv('CHROMA_PERSIST_DIRECTORY', './chroma_db'),
+        # Embedding function object for every collection; None uses ChromaDB's default model
+        'CHROMA_EMBEDDING_FUNCTION': None,
+        # Embeddings cached by content for every collection ("" keeps them in memory only)
+        'EMBEDDING_CACHE_SIZE': int(os.getenv('EMBEDDING_CACHE_SIZE', '10000')),
+        'EMBEDDING_CACHE_PATH': os.getenv('EMBEDDING_CACHE_PATH', ''),
+        'CHROMA_UPSERT_BATCH_SIZE': int(os.getenv('CHROMA_UPSERT_BATCH_SIZE', ChromaDBService.DEFAULT_BATCH_SIZE)),
+        'CHROMA_UPSERT_MAX_WORKERS': int(os.getenv('CHROMA_UPSERT_MAX_WORKERS', ChromaDBService.DEFAULT_MAX_WORKERS)),
+        # Uploaded documents are split into chunks of this many words (0 stores them whole)
+        'DOCUMENT_CHUNK_TOKENS': int(os.getenv('DOCUMENT_CHUNK_TOKENS', '200')),
+        'DOCUMENT_CHUNK_OVERLAP': int(os.getenv('DOCUMENT_CHUNK_OVERLAP', '40')),
+        # Maximum number of queries accepted by /api/documents/query/batch
+        'DOCUMENT_QUERY_BATCH_SIZE': int(os.getenv('DOCUMENT_QUERY_BATCH_SIZE', '32')),
+        # Keyset-paginated listings never return more than MAX_PAGE_SIZE rows
+        'DEFAULT_PAGE_SIZE': int(os.getenv('DEFAULT_PAGE_SIZE', '20')),
+        'MAX_PAGE_SIZE': int(os.getenv('MAX_PAGE_SIZE', '100')),
+        # Streamed listings (?stream=true) read rows in batches of this size
+        'STREAM_BATCH_SIZE': int(os.getenv('STREAM_BATCH_SIZE', '500')),
+        # Password hashes made with another method or salt length are replaced at login
+        'PASSWORD_HASH_METHOD': os.getenv('PASSWORD_HASH_METHOD', PasswordService.DEFAULT_METHOD),
+        'PASSWORD_SALT_LENGTH': int(os.getenv('PASSWORD_SALT_LENGTH', PasswordService.DEFAULT_SALT_LENGTH)),
+        'PASSWORD_HASH_WORKERS': int(os.getenv('PASSWORD_HASH_WORKERS', PasswordService.DEFAULT_MAX_WORKERS)),
+        'PASSWORD_HASH_MAX_PENDING': int(os.getenv('PASSWORD_HASH_MAX_PENDING', PasswordService.DEFAULT_MAX_PENDING)),
+        'PASSWORD_HASH_TIMEOUT': float(os.getenv('PASSWORD_HASH_TIMEOUT', PasswordService.DEFAULT_TIMEOUT)),
+        # Login attempts per client IP and per email, as "capacity/seconds" token buckets ("0" disables)
+        'LOGIN_RATE_LIMIT_IP': os.getenv('LOGIN_RATE_LIMIT_IP', '30/60'),
+        'LOGIN_RATE_LIMIT_EMAIL': os.getenv('LOGIN_RATE_LIMIT_EMAIL', '10/300'),
+        # "memory" (per process) or "sqlite" (shared by the workers of one host)
+        'RATE_LIMIT_STORE': os.getenv('RATE_LIMIT_STORE', 'memory'),
+        'RATE_LIMIT_STORE_PATH': os.getenv('RATE_LIMIT_STORE_PATH', './penpals_db/rate_limits.db'),
+        # Response caches; TTL 0 disables one. Invalidations reach every worker of the host with
+        # CACHE_STORE=sqlite; with "memory" other workers serve stale entries for up to the TTL
+        'CACHE_STORE': os.getenv('CACHE_STORE', 'sqlite'),
+        'CACHE_STORE_PATH': os.getenv('CACHE_STORE_PATH', os.path.join(data_dir, 'cache_generations.db')),
+        'SEARCH_CACHE_SIZE': int(os.getenv('SEARCH_CACHE_SIZE', '512')),
+        'SEARCH_CACHE_TTL': float(os.getenv('SEARCH_CACHE_TTL', '60')),
+        'ACCOUNT_CACHE_SIZE': int(os.getenv('ACCOUNT_CACHE_SIZE', '1024')),
+        'ACCOUNT_CACHE_TTL': float(os.getenv('ACCOUNT_CACHE_TTL', '5')),
+        'TIMELINE_CACHE_SIZE': int(os.getenv('TIMELINE_CACHE_SIZE', '1024')),
+        'TIMELINE_CACHE_TTL': float(os.getenv('TIMELINE_CACHE_TTL', '30')),
+        # Number of reverse proxies in front of the app (e.g. 1 behind Azure App Service or a
+        # Docker ingress) whose X-Forwarded-For/-Proto/-Host headers are trusted; 0 trusts none
+        'TRUSTED_PROXY_COUNT': int(os.getenv('TRUSTED_PROXY_COUNT', '0')),
+        # Background queues: worker threads and a durable SQLite outbox ("" keeps jobs in memory only)
+        'REINDEX_WORKERS': int(os.getenv('REINDEX_WORKERS', '1')),
+        'REINDEX_OUTBOX_PATH': os.getenv('REINDEX_OUTBOX_PATH', os.path.join(data_dir, 'reindex_outbox.db')),
+        'SUGGESTION_WORKERS': int(os.getenv('SUGGESTION_WORKERS', '1')),
+        'SUGGESTION_OUTBOX_PATH': os.getenv('SUGGESTION_OUTBOX_PATH', os.path.join(data_dir, 'suggestion_outbox.db')),
+        'POST_INDEX_WORKERS': int(os.getenv('POST_INDEX_WORKERS', '1')),
+        'POST_INDEX_OUTBOX_PATH': os.getenv('POST_INDEX_OUTBOX_PATH', os.path.join(data_dir, 'post_index_outbox.db')),
+        # When True, /api/health/ready fails until warmup() has finished
+        'REQUIRE_WARMUP': os.getenv('REQUIRE_WARMUP', 'False').lower() == 'true'
+    }
 
-capital_letters = [chr(i) for i in range(ord('A'), ord('Z')+1)]
-lowercase_letters = [chr(i) for i in range(ord('a'), ord('z')+1)]
-digits = [str(i) for i in range(10)]
 
-db.init_app(application)
-jwt = JWTManager(application)
+def create_app(config: Optional[Dict[str, Any]] = None) -> Flask:
+    """
+    Create and configure the Flask application without touching disk or loading models.
+    
+    Args:
+        config: Optional config values overriding the environment defaults
+        
+    Returns:
+        Configured Flask application
+    """
+    application = Flask(__name__)
+    application.json = FastJSONProvider(application)
+    CORS(application)
+    
+    application.config.update(default_config())
+    if config:
+        application.config.update(config)
+    
+    # Behind a proxy, request.remote_addr (used to throttle logins per IP) must be the client's address
+    trusted_proxies = application.config['TRUSTED_PROXY_COUNT']
+    if trusted_proxies > 0:
+        application.wsgi_app = ProxyFix(application.wsgi_app, x_for=trusted_proxies,
+                                        x_proto=trusted_proxies, x_host=trusted_proxies)
+    
+    db.init_app(application)
+    JWTManager(application)
+    chroma_registry.init_app(application)
+    embedding_cache.init_app(application)
+    suggestion_engine.init_app(application)
+    password_service.init_app(application)
+    login_rate_limiter.init_app(application)
+    search_cache.init_app(application, 'SEARCH_CACHE')
+    account_cache.init_app(application, 'ACCOUNT_CACHE')
+    timeline_cache.init_app(application, 'TIMELINE_CACHE')
+    reindex_queue.init_app(application, 'REINDEX')
+    suggestion_queue.init_app(application, 'SUGGESTION')
+    post_index_queue.init_app(application, 'POST_INDEX')
+    
+    # register blue prints for API endpoints
+    application.register_blueprint(account_bp)
+    application.register_blueprint(profile_bp)
+    application.register_blueprint(post_bp)
+    application.register_blueprint(main_bp)
+    register_migration_commands(application)
+    
+    application.extensions['penpals'] = {"initialized": False, "warm": False}
+    
+    @application.before_request
+    def _initialize_on_first_request():
+        initialize(application)
+    
+    return application
 
-# Initialize database tables
-with application.app_context():
-    db.create_all()
-    print("Database initialized successfully!")
 
-# register blue prints for API endpoints
-application.register_blueprint(account_bp)
-application.register_blueprint(profile_bp)
+def initialize(application: Flask) -> None:
+    """
+    Create database tables and start background workers (runs once per app).
+    
+    Args:
+        application: Flask application from create_app
+    """
+    state = application.extensions['penpals']
+    if state["initialized"]:
+        return
+    with _init_lock:
+        if state["initialized"]:
+            return
+        
+        db_uri = application.config['SQLALCHEMY_DATABASE_URI']
+        if db_uri.startswith('sqlite:///'):
+            # Ensure the directory exists
+            db_dir = os.path.dirname(db_uri.replace('sqlite:///', '', 1))
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+        
+        # Initialize database tables
+        with application.app_context():
+            print("Registered tables:", [table.name for table in db.metadata.sorted_tables])
+            db.create_all()
+            print("Database initialized successfully!")
+        
+        # Replay re-index and suggestion jobs left in the outboxes by a previous run
+        reindex_queue.start()
+        suggestion_queue.start()
+        post_index_queue.start()
+        
+        state["initialized"] = True
+
+
+def warmup(application: Flask) -> None:
+    """
+    Eagerly initialize everything that is otherwise loaded on first use:
+    database schema, ChromaDB clients and collections, and the embedding model.
+    
+    Args:
+        application: Flask application from create_app
+    """
+    initialize(application)
+    with application.app_context():
+        # Opens the shared client and both collections
+        chroma_service.get_collection_info()
+        profile_chroma_service.get_collection_info()
+        # Loads the embedding model
+        embedding_cache.embed(["warmup"])
+    application.extensions['penpals']["warm"] = True
+    print("Warmup complete")
+
+
+def reset_after_fork(application: Flask) -> None:
+    """
+    Re-create per-process resources in a freshly forked worker.
+    Pooled database connections, ChromaDB clients, SQLite handles and worker
+    threads inherited from the parent must not be shared across processes.
+    
+    Args:
+        application: Flask application loaded in the parent process
+    """
+    with application.app_context():
+        # Keep the parent's connections open, just stop using them here
+        db.engine.dispose(close=False)
+    chroma_registry.reset()
+    embedding_cache.reset_after_fork()
+    interest_vocabulary.reset_after_fork()
+    password_service.reset_after_fork()
+    login_rate_limiter.reset_after_fork()
+    search_cache.reset_after_fork()
+    account_cache.reset_after_fork()
+    timeline_cache.reset_after_fork()
+    reindex_queue.reset_after_fork()
+    suggestion_queue.reset_after_fork()
+    post_index_queue.reset_after_fork()
+    if application.extensions['penpals']["initialized"]:
+        reindex_queue.start()
+        suggestion_queue.start()
+        post_index_queue.start()
 
-chroma_service = ChromaDBService(persist_directory="./chroma_db", collection_name="penpals_documents")
 
 # routes
 
-@application.route('/api/auth/register', methods=['POST'])
+@main_bp.route('/api/health/live', methods=['GET'])
+def liveness():
+    """Liveness probe"""
+    return jsonify({"status": "ok"}), 200
+
+
+@main_bp.route('/api/health/ready', methods=['GET'])
+def readiness():
+    """Readiness probe; fails until warmup has finished when REQUIRE_WARMUP is set"""
+    state = current_app.extensions['penpals']
+    ready = state["warm"] or not current_app.config['REQUIRE_WARMUP']
+    return jsonify({
+        "status": "ready" if ready else "warming_up",
+        "initialized": state["initialized"],
+        "warm": state["warm"]
+    }), 200 if ready else 503
+
+
+@main_bp.route('/api/auth/register', methods=['POST'])
 def register():
     """Register a new account"""
     data = request.json
@@ -84,14 +306,7 @@ def register():
         return jsonify({"msg": "Missing required fields"}), 400
     
     # Password validation: at least 8 chars, one uppercase, one lowercase, one digit, one special char
-    has_upper = any(c in capital_letters for c in password)
-    has_lower = any(c in lowercase_letters for c in password)
-    has_digit = any(c in digits for c in password)
-    has_special = any(
-        c not in capital_letters and c not in lowercase_letters and c not in digits
-        for c in password
-    )
-    if not (len(password) >= 8 and has_upper and has_lower and has_digit and has_special):
+    if password_service.policy_failures(password):
         return jsonify({
             "msg": "Password must be at least 8 characters and include one uppercase, one lowercase, one digit, and one special character."
         }), 400
@@ -100,8 +315,11 @@ def register():
     if Account.query.filter_by(email=email).first():
         return jsonify({"msg": "Account already exists"}), 409
     
-    # Hash password using werkzeug
-    password_hash = generate_password_hash(password)
+    # Hash password off the request thread
+    try:
+        password_hash = password_service.hash(password)
+    except PasswordServiceBusy:
+        return jsonify({"msg": "Server busy, please try again"}), 503
     
     # Create account (no automatic profile creation)
     account = Account(email=email, password_hash=password_hash, organization=organization)
@@ -114,7 +332,7 @@ def register():
     }), 201
 
 
-@application.route('/api/auth/login', methods=['POST'])
+@main_bp.route('/api/auth/login', methods=['POST'])
 def login():
     """Login and receive JWT token"""
     data = request.json
@@ -125,11 +343,34 @@ def login():
     if not email or not password:
         return jsonify({"msg": "Missing email or password"}), 400
     
+    if not isinstance(email, str) or not isinstance(password, str):
+        return jsonify({"msg": "Email and password must be strings"}), 400
+    
+    # Throttle before any database or hashing work
+    allowed, retry_after = login_rate_limiter.hit(ip=request.remote_addr, email=email.strip().lower())
+    if not allowed:
+        return jsonify({"msg": "Too many login attempts, please try again later"}), 429, {
+            "Retry-After": str(math.ceil(retry_after))
+        }
+    
     account = Account.query.filter_by(email=email).first()
     
-    if not account or not check_password_hash(account.password_hash, password):
+    if not account:
+        return jsonify({"msg": "Invalid credentials"}), 401
+    
+    try:
+        valid, new_hash = password_service.verify_and_update(account.password_hash, password)
+    except PasswordServiceBusy:
+        return jsonify({"msg": "Server busy, please try again"}), 503
+    
+    if not valid:
         return jsonify({"msg": "Invalid credentials"}), 401
     
+    # Upgrade hashes made with older hashing parameters
+    if new_hash:
+        account.password_hash = new_hash
+        db.session.commit()
+    
     # Create JWT token with account ID as identity
     access_token = create_access_token(identity=str(account.id))
     
@@ -139,24 +380,42 @@ def login():
     }), 200
 
 
-@application.route('/api/auth/me', methods=['GET'])
+@main_bp.route('/api/auth/rate-limits', methods=['GET'])
+@jwt_required()
+def get_rate_limit_stats():
+    """Get login rate limit settings and allowed/rejected counters of this worker"""
+    return jsonify({
+        "login": login_rate_limiter.stats(),
+        "password_hashing": password_service.stats()
+    }), 200
+
+
+@main_bp.route('/api/auth/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
-    """Get current authenticated user's info"""
+    """Get current authenticated user's info with one page of classrooms (?limit=&cursor=)"""
     account_id = get_jwt_identity()
     account = Account.query.get(account_id)
     
     if not account:
         return jsonify({"msg": "Account not found"}), 404
     
-    # Get all classrooms for this account
+    try:
+        limit, cursor = PenpalsHelper.parse_page_args(
+            request.args, current_app.config['DEFAULT_PAGE_SIZE'], current_app.config['MAX_PAGE_SIZE']
+        )
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    
+    # Get one page of classrooms for this account
+    profiles, next_cursor = ProfileRepository.get_account_profiles(account.id, limit, cursor)
     classrooms = []
-    for classroom in account.classrooms:
+    for classroom in profiles:
         classrooms.append({
             "id": classroom.id,
             "name": classroom.name,
             "location": classroom.location,
-            "latitude": classroom.lattitude,  # Note: keeping original typo for consistency
+            "latitude": classroom.latitude,
             "longitude": classroom.longitude,
             "class_size": classroom.class_size,
             "interests": classroom.interests
@@ -168,10 +427,11 @@ def get_current_user():
             "email": account.email,
             "organization": account.organization
         },
-        "classrooms": classrooms
+        "classrooms": classrooms,
+        "next_cursor": next_cursor
     }), 200
 
-@application.route('/api/profiles/get', methods=["GET"])
+@main_bp.route('/api/profiles/get', methods=["GET"])
 def get_profile():
     """Get profile by ID"""
     data = request.json
@@ -199,7 +459,7 @@ def get_profile():
     }), 200
 
 # Create a new profile from JSON
-@application.route('/api/profiles/create', methods=["POST"])
+@main_bp.route('/api/profiles/create', methods=["POST"])
 def create_profile():
     """Create a new profile from JSON"""
     data = request.json
@@ -230,15 +490,34 @@ def create_profile():
 
 # ChromaDB Document Endpoints
 
-@application.route('/api/documents/upload', methods=['POST'])
+def _document_chunker() -> Optional[DocumentChunker]:
+    """Chunker configured for the app, or None when chunking is disabled"""
+    max_tokens = current_app.config['DOCUMENT_CHUNK_TOKENS']
+    if max_tokens <= 0:
+        return None
+    return DocumentChunker(max_tokens, current_app.config['DOCUMENT_CHUNK_OVERLAP'])
+
+
+@main_bp.route('/api/documents/upload', methods=['POST'])
 def upload_documents():
     """
     Upload documents to ChromaDB for embedding and storage
+    Documents are upserted in chunks with bounded concurrency. Unless chunking
+    is disabled, each document is first split into overlapping passages stored
+    as "<id>#<n>" with the document's ID in their `parent_id` metadata.
+    Without `ids`, IDs are derived from each document's content, so uploading
+    the same corpus again does not duplicate it. Documents stored with the
+    same content are not embedded again; they are listed under "skipped",
+    after their stored metadata was replaced if the upload brings other metadata.
     Expected JSON format:
     {
         "documents": ["text1", "text2", ...],
         "metadatas": [{"key": "value"}, ...],  // optional
-        "ids": ["id1", "id2", ...]  // optional
+        "ids": ["id1", "id2", ...],  // optional
+        "chunk": false,  // optional, store documents whole
+        "skip_existing": false,  // optional, re-embed documents stored with the same content
+        "stream": true  // optional, stream per-chunk progress as NDJSON,
+                        // followed by a final line listing skipped documents
     }
     """
     try:
@@ -254,10 +533,51 @@ def upload_documents():
         if not isinstance(documents, list) or len(documents) == 0:
             return jsonify({"status": "error", "message": "'documents' must be a non-empty list"}), 400
         
-        result = chroma_service.add_documents(documents, metadatas, ids)
+        if metadatas is not None and (not isinstance(metadatas, list) or len(metadatas) != len(documents)):
+            return jsonify({"status": "error", "message": "'metadatas' must be a list matching 'documents'"}), 400
+        
+        if ids is not None and (not isinstance(ids, list) or len(ids) != len(documents)):
+            return jsonify({"status": "error", "message": "'ids' must be a list matching 'documents'"}), 400
+        
+        batch_size = current_app.config['CHROMA_UPSERT_BATCH_SIZE']
+        max_workers = current_app.config['CHROMA_UPSERT_MAX_WORKERS']
+        chunker = _document_chunker() if data.get('chunk', True) else None
+        skipped = []
+        
+        if chunker is not None and ids is None:
+            ids = [ChromaDBService.content_id(document) for document in documents]
+        # Rows are deduplicated, chunked and upserted lazily, batch by batch
+        rows = chroma_service.iter_deduplicated_rows(
+            ChromaDBService.iter_rows(documents, metadatas, ids), skipped,
+            skip_existing=bool(data.get('skip_existing', True)), batch_size=batch_size,
+            stored_id=(lambda parent_id: DocumentChunker.chunk_id(parent_id, 0)) if chunker is not None else None,
+            parent_key=PARENT_ID_KEY if chunker is not None else None,
+            kept_keys=(CHUNK_INDEX_KEY,) if chunker is not None else ()
+        )
+        # A changed document may now have fewer chunks than the stored version;
+        # the leftover chunks are deleted once the new ones are stored
+        parent_key = None
+        if chunker is not None:
+            rows = chunker.iter_row_chunks(rows)
+            parent_key = PARENT_ID_KEY
+        
+        if JsonStream.requested(data.get('stream')):
+            def progress():
+                yield from chroma_service.iter_upsert_rows(rows, batch_size, max_workers, parent_key)
+                yield {"status": "skipped", "items": skipped}
+            return JsonStream.ndjson(progress())
+        
+        result = chroma_service.upsert_rows(rows, batch_size, max_workers, parent_key=parent_key)
+        if chunker is not None:
+            result['parent_ids'] = ids
+        if 'items' in result:
+            result['message'] += f", skipped {len(skipped)} unchanged or duplicate documents"
+            result['skipped'] = skipped
         
         if result['status'] == 'success':
             return jsonify(result), 201
+        elif result['status'] == 'partial':
+            return jsonify(result), 207
         else:
             return jsonify(result), 500
             
@@ -265,7 +585,7 @@ def upload_documents():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-@application.route('/api/documents/query', methods=['POST'])
+@main_bp.route('/api/documents/query', methods=['POST'])
 def query_documents():
     """
     Query ChromaDB for similar documents
@@ -273,7 +593,10 @@ def query_documents():
     {
         "query": "search text",
         "n_results": 5,  // optional, defaults to 5
-        "where": {"key": "value"}  // optional metadata filter
+        "where": {"key": "value"},  // optional metadata filter
+        "collapse_parents": true,  // optional, one match per uploaded document
+                                   // (defaults to true while chunking is enabled)
+        "stream": true  // optional, stream matches as NDJSON, one per line
     }
     """
     try:
@@ -285,11 +608,16 @@ def query_documents():
         query_text = data.get('query')
         n_results = data.get('n_results', 5)
         where = data.get('where', None)
+        collapse_parents = bool(data.get('collapse_parents', current_app.config['DOCUMENT_CHUNK_TOKENS'] > 0))
         
         if not isinstance(query_text, str) or len(query_text.strip()) == 0:
             return jsonify({"status": "error", "message": "'query' must be a non-empty string"}), 400
         
-        result = chroma_service.query_documents(query_text, n_results, where)
+        if JsonStream.requested(data.get('stream')):
+            return JsonStream.ndjson(chroma_service.iter_query_documents(query_text, n_results, where,
+                                                                         collapse_parents))
+        
+        result = chroma_service.query_documents(query_text, n_results, where, collapse_parents)
         
         if result['status'] == 'success':
             return jsonify(result), 200
@@ -300,10 +628,76 @@ def query_documents():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-@application.route('/api/documents/delete', methods=['DELETE'])
+@main_bp.route('/api/documents/query/batch', methods=['POST'])
+def query_documents_batch():
+    """
+    Run several similarity queries in one request. Queries sharing a filter are
+    embedded together and answered by a single collection query.
+    Expected JSON format:
+    {
+        "queries": [
+            {
+                "key": "sidebar",  // optional, defaults to the query's position
+                "query": "search text",
+                "n_results": 5,  // optional, defaults to 5
+                "where": {"key": "value"}  // optional metadata filter
+            },
+            ...
+        ],
+        "collapse_parents": true  // optional, as for /api/documents/query
+    }
+    Results are returned under "results", keyed by each query's key.
+    """
+    try:
+        data = request.json
+        
+        if not data or 'queries' not in data:
+            return jsonify({"status": "error", "message": "Missing 'queries' field"}), 400
+        
+        queries = data.get('queries')
+        max_queries = current_app.config['DOCUMENT_QUERY_BATCH_SIZE']
+        
+        if not isinstance(queries, list) or len(queries) == 0:
+            return jsonify({"status": "error", "message": "'queries' must be a non-empty list"}), 400
+        
+        if len(queries) > max_queries:
+            return jsonify({"status": "error", "message": f"At most {max_queries} queries per batch"}), 400
+        
+        keys = []
+        for index, query in enumerate(queries):
+            if not isinstance(query, dict):
+                return jsonify({"status": "error", "message": "Each query must be an object"}), 400
+            query_text = query.get('query')
+            if not isinstance(query_text, str) or len(query_text.strip()) == 0:
+                return jsonify({"status": "error", "message": "'query' must be a non-empty string"}), 400
+            n_results = query.get('n_results', 5)
+            if not isinstance(n_results, int) or isinstance(n_results, bool) or n_results < 1:
+                return jsonify({"status": "error", "message": "'n_results' must be a positive integer"}), 400
+            where = query.get('where')
+            if where is not None and (not isinstance(where, dict) or len(where) == 0):
+                return jsonify({"status": "error", "message": "'where' must be a non-empty object"}), 400
+            keys.append(str(query.get('key', index)))
+        
+        if len(set(keys)) != len(keys):
+            return jsonify({"status": "error", "message": "Query keys must be unique"}), 400
+        
+        collapse_parents = bool(data.get('collapse_parents', current_app.config['DOCUMENT_CHUNK_TOKENS'] > 0))
+        result = chroma_service.query_batch(queries, collapse_parents)
+        
+        if result['status'] == 'success':
+            result['results'] = dict(zip(keys, result['results']))
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 500
+            
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@main_bp.route('/api/documents/delete', methods=['DELETE'])
 def delete_documents():
     """
-    Delete documents from ChromaDB
+    Delete documents from ChromaDB, including the chunks of chunked documents
     Expected JSON format:
     {
         "ids": ["id1", "id2", ...]
@@ -321,6 +715,10 @@ def delete_documents():
             return jsonify({"status": "error", "message": "'ids' must be a non-empty list"}), 400
         
         result = chroma_service.delete_documents(ids)
+        if result['status'] == 'success':
+            chunks_result = chroma_service.delete_where({PARENT_ID_KEY: {"$in": ids}})
+            if chunks_result['status'] != 'success':
+                result = chunks_result
         
         if result['status'] == 'success':
             return jsonify(result), 200
@@ -331,7 +729,7 @@ def delete_documents():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-@application.route('/api/documents/info', methods=['GET'])
+@main_bp.route('/api/documents/info', methods=['GET'])
 def get_collection_info():
     """
     Get information about the ChromaDB collection
@@ -348,10 +746,11 @@ def get_collection_info():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-@application.route('/api/documents/update', methods=['PUT'])
+@main_bp.route('/api/documents/update', methods=['PUT'])
 def update_document():
     """
     Update an existing document in ChromaDB
+    A chunked document has its chunks replaced by the chunks of the new text.
     Expected JSON format:
     {
         "id": "document_id",
@@ -375,7 +774,32 @@ def update_document():
         if not isinstance(document, str) or len(document.strip()) == 0:
             return jsonify({"status": "error", "message": "'document' must be a non-empty string"}), 400
         
-        result = chroma_service.update_document(document_id, document, metadata)
+        chunker = _document_chunker()
+        stored = {}
+        if chunker is not None:
+            first_chunk_id = DocumentChunker.chunk_id(document_id, 0)
+            stored = chroma_service.get_metadatas([first_chunk_id])
+            if stored['status'] != 'success':
+                return jsonify(stored), 500
+            stored = stored['metadatas'].get(first_chunk_id) or {}
+        
+        if stored:
+            if metadata is None:
+                # Keep the document's metadata, which every chunk carries
+                metadata = {key: value for key, value in stored.items()
+                            if key not in (PARENT_ID_KEY, CHUNK_INDEX_KEY)}
+            metadata = dict(metadata)
+            metadata[ChromaDBService.CONTENT_HASH_KEY] = ChromaDBService.content_hash(document)
+            # Old chunks beyond the new chunk count are deleted after the upsert
+            result = chroma_service.upsert_rows(
+                chunker.iter_chunks([document], [metadata], [document_id]),
+                current_app.config['CHROMA_UPSERT_BATCH_SIZE'],
+                current_app.config['CHROMA_UPSERT_MAX_WORKERS'],
+                parent_key=PARENT_ID_KEY
+            )
+            result['document_id'] = document_id
+        else:
+            result = chroma_service.update_document(document_id, document, metadata)
         
         if result['status'] == 'success':
             return jsonify(result), 200
@@ -387,4 +811,4 @@ def update_document():
 
 
 if __name__ == '__main__':
-    application.run(host='0.0.0.0', port=5001)
+    create_app().run(host='0.0.0.0', port=5001)
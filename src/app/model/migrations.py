@@ -0,0 +1,233 @@
+"""
+Schema migrations for databases created before a model change.
+db.create_all() only creates missing tables, so existing databases are
+upgraded with these functions (exposed as `flask` CLI commands by create_app).
+"""
+
+from typing import Dict, List
+from sqlalchemy import MetaData, Table, inspect, text
+from . import db
+from ..helper import PenpalsHelper
+from .profile import Profile
+from .relation import Relation
+
+
+def _rebuild_sqlite_table(connection, table: Table, select_sql: str, column_names: List[str]) -> None:
+    """
+    Recreate a table from its current model definition and refill it.
+    SQLite cannot alter column types or add constraints in place.
+
+    Args:
+        connection: Connection inside a transaction
+        table: Model table to rebuild
+        select_sql: SELECT producing `column_names` from the old table
+        column_names: Columns filled by `select_sql`
+    """
+    metadata = MetaData()
+    # The copy needs the referenced tables to resolve its foreign keys
+    for other in db.metadata.sorted_tables:
+        if other is not table:
+            other.to_metadata(metadata)
+    new_table = table.to_metadata(metadata, name=f'{table.name}_new')
+
+    # Index names are schema-wide, so free them before the copy takes them over
+    for index in table.indexes:
+        connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    new_table.create(connection)
+    connection.execute(text(f"INSERT INTO {new_table.name} ({', '.join(column_names)}) {select_sql}"))
+    connection.execute(text(f"DROP TABLE {table.name}"))
+    connection.execute(text(f"ALTER TABLE {new_table.name} RENAME TO {table.name}"))
+
+
+def _clear_invalid_coordinates(connection) -> int:
+    """
+    Set coordinates that are not numbers within range to NULL, so the type
+    conversion cannot turn them into a real point (SQLite casts text to 0.0).
+
+    Args:
+        connection: Connection inside a transaction
+
+    Returns:
+        Number of coordinate values cleared
+    """
+    cleared = []
+    rows = connection.execute(text(
+        "SELECT id, latitude, longitude FROM profiles WHERE latitude IS NOT NULL OR longitude IS NOT NULL"
+    ))
+    for profile_id, latitude, longitude in rows:
+        for name, value, limit in (('latitude', latitude, 90.0), ('longitude', longitude, 180.0)):
+            if value is None or not str(value).strip():
+                continue
+            parsed = PenpalsHelper.parse_coordinate(str(value))
+            if parsed is None or not -limit <= parsed <= limit:
+                cleared.append((name, profile_id))
+    for name, profile_id in cleared:
+        connection.execute(text(f"UPDATE profiles SET {name} = NULL WHERE id = :id"), {"id": profile_id})
+    return len(cleared)
+
+
+def migrate_profile_coordinates() -> Dict[str, int]:
+    """
+    Convert profiles.latitude/longitude from text to numeric columns and add
+    the coordinate index. Values that are not numbers within range become NULL.
+    Must run inside an application context.
+
+    Returns:
+        Dictionary with the number of profile rows migrated and of coordinate
+        values cleared (both 0 when already up to date)
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    if 'profiles' not in inspector.get_table_names():
+        return {"migrated": 0, "cleared": 0}
+
+    columns = {column['name']: column for column in inspector.get_columns('profiles')}
+    if 'CHAR' not in str(columns['latitude']['type']).upper():
+        for index in Profile.__table__.indexes:
+            index.create(engine, checkfirst=True)
+        return {"migrated": 0, "cleared": 0}
+
+    # Columns added to the model later are left at their defaults
+    column_names = [column.name for column in Profile.__table__.columns if column.name in columns]
+
+    def select_expression(name):
+        if name in ('latitude', 'longitude'):
+            return f"CAST(NULLIF(TRIM({name}), '') AS REAL)"
+        return name
+
+    with engine.begin() as connection:
+        count = connection.execute(text("SELECT COUNT(*) FROM profiles")).scalar()
+        cleared = _clear_invalid_coordinates(connection)
+
+        if engine.dialect.name == 'sqlite':
+            _rebuild_sqlite_table(
+                connection, Profile.__table__,
+                f"SELECT {', '.join(select_expression(name) for name in column_names)} FROM profiles",
+                column_names
+            )
+        else:
+            for name in ('latitude', 'longitude'):
+                connection.execute(text(
+                    f"ALTER TABLE profiles ALTER COLUMN {name} TYPE DOUBLE PRECISION "
+                    f"USING NULLIF(TRIM({name}), '')::double precision"
+                ))
+            for index in Profile.__table__.indexes:
+                index.create(connection, checkfirst=True)
+
+    return {"migrated": count, "cleared": cleared}
+
+
+def migrate_symmetric_relations() -> Dict[str, int]:
+    """
+    Collapse friendships stored as two directed rows into one canonical
+    (lower ID, higher ID) row, then add the ordering check and the reverse
+    index. Must run inside an application context.
+
+    Returns:
+        Dictionary with the number of relation rows before and after
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    if 'relations' not in inspector.get_table_names():
+        return {"before": 0, "after": 0}
+
+    check_names = {check.get('name') for check in inspector.get_check_constraints('relations')}
+    with engine.begin() as connection:
+        before = connection.execute(text("SELECT COUNT(*) FROM relations")).scalar()
+        if 'canonical_relation' in check_names:
+            for index in Relation.__table__.indexes:
+                index.create(connection, checkfirst=True)
+            return {"before": before, "after": before}
+
+        if engine.dialect.name == 'sqlite':
+            # Keep the oldest row of each pair; two-argument MIN/MAX are scalar in SQLite
+            _rebuild_sqlite_table(
+                connection, Relation.__table__,
+                "SELECT MIN(id), MIN(from_profile_id, to_profile_id), MAX(from_profile_id, to_profile_id), "
+                "MIN(status), MIN(created_at) FROM relations "
+                "WHERE from_profile_id <> to_profile_id "
+                "GROUP BY MIN(from_profile_id, to_profile_id), MAX(from_profile_id, to_profile_id)",
+                ['id', 'from_profile_id', 'to_profile_id', 'status', 'created_at']
+            )
+        else:
+            # Flip one-directional rows, then drop the reversed duplicates
+            connection.execute(text(
+                "UPDATE relations SET from_profile_id = to_profile_id, to_profile_id = from_profile_id "
+                "WHERE from_profile_id > to_profile_id AND NOT EXISTS ("
+                "SELECT 1 FROM relations r WHERE r.from_profile_id = relations.to_profile_id "
+                "AND r.to_profile_id = relations.from_profile_id)"
+            ))
+            connection.execute(text(
+                "DELETE FROM relations WHERE from_profile_id >= to_profile_id"
+            ))
+            connection.execute(text(
+                "ALTER TABLE relations ADD CONSTRAINT canonical_relation CHECK (from_profile_id < to_profile_id)"
+            ))
+            for index in Relation.__table__.indexes:
+                index.create(connection, checkfirst=True)
+
+        after = connection.execute(text("SELECT COUNT(*) FROM relations")).scalar()
+
+    return {"before": before, "after": after}
+
+
+def upgrade_schema() -> Dict[str, List[str]]:
+    """
+    Add nullable columns and indexes that the models define but an existing
+    database lacks. Must run inside an application context.
+
+    Returns:
+        Dictionary with the added columns and indexes
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added: Dict[str, List[str]] = {"columns": [], "indexes": []}
+
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                added["columns"].append(f"{table.name}.{column.name}")
+
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
+                    added["indexes"].append(index.name)
+
+    return added
+
+
+def register_migration_commands(application) -> None:
+    """
+    Register migration commands on the Flask CLI.
+
+    Args:
+        application: Flask application
+    """
+    @application.cli.command('migrate-coordinates')
+    def migrate_coordinates_command():
+        """Convert profile coordinates to numeric columns"""
+        counts = migrate_profile_coordinates()
+        print(f"Migrated coordinates of {counts['migrated']} profiles, "
+              f"cleared {counts['cleared']} values that were not valid coordinates")
+
+    @application.cli.command('migrate-relations')
+    def migrate_relations_command():
+        """Collapse two-row friendships into one canonical row"""
+        counts = migrate_symmetric_relations()
+        print(f"Relations: {counts['before']} rows before, {counts['after']} after")
+
+    @application.cli.command('upgrade-schema')
+    def upgrade_schema_command():
+        """Add missing nullable columns and indexes to existing tables"""
+        added = upgrade_schema()
+        print(f"Added columns: {', '.join(added['columns']) or 'none'}")
+        print(f"Added indexes: {', '.join(added['indexes']) or 'none'}")
@@ -8,10 +8,12 @@ class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     profile_id = db.Column(db.Integer, db.ForeignKey('profiles.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     
-    # Relationships
-    profile = db.relationship('Profile', backref='posts')
+    __table_args__ = (
+        # Feeds are read newest first by keyset on (created_at, id) within a profile
+        db.Index('ix_posts_profile_id_created_at_id', 'profile_id', 'created_at', 'id'),
+    )
     
     def __repr__(self):
-        return f'<Post {self.id} by {self.profile_id}>'
\ No newline at end of file
+        return f'<Post {self.id} by {self.profile_id}>'
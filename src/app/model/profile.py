@@ -8,9 +8,10 @@ class Profile(db.Model):
     
     name = db.Column(db.String(100), nullable=False)
     location = db.Column(db.String(100), nullable=True) # Name of the place eg London
-    latitude = db.Column(db.String(100), nullable=True)
-    longitude = db.Column(db.String(100), nullable=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
     size = db.Column(db.Integer, nullable=True)
+    class_size = db.synonym('size')  # name used by the API layer
     availability = db.Column(db.JSON, nullable=True)  # Store as JSON array
     interests = db.Column(db.JSON, nullable=True)  # Store as JSON array
     profile_metadata = db.Column(db.JSON, nullable=True)  # Additional data for generize whatever Store as JSON array
@@ -20,6 +21,18 @@ class Profile(db.Model):
                                      backref='from_profile', lazy='dynamic', cascade='all, delete-orphan')
     received_relations = db.relationship('Relation', foreign_keys='Relation.to_profile_id',
                                          backref='to_profile', lazy='dynamic', cascade='all, delete-orphan')
+    suggestions = db.relationship('Suggestion', foreign_keys='Suggestion.profile_id',
+                                  backref='profile', lazy='dynamic', cascade='all, delete-orphan')
+    suggested_to = db.relationship('Suggestion', foreign_keys='Suggestion.suggested_profile_id',
+                                   backref='suggested_profile', lazy='dynamic', cascade='all, delete-orphan')
+    posts = db.relationship('Post', backref='profile', lazy='dynamic', cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # Bounding-box lookups for nearby search range-scan latitude and filter longitude in the index
+        db.Index('ix_profiles_latitude_longitude', 'latitude', 'longitude'),
+        # Keyset pagination of an account's classrooms
+        db.Index('ix_profiles_account_id_id', 'account_id', 'id'),
+    )
     
     def __repr__(self):
         return f'<Profile {self.name}>'
@@ -3,19 +3,37 @@ from datetime import datetime, timezone
 
 
 class Relation(db.Model):
-    """Profile-to-Profile connections (friendships/connections)"""
+    """
+    Profile-to-Profile connections (friendships/connections).
+    A friendship is stored once, as (smaller profile ID, larger profile ID).
+    """
     __tablename__ = 'relations'
-    
+
     id = db.Column(db.Integer, primary_key=True)
     from_profile_id = db.Column(db.Integer, db.ForeignKey('profiles.id'), nullable=False)
     to_profile_id = db.Column(db.Integer, db.ForeignKey('profiles.id'), nullable=False)
     status = db.Column(db.Integer, default='pending')  # pending, accepted, blocked
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
-    
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
     __table_args__ = (
+        db.CheckConstraint('from_profile_id < to_profile_id', name='canonical_relation'),
+        # Friends of the lower ID are read from the unique index, friends of the higher ID from the reverse one
         db.UniqueConstraint('from_profile_id', 'to_profile_id', name='unique_relation'),
+        db.Index('ix_relations_to_profile_id_from_profile_id', 'to_profile_id', 'from_profile_id'),
+        # Keyset pagination of friend lists walks both sides in relation ID order
+        db.Index('ix_relations_from_profile_id_id', 'from_profile_id', 'id'),
+        db.Index('ix_relations_to_profile_id_id', 'to_profile_id', 'id'),
     )
-    
-    def __repr__(self):
-        return f'<Relation {self.from_profile_id} -> {self.to_profile_id}>'
 
+    @staticmethod
+    def canonical_pair(profile_id: int, other_profile_id: int) -> tuple:
+        """Order two profile IDs the way a friendship row stores them"""
+        profile_id, other_profile_id = int(profile_id), int(other_profile_id)
+        return (profile_id, other_profile_id) if profile_id < other_profile_id else (other_profile_id, profile_id)
+
+    def other_profile_id(self, profile_id: int) -> int:
+        """ID of the friend on the other side of this relation"""
+        return self.to_profile_id if self.from_profile_id == int(profile_id) else self.from_profile_id
+
+    def __repr__(self):
+        return f'<Relation {self.from_profile_id} <-> {self.to_profile_id}>'
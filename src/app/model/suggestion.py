@@ -0,0 +1,23 @@
+from . import db
+from datetime import datetime, timezone
+
+
+class Suggestion(db.Model):
+    """Precomputed penpal suggestions (top-K candidates per profile)"""
+    __tablename__ = 'suggestions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    profile_id = db.Column(db.Integer, db.ForeignKey('profiles.id'), nullable=False)
+    suggested_profile_id = db.Column(db.Integer, db.ForeignKey('profiles.id'), nullable=False)
+    rank = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    __table_args__ = (
+        # Serves GET /api/profiles/<id>/suggestions in rank order from the index
+        db.UniqueConstraint('profile_id', 'rank', name='unique_suggestion_rank'),
+        db.Index('ix_suggestions_suggested_profile_id', 'suggested_profile_id'),
+    )
+    
+    def __repr__(self):
+        return f'<Suggestion {self.profile_id} -> {self.suggested_profile_id} #{self.rank}>'
@@ -0,0 +1,172 @@
+"""
+Aggregate account queries.
+Serves account-wide classroom listings and statistics from one grouped query,
+with an optional short-TTL cache keyed by account ID.
+"""
+
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from sqlalchemy import func, select, union_all
+from ..model import db
+from ..model.profile import Profile
+from ..model.relation import Relation
+from ..cache.ttl_cache import TTLCache
+from .profile_repository import ProfileRepository
+
+
+# Set ACCOUNT_CACHE_TTL=0 to disable caching (configured in init_app)
+account_cache = TTLCache(maxsize=1024, ttl=5.0)
+
+
+class AccountRepository:
+    """Static query helpers for account-wide aggregates"""
+
+    @staticmethod
+    def _friend_counts(account_id: int):
+        """
+        Subquery of friend counts per profile, restricted to one account.
+        Each friendship row counts for both of its profiles, so both columns are unioned.
+        """
+        ends = union_all(
+            select(Relation.from_profile_id.label('profile_id'))
+            .join(Profile, Profile.id == Relation.from_profile_id)
+            .where(Profile.account_id == account_id),
+            select(Relation.to_profile_id.label('profile_id'))
+            .join(Profile, Profile.id == Relation.to_profile_id)
+            .where(Profile.account_id == account_id)
+        ).subquery()
+        return (
+            select(ends.c.profile_id, func.count().label('friends_count'))
+            .group_by(ends.c.profile_id)
+            .subquery()
+        )
+
+    @staticmethod
+    def get_classrooms_with_friend_counts(account_id: int, limit: int,
+                                          cursor: Optional[int] = None) -> Tuple[List[Tuple[Profile, int]], Optional[int]]:
+        """
+        Load one page of an account's classrooms together with their friend counts.
+
+        The page is read by keyset from the (account_id, id) index, then friend
+        counts for just that page come from one grouped query, so the cost of
+        a page does not grow with the size of the account.
+
+        Args:
+            account_id: Owning account ID
+            limit: Maximum number of classrooms to return
+            cursor: Optional profile ID; only classrooms after it are returned
+
+        Returns:
+            Tuple of (list of (profile, friends_count) rows ordered by profile ID,
+            next cursor or None when there are no more classrooms)
+        """
+        profiles, next_cursor = ProfileRepository.get_account_profiles(account_id, limit, cursor)
+        counts = ProfileRepository.get_friend_counts(profile.id for profile in profiles)
+        return [(profile, counts[profile.id]) for profile in profiles], next_cursor
+
+    @staticmethod
+    def iter_classroom_pages(account_id: int, batch_size: int,
+                             cursor: Optional[int] = None) -> Iterator[List[Tuple[Profile, int]]]:
+        """
+        Walk all of an account's classrooms with their friend counts, one keyset
+        page of `batch_size` classrooms at a time.
+
+        Args:
+            account_id: Owning account ID
+            batch_size: Classrooms read per query
+            cursor: Optional profile ID; only classrooms after it are returned
+
+        Yields:
+            Non-empty lists of (profile, friends_count) rows ordered by profile ID
+        """
+        while True:
+            rows, cursor = AccountRepository.get_classrooms_with_friend_counts(account_id, batch_size, cursor)
+            if rows:
+                yield rows
+            if cursor is None:
+                return
+
+    @staticmethod
+    def get_account_stats(account_id: int) -> Dict[str, Any]:
+        """
+        Compute classroom, connection and distinct-interest totals for an account.
+
+        Args:
+            account_id: Account ID
+
+        Returns:
+            Dictionary with total_classrooms, total_connections and unique_interests
+        """
+        cache_key = ('stats', int(account_id))
+        cached = account_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        counts = AccountRepository._friend_counts(account_id)
+        rows = (
+            db.session.query(Profile.interests, func.coalesce(counts.c.friends_count, 0))
+            .outerjoin(counts, counts.c.profile_id == Profile.id)
+            .filter(Profile.account_id == account_id)
+            .all()
+        )
+
+        all_interests = set()
+        total_connections = 0
+        for interests, friends_count in rows:
+            total_connections += int(friends_count)
+            if interests:
+                all_interests.update(interests)
+
+        stats = {
+            "total_classrooms": len(rows),
+            "total_connections": total_connections,
+            "unique_interests": len(all_interests)
+        }
+        account_cache.set(cache_key, stats)
+        return stats
+
+    @staticmethod
+    def get_cached_classrooms(account_id: int, cursor: Optional[int], limit: int) -> Any:
+        """
+        Get one cached page of the serialized classroom listing of an account
+
+        Args:
+            account_id: Account ID
+            cursor: Page cursor
+            limit: Page size
+
+        Returns:
+            Cached page or None
+        """
+        pages = account_cache.get(('classrooms', int(account_id)))
+        return pages.get((cursor, limit)) if pages else None
+
+    @staticmethod
+    def cache_classrooms(account_id: int, cursor: Optional[int], limit: int, page: Dict[str, Any]) -> None:
+        """
+        Cache one page of the serialized classroom listing of an account.
+        All pages of an account share one entry, so invalidate() drops them together.
+
+        Args:
+            account_id: Account ID
+            cursor: Page cursor
+            limit: Page size
+            page: Serialized page
+        """
+        key = ('classrooms', int(account_id))
+        pages = dict(account_cache.get(key) or {})
+        pages[(cursor, limit)] = page
+        account_cache.set(key, pages)
+
+    @staticmethod
+    def invalidate(*account_ids: int) -> None:
+        """
+        Drop cached aggregates after a profile or relation write
+
+        Args:
+            account_ids: Accounts whose cached data is stale
+        """
+        for account_id in account_ids:
+            if account_id is None:
+                continue
+            account_cache.invalidate(('stats', int(account_id)))
+            account_cache.invalidate(('classrooms', int(account_id)))
@@ -0,0 +1,231 @@
+"""
+Post feeds.
+A profile's posts and its friends' timeline are read newest first by keyset
+on (created_at, id) through the (profile_id, created_at, id) index. The first
+page of each friends' timeline is optionally cached per profile.
+"""
+
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import or_
+from ..model import db
+from ..model.post import Post
+from ..model.profile import Profile
+from ..cache.ttl_cache import TTLCache
+from .profile_repository import ProfileRepository
+
+
+# Set TIMELINE_CACHE_TTL=0 to disable caching of timeline heads (configured in init_app)
+timeline_cache = TTLCache(maxsize=1024, ttl=30.0)
+
+
+class PostRepository:
+    """Static query helpers for posts and feeds"""
+    # Rows kept per cached timeline head; pages up to this size are served from the cache
+    TIMELINE_HEAD_SIZE = int(os.getenv('TIMELINE_HEAD_SIZE', '50'))
+
+    @staticmethod
+    def encode_cursor(post: Post) -> str:
+        """
+        Cursor pointing just after a post in newest-first order
+
+        Args:
+            post: Last post of a page
+
+        Returns:
+            Opaque cursor string
+        """
+        return f"{post.created_at.isoformat()}_{post.id}"
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        """
+        Parse a cursor produced by encode_cursor
+
+        Args:
+            cursor: Cursor string
+
+        Returns:
+            Tuple of (created_at, post ID)
+
+        Raises:
+            ValueError: When the cursor is malformed
+        """
+        try:
+            created_at, _, post_id = cursor.rpartition('_')
+            created_at = datetime.fromisoformat(created_at)
+            post_id = int(post_id)
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor")
+        if created_at.tzinfo is not None:
+            # Stored timestamps are naive UTC
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+        return created_at, post_id
+
+    @staticmethod
+    def _page(query, limit: int,
+              cursor: Optional[Tuple[datetime, int]]) -> Tuple[List[Tuple[Post, Profile]], Optional[str]]:
+        """Apply newest-first keyset pagination to a (post, author) query"""
+        if cursor is not None:
+            created_at, post_id = cursor
+            # The <= bound lets the index range-scan; the OR breaks ties on equal timestamps
+            query = query.filter(
+                Post.created_at <= created_at,
+                or_(Post.created_at < created_at, Post.id < post_id)
+            )
+        rows = query.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, PostRepository.encode_cursor(rows[-1][0])
+        return rows, None
+
+    @staticmethod
+    def get_profile_posts(profile_id: int, limit: int,
+                          cursor: Optional[Tuple[datetime, int]] = None) -> Tuple[List[Tuple[Post, Profile]], Optional[str]]:
+        """
+        Load one page of a profile's posts, newest first.
+
+        Args:
+            profile_id: Author profile ID
+            limit: Maximum number of posts
+            cursor: Optional decoded cursor of the previous page (see decode_cursor)
+
+        Returns:
+            Tuple of (list of (post, author) rows, next cursor or None)
+        """
+        query = (
+            db.session.query(Post, Profile)
+            .join(Profile, Profile.id == Post.profile_id)
+            .filter(Post.profile_id == profile_id)
+        )
+        return PostRepository._page(query, limit, cursor)
+
+    @staticmethod
+    def get_timeline(profile_id: int, limit: int,
+                     cursor: Optional[Tuple[datetime, int]] = None) -> Tuple[List[Tuple[Post, Profile]], Optional[str]]:
+        """
+        Load one page of the posts of a profile's friends, newest first.
+
+        Friends are fanned in with one joined query: the UNION ALL of friend IDs
+        drives an index range scan of each friend's posts, merged by the sort.
+
+        Args:
+            profile_id: Profile whose friends' posts are listed
+            limit: Maximum number of posts
+            cursor: Optional decoded cursor of the previous page (see decode_cursor)
+
+        Returns:
+            Tuple of (list of (post, author) rows, next cursor or None)
+        """
+        friends = ProfileRepository.friend_ids_query(profile_id).subquery()
+        query = (
+            db.session.query(Post, Profile)
+            .join(friends, friends.c.friend_id == Post.profile_id)
+            .join(Profile, Profile.id == Post.profile_id)
+        )
+        return PostRepository._page(query, limit, cursor)
+
+    @staticmethod
+    def hydrate_search_hits(hits: List[Dict[str, Any]]) -> Tuple[List[Tuple[Dict[str, Any], Post, Profile]], List[int]]:
+        """
+        Resolve post search hits to posts and authors in vector-rank order with one query.
+
+        Args:
+            hits: The `results` list returned by ChromaDBService.query_documents,
+                  each carrying a `post_id` in its metadata
+
+        Returns:
+            Tuple of (list of (hit, post, author) ordered as the hits were,
+            list of post IDs whose post no longer exists)
+        """
+        ranked = [(hit, (hit.get('metadata') or {}).get('post_id')) for hit in hits]
+        post_ids = [int(post_id) for _, post_id in ranked if post_id is not None]
+        rows = {}
+        if post_ids:
+            rows = {
+                post.id: (post, author)
+                for post, author in (
+                    db.session.query(Post, Profile)
+                    .join(Profile, Profile.id == Post.profile_id)
+                    .filter(Post.id.in_(post_ids))
+                    .all()
+                )
+            }
+
+        hydrated = []
+        missing_ids = []
+        for hit, post_id in ranked:
+            if post_id is None:
+                continue
+            row = rows.get(int(post_id))
+            if row is None:
+                missing_ids.append(int(post_id))
+                continue
+            hydrated.append((hit, row[0], row[1]))
+        return hydrated, missing_ids
+
+    @staticmethod
+    def get_cached_timeline_head(profile_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Get the cached head of a friends' timeline
+
+        Args:
+            profile_id: Profile whose timeline is read
+
+        Returns:
+            Head stored by cache_timeline_head, or None
+        """
+        return timeline_cache.get(('timeline', int(profile_id)))
+
+    @staticmethod
+    def cache_timeline_head(profile_id: int, head: Dict[str, Any]) -> None:
+        """
+        Cache the head of a friends' timeline: its first TIMELINE_HEAD_SIZE posts
+
+        Args:
+            profile_id: Profile whose timeline was read
+            head: Dictionary with serialized "posts" (newest first), "cursors"
+                  (the cursor after each post) and "next_cursor" (after the last
+                  post, None when the timeline ends)
+        """
+        timeline_cache.set(('timeline', int(profile_id)), head)
+
+    @staticmethod
+    def slice_timeline_head(head: Dict[str, Any], limit: int) -> Dict[str, Any]:
+        """
+        Cut a first page of at most `limit` posts out of a timeline head
+
+        Args:
+            head: Timeline head (see cache_timeline_head)
+            limit: Page size, at most TIMELINE_HEAD_SIZE
+
+        Returns:
+            Dictionary with "posts" and "next_cursor"
+        """
+        if len(head["posts"]) > limit:
+            return {"posts": head["posts"][:limit], "next_cursor": head["cursors"][limit - 1]}
+        return {"posts": head["posts"], "next_cursor": head["next_cursor"]}
+
+    @staticmethod
+    def invalidate_timelines(*profile_ids: int) -> None:
+        """
+        Drop cached timeline heads
+
+        Args:
+            profile_ids: Profiles whose timelines changed
+        """
+        for profile_id in profile_ids:
+            if profile_id is not None:
+                timeline_cache.invalidate(('timeline', int(profile_id)))
+
+    @staticmethod
+    def invalidate_follower_timelines(author_profile_id: int) -> None:
+        """
+        Drop the cached timeline heads of every friend of an author after it posts
+
+        Args:
+            author_profile_id: Profile that wrote or deleted a post
+        """
+        if timeline_cache.enabled:
+            PostRepository.invalidate_timelines(*ProfileRepository.get_friend_ids(author_profile_id))
@@ -0,0 +1,444 @@
+"""
+Set-based profile queries.
+Loads profiles (and the rows they depend on) in batches so endpoints do not
+issue one SQL round trip per result.
+"""
+
+import heapq
+from typing import List, Dict, Any, Iterable, Iterator, Tuple, Optional
+from sqlalchemy import and_, func, or_, select, tuple_, union_all
+from sqlalchemy.orm import joinedload
+from ..model import db
+from ..model.account import Account  # noqa: F401  (registers the Profile.account backref)
+from ..model.profile import Profile
+from ..model.relation import Relation
+from ..helper import PenpalsHelper
+
+
+class ProfileRepository:
+    """Static query helpers for profiles and their relations"""
+
+    @staticmethod
+    def get_profiles_by_ids(profile_ids: Iterable[int]) -> Dict[int, Profile]:
+        """
+        Load many profiles with a single IN (...) query.
+
+        The owning account is joined in the same statement so serializers
+        that read `profile.account` do not trigger a lazy load per row.
+
+        Args:
+            profile_ids: Profile IDs to load (duplicates are ignored)
+
+        Returns:
+            Dictionary mapping profile ID to Profile for the rows that exist
+        """
+        unique_ids = list(dict.fromkeys(int(pid) for pid in profile_ids))
+        if not unique_ids:
+            return {}
+
+        profiles = (
+            Profile.query
+            .options(joinedload(Profile.account))
+            .filter(Profile.id.in_(unique_ids))
+            .all()
+        )
+        return {profile.id: profile for profile in profiles}
+
+    @staticmethod
+    def get_relations_for_profiles(profile_ids: Iterable[int]) -> Dict[int, List[Relation]]:
+        """
+        Load the relations of many profiles with a single query.
+
+        A friendship is stored once, so each relation is listed under both
+        of its profiles when both are requested.
+
+        Args:
+            profile_ids: Profile IDs whose relations should be loaded
+
+        Returns:
+            Dictionary mapping profile ID to its list of relations
+        """
+        unique_ids = list(dict.fromkeys(int(pid) for pid in profile_ids))
+        relations_by_profile: Dict[int, List[Relation]] = {pid: [] for pid in unique_ids}
+        if not unique_ids:
+            return relations_by_profile
+
+        relations = (
+            Relation.query
+            .filter(or_(Relation.from_profile_id.in_(unique_ids), Relation.to_profile_id.in_(unique_ids)))
+            .all()
+        )
+        for relation in relations:
+            for pid in (relation.from_profile_id, relation.to_profile_id):
+                if pid in relations_by_profile:
+                    relations_by_profile[pid].append(relation)
+        return relations_by_profile
+
+    @staticmethod
+    def friend_ids_query(profile_id: int):
+        """
+        Select the friend IDs of a profile as a UNION ALL of two index range scans:
+        friends with a higher ID via the unique (from, to) index and friends with a
+        lower ID via the (to, from) index.
+
+        Args:
+            profile_id: Profile ID
+
+        Returns:
+            Selectable with one `friend_id` column
+        """
+        return union_all(
+            select(Relation.to_profile_id.label('friend_id')).where(Relation.from_profile_id == profile_id),
+            select(Relation.from_profile_id.label('friend_id')).where(Relation.to_profile_id == profile_id)
+        )
+
+    @staticmethod
+    def get_friends(profile_id: int, limit: Optional[int] = None,
+                    cursor: Optional[int] = None) -> Tuple[List[Tuple[Relation, Profile]], Optional[int]]:
+        """
+        Load a profile's friends as (relation, friend profile) rows in one joined query.
+
+        The friend is whichever side of the relation is not `profile_id`.
+        Rows are ordered by relation ID so the last ID of a page can be used
+        as the cursor for the next one. With a limit, each side of the
+        friendship is range-scanned through its (profile, id) index and cut
+        to the page size before the two are merged, so a page costs the
+        same however many friends the profile has.
+
+        Args:
+            profile_id: Profile whose friends should be listed
+            limit: Optional maximum number of rows to return
+            cursor: Optional relation ID; only rows after it are returned
+
+        Returns:
+            Tuple of (list of (relation, friend) rows, next cursor or None
+            when there are no more rows)
+        """
+        if limit is None:
+            query = (
+                db.session.query(Relation, Profile)
+                .join(Profile, or_(
+                    and_(Relation.from_profile_id == profile_id, Profile.id == Relation.to_profile_id),
+                    and_(Relation.to_profile_id == profile_id, Profile.id == Relation.from_profile_id)
+                ))
+                .filter(or_(Relation.from_profile_id == profile_id, Relation.to_profile_id == profile_id))
+            )
+            if cursor is not None:
+                query = query.filter(Relation.id > cursor)
+            return query.order_by(Relation.id).all(), None
+
+        sides = []
+        for own_column, friend_column in ((Relation.from_profile_id, Relation.to_profile_id),
+                                          (Relation.to_profile_id, Relation.from_profile_id)):
+            side = select(Relation.id.label('relation_id'), friend_column.label('friend_id')).where(own_column == profile_id)
+            if cursor is not None:
+                side = side.where(Relation.id > cursor)
+            # Fetch one extra row to know whether another page exists
+            sides.append(select(side.order_by(Relation.id).limit(limit + 1).subquery()))
+        page = union_all(*sides).subquery()
+
+        rows = (
+            db.session.query(Relation, Profile)
+            .join(page, page.c.relation_id == Relation.id)
+            .join(Profile, Profile.id == page.c.friend_id)
+            .order_by(Relation.id)
+            .limit(limit + 1)
+            .all()
+        )
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1][0].id
+        return rows, None
+
+    @staticmethod
+    def iter_friend_pages(profile_id: int, batch_size: int,
+                          cursor: Optional[int] = None) -> Iterator[List[Tuple[Relation, Profile]]]:
+        """
+        Walk all of a profile's friends in relation ID order, one keyset page
+        of `batch_size` rows at a time, so only one page is held in memory.
+
+        Args:
+            profile_id: Profile whose friends should be listed
+            batch_size: Rows read per query
+            cursor: Optional relation ID; only rows after it are returned
+
+        Yields:
+            Non-empty lists of (relation, friend) rows
+        """
+        while True:
+            rows, cursor = ProfileRepository.get_friends(profile_id, limit=batch_size, cursor=cursor)
+            if rows:
+                yield rows
+            if cursor is None:
+                return
+
+    @staticmethod
+    def get_friend_ids(profile_id: int) -> List[int]:
+        """
+        Get the IDs of a profile's friends without loading the profiles.
+
+        Args:
+            profile_id: Profile ID
+
+        Returns:
+            List of friend profile IDs
+        """
+        rows = db.session.execute(ProfileRepository.friend_ids_query(profile_id)).all()
+        return [friend_id for (friend_id,) in rows]
+
+    @staticmethod
+    def count_friends(profile_id: int) -> int:
+        """
+        Count a profile's friends.
+
+        Args:
+            profile_id: Profile ID
+
+        Returns:
+            Number of friends
+        """
+        friends = ProfileRepository.friend_ids_query(profile_id).subquery()
+        return db.session.execute(select(func.count()).select_from(friends)).scalar()
+
+    @staticmethod
+    def get_friend_account_ids(profile_id: int) -> List[int]:
+        """
+        Get the distinct accounts owning profiles that are friends with this profile.
+
+        Args:
+            profile_id: Profile ID
+
+        Returns:
+            List of account IDs
+        """
+        friends = ProfileRepository.friend_ids_query(profile_id).subquery()
+        rows = (
+            db.session.query(Profile.account_id)
+            .filter(Profile.id.in_(select(friends.c.friend_id)))
+            .distinct()
+            .all()
+        )
+        return [account_id for (account_id,) in rows]
+
+    @staticmethod
+    def get_account_profiles(account_id: int, limit: int,
+                             cursor: Optional[int] = None) -> Tuple[List[Profile], Optional[int]]:
+        """
+        Load one page of an account's profiles in ID order.
+
+        Walks the (account_id, id) index from the cursor, so every page
+        costs the same regardless of its position.
+
+        Args:
+            account_id: Owning account ID
+            limit: Maximum number of profiles to return
+            cursor: Optional profile ID; only profiles after it are returned
+
+        Returns:
+            Tuple of (profiles, next cursor or None when there are no more profiles)
+        """
+        query = Profile.query.filter(Profile.account_id == account_id)
+        if cursor is not None:
+            query = query.filter(Profile.id > cursor)
+        profiles = query.order_by(Profile.id).limit(limit + 1).all()
+        if len(profiles) > limit:
+            profiles = profiles[:limit]
+            return profiles, profiles[-1].id
+        return profiles, None
+
+    @staticmethod
+    def count_account_profiles(account_id: int) -> int:
+        """
+        Count an account's profiles from the (account_id, id) index.
+
+        Args:
+            account_id: Owning account ID
+
+        Returns:
+            Number of profiles
+        """
+        return db.session.query(func.count(Profile.id)).filter(Profile.account_id == account_id).scalar()
+
+    @staticmethod
+    def get_friend_counts(profile_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Count the friends of many profiles with one grouped query.
+
+        Args:
+            profile_ids: Profile IDs
+
+        Returns:
+            Dictionary mapping every requested profile ID to its friend count
+        """
+        unique_ids = list(dict.fromkeys(int(pid) for pid in profile_ids))
+        counts = {pid: 0 for pid in unique_ids}
+        if not unique_ids:
+            return counts
+        ends = union_all(
+            select(Relation.from_profile_id.label('profile_id')).where(Relation.from_profile_id.in_(unique_ids)),
+            select(Relation.to_profile_id.label('profile_id')).where(Relation.to_profile_id.in_(unique_ids))
+        ).subquery()
+        rows = db.session.execute(
+            select(ends.c.profile_id, func.count()).group_by(ends.c.profile_id)
+        ).all()
+        counts.update({profile_id: count for profile_id, count in rows})
+        return counts
+
+    @staticmethod
+    def get_profile_owners(profile_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Map profile IDs to their owning account IDs with one query, without loading profiles.
+
+        Args:
+            profile_ids: Profile IDs
+
+        Returns:
+            Dictionary mapping existing profile IDs to account IDs
+        """
+        unique_ids = list(dict.fromkeys(int(pid) for pid in profile_ids))
+        if not unique_ids:
+            return {}
+        rows = db.session.query(Profile.id, Profile.account_id).filter(Profile.id.in_(unique_ids)).all()
+        return {profile_id: account_id for profile_id, account_id in rows}
+
+    @staticmethod
+    def get_existing_relations(pairs: Iterable[Tuple[int, int]]) -> set:
+        """
+        Find which canonical (lower ID, higher ID) pairs are already friends, in one query.
+
+        Args:
+            pairs: Canonical profile ID pairs
+
+        Returns:
+            Set of the pairs that have a relation row
+        """
+        pairs = list(pairs)
+        if not pairs:
+            return set()
+        rows = (
+            db.session.query(Relation.from_profile_id, Relation.to_profile_id)
+            .filter(tuple_(Relation.from_profile_id, Relation.to_profile_id).in_(pairs))
+            .all()
+        )
+        return {(low_id, high_id) for low_id, high_id in rows}
+
+    @staticmethod
+    def insert_relations(pairs: List[Tuple[int, int]]) -> None:
+        """
+        Insert friendships in one multi-row statement (the caller commits).
+        Pairs that already exist are skipped by the database where the dialect
+        supports ON CONFLICT DO NOTHING.
+
+        Args:
+            pairs: Canonical (lower ID, higher ID) profile ID pairs
+        """
+        if not pairs:
+            return
+        created_at = PenpalsHelper.get_current_utc_timestamp()
+        rows = [{"from_profile_id": low_id, "to_profile_id": high_id, "created_at": created_at}
+                for low_id, high_id in pairs]
+
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+            statement = insert(Relation).values(rows).on_conflict_do_nothing()
+        elif dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+            statement = insert(Relation).values(rows).on_conflict_do_nothing()
+        else:
+            statement = Relation.__table__.insert().values(rows)
+        db.session.execute(statement)
+
+    @staticmethod
+    def delete_relations(pairs: List[Tuple[int, int]]) -> int:
+        """
+        Delete friendships in one statement (the caller commits).
+
+        Args:
+            pairs: Canonical (lower ID, higher ID) profile ID pairs
+
+        Returns:
+            Number of deleted rows
+        """
+        if not pairs:
+            return 0
+        return (
+            Relation.query
+            .filter(tuple_(Relation.from_profile_id, Relation.to_profile_id).in_(pairs))
+            .delete(synchronize_session=False)
+        )
+
+    @staticmethod
+    def find_nearby(latitude: float, longitude: float, radius_km: float, limit: int,
+                    exclude_profile_id: Optional[int] = None) -> List[Tuple[Profile, float]]:
+        """
+        Find the profiles closest to a point within a radius.
+
+        Candidates are pre-filtered with a bounding box that the
+        (latitude, longitude) index can answer without touching the table, then
+        ranked by exact haversine distance. Only the top `limit` profiles
+        are loaded.
+
+        Args:
+            latitude: Centre latitude in degrees
+            longitude: Centre longitude in degrees
+            radius_km: Search radius in kilometres
+            limit: Maximum number of profiles to return
+            exclude_profile_id: Optional profile to leave out (e.g. the centre profile)
+
+        Returns:
+            List of (profile, distance in km) ordered by distance
+        """
+        min_lat, max_lat, lng_ranges = PenpalsHelper.bounding_box(latitude, longitude, radius_km)
+        query = (
+            db.session.query(Profile.id, Profile.latitude, Profile.longitude)
+            .filter(Profile.latitude.between(min_lat, max_lat))
+            .filter(or_(*[and_(Profile.longitude >= low, Profile.longitude <= high)
+                          for low, high in lng_ranges]))
+        )
+        if exclude_profile_id is not None:
+            query = query.filter(Profile.id != exclude_profile_id)
+
+        candidates = []
+        for profile_id, candidate_lat, candidate_lng in query:
+            distance = PenpalsHelper.haversine_km(latitude, longitude, candidate_lat, candidate_lng)
+            if distance <= radius_km:
+                candidates.append((distance, profile_id))
+
+        nearest = heapq.nsmallest(limit, candidates)
+        profiles = ProfileRepository.get_profiles_by_ids(profile_id for _, profile_id in nearest)
+        return [(profiles[profile_id], distance) for distance, profile_id in nearest if profile_id in profiles]
+
+    @staticmethod
+    def hydrate_search_hits(hits: List[Dict[str, Any]]) -> Tuple[List[Tuple[Dict[str, Any], Profile]], List[int]]:
+        """
+        Resolve ChromaDB search hits to profiles in vector-rank order.
+
+        Args:
+            hits: The `results` list returned by ChromaDBService.query_documents,
+                  each carrying a `profile_id` in its metadata
+
+        Returns:
+            Tuple of (list of (hit, profile) pairs ordered as the hits were,
+            list of profile IDs whose profile no longer exists)
+        """
+        ranked_ids = []
+        for hit in hits:
+            metadata = hit.get('metadata') or {}
+            profile_id = metadata.get('profile_id')
+            ranked_ids.append(int(profile_id) if profile_id is not None else None)
+
+        profiles = ProfileRepository.get_profiles_by_ids(pid for pid in ranked_ids if pid is not None)
+
+        hydrated = []
+        missing_ids = []
+        for hit, profile_id in zip(hits, ranked_ids):
+            if profile_id is None:
+                continue
+            profile = profiles.get(profile_id)
+            if profile is None:
+                missing_ids.append(profile_id)
+                continue
+            hydrated.append((hit, profile))
+
+        return hydrated, missing_ids
@@ -0,0 +1,114 @@
+"""
+Materialized penpal suggestions.
+Reads serve a profile's top-K from one indexed range scan; writes replace a
+profile's whole list in one statement pair.
+"""
+
+from typing import List, Tuple, Optional
+from sqlalchemy import and_, or_, tuple_
+from ..model import db
+from ..model.profile import Profile
+from ..model.suggestion import Suggestion
+from ..helper import PenpalsHelper
+
+
+class SuggestionRepository:
+    """Static query helpers for the suggestions table"""
+
+    @staticmethod
+    def get_suggestions(profile_id: int, limit: Optional[int] = None) -> List[Tuple[Suggestion, Profile]]:
+        """
+        Load a profile's suggestions in rank order, joined with the suggested profiles.
+
+        Args:
+            profile_id: Profile whose suggestions should be listed
+            limit: Optional maximum number of rows
+
+        Returns:
+            List of (suggestion, suggested profile) rows
+        """
+        query = (
+            db.session.query(Suggestion, Profile)
+            .join(Profile, Profile.id == Suggestion.suggested_profile_id)
+            .filter(Suggestion.profile_id == profile_id)
+            .order_by(Suggestion.rank)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    @staticmethod
+    def replace_suggestions(profile_id: int, ranked: List[Tuple[int, float]]) -> None:
+        """
+        Replace a profile's suggestions (the caller commits)
+
+        Args:
+            profile_id: Profile whose suggestions are replaced
+            ranked: (suggested profile ID, score) pairs, best first
+        """
+        Suggestion.query.filter(Suggestion.profile_id == profile_id).delete(synchronize_session=False)
+        if ranked:
+            computed_at = PenpalsHelper.get_current_utc_timestamp()
+            db.session.execute(Suggestion.__table__.insert(), [
+                {
+                    "profile_id": profile_id,
+                    "suggested_profile_id": suggested_id,
+                    "rank": rank,
+                    "score": score,
+                    "computed_at": computed_at
+                }
+                for rank, (suggested_id, score) in enumerate(ranked, start=1)
+            ])
+
+    @staticmethod
+    def delete_pair(profile_id: int, other_profile_id: int) -> None:
+        """
+        Drop suggestions between two profiles in both directions (the caller commits),
+        e.g. once they are connected
+
+        Args:
+            profile_id: First profile
+            other_profile_id: Second profile
+        """
+        Suggestion.query.filter(or_(
+            and_(Suggestion.profile_id == profile_id, Suggestion.suggested_profile_id == other_profile_id),
+            and_(Suggestion.profile_id == other_profile_id, Suggestion.suggested_profile_id == profile_id)
+        )).delete(synchronize_session=False)
+
+    @staticmethod
+    def delete_pairs(pairs: List[Tuple[int, int]]) -> None:
+        """
+        Drop suggestions between many pairs of profiles, in both directions (the caller commits)
+
+        Args:
+            pairs: Profile ID pairs
+        """
+        if not pairs:
+            return
+        both_directions = [(a, b) for a, b in pairs] + [(b, a) for a, b in pairs]
+        Suggestion.query.filter(
+            tuple_(Suggestion.profile_id, Suggestion.suggested_profile_id).in_(both_directions)
+        ).delete(synchronize_session=False)
+
+    @staticmethod
+    def get_linked_profile_ids(profile_ids: List[int]) -> List[int]:
+        """
+        Profiles whose suggestions list any of the given profiles, and the
+        profiles those list, i.e. every stored list a change to them can affect
+
+        Args:
+            profile_ids: Changed profiles
+
+        Returns:
+            Distinct profile IDs, without the given ones
+        """
+        if not profile_ids:
+            return []
+        suggesting = db.session.query(Suggestion.profile_id).filter(
+            Suggestion.suggested_profile_id.in_(profile_ids)
+        )
+        suggested = db.session.query(Suggestion.suggested_profile_id).filter(
+            Suggestion.profile_id.in_(profile_ids)
+        )
+        linked = {profile_id for (profile_id,) in suggesting.union(suggested)}
+        return sorted(linked.difference(profile_ids))
@@ -0,0 +1 @@
+# package definition, do not remove.
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""Interest vocabulary with sparse ID encoding for batched Jaccard similarity"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+
+class InterestVocabulary:
+    """
+    Maps normalized interests to integer IDs and encodes interest lists as
+    sorted ID arrays (sparse binary vectors), so one interest list can be
+    compared against many with a single vectorized membership test.
+
+    Encodings are cached by the raw interest list: profiles repeat a small
+    set of interest lists, so each list is normalized and encoded once.
+    """
+    def __init__(self, maxsize: int = 10000):
+        """
+        Initialize the vocabulary
+
+        Args:
+            maxsize: Maximum number of encoded interest lists kept in memory
+        """
+        self.maxsize: int = maxsize
+        self._ids: Dict[str, int] = {}
+        self._encoded: "OrderedDict[Tuple[str, ...], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def terms(interests: Optional[Iterable[str]]) -> List[str]:
+        """
+        Normalize an interest list the way calculate_interest_similarity does
+
+        Args:
+            interests: Raw interests
+
+        Returns:
+            Distinct lowercased, stripped interests
+        """
+        return list({interest.lower().strip() for interest in interests or [] if interest.strip()})
+
+    def encode(self, interests: Optional[Iterable[str]]) -> np.ndarray:
+        """
+        Encode interests as a sorted array of vocabulary IDs, adding unseen interests
+
+        Args:
+            interests: Raw interests
+
+        Returns:
+            Sorted int32 array of distinct interest IDs
+        """
+        key = tuple(interests or ())
+        with self._lock:
+            encoded = self._encoded.get(key)
+            if encoded is not None:
+                self._encoded.move_to_end(key)
+                return encoded
+            ids = [self._ids.setdefault(term, len(self._ids)) for term in self.terms(key)]
+            encoded = np.array(sorted(ids), dtype=np.int32)
+            self._encoded[key] = encoded
+            while len(self._encoded) > self.maxsize:
+                self._encoded.popitem(last=False)
+            return encoded
+
+    def jaccard_many(self, interests: Optional[Iterable[str]],
+                     interest_lists: List[Optional[Iterable[str]]]) -> np.ndarray:
+        """
+        Jaccard similarity of one interest list against many
+
+        Args:
+            interests: Interest list to compare. Interests unknown to the
+                       vocabulary only count towards the union, so free-text
+                       queries do not grow the vocabulary.
+            interest_lists: Interest lists to compare against
+
+        Returns:
+            Array of similarities between 0 and 1, one per entry of interest_lists
+        """
+        count = len(interest_lists)
+        if count == 0:
+            return np.zeros(0)
+
+        rows = [self.encode(other) for other in interest_lists]
+        query_terms = self.terms(interests)
+        with self._lock:
+            query_ids = np.array([self._ids[term] for term in query_terms if term in self._ids], dtype=np.int32)
+
+        sizes = np.fromiter((len(row) for row in rows), dtype=np.int64, count=count)
+        all_ids = np.concatenate(rows)
+        row_index = np.repeat(np.arange(count), sizes)
+        intersection = np.bincount(row_index[np.isin(all_ids, query_ids)], minlength=count)
+        union = sizes + len(query_terms) - intersection
+        return np.divide(intersection, union, out=np.zeros(count), where=union > 0)
+
+    def reset_after_fork(self) -> None:
+        """Replace the lock inherited from a parent process"""
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get vocabulary counters
+
+        Returns:
+            Dictionary with vocabulary and cache sizes
+        """
+        with self._lock:
+            return {
+                "terms": len(self._ids),
+                "cached_lists": len(self._encoded),
+                "maxsize": self.maxsize
+            }
+
+
+interest_vocabulary = InterestVocabulary()
@@ -0,0 +1,186 @@
+"""
+Semantic post search.
+Posts are embedded into their own collection with `profile_id` and
+`created_at` metadata, so classroom and time-window scopes are applied inside
+the vector query. Indexing is incremental: a queued post is only embedded
+when its content hash differs from the one stored with its vector.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from ..chromadb.chromadb_service import ChromaDBService
+
+
+class PostIndex:
+    """Keep the post collection in sync with the posts table and query it"""
+
+    def __init__(self, chroma_service: ChromaDBService):
+        """
+        Initialize the index
+
+        Args:
+            chroma_service: Service bound to the post collection
+        """
+        self.chroma_service: ChromaDBService = chroma_service
+        self.embedded: int = 0
+        self.skipped: int = 0
+
+    @staticmethod
+    def document_id(post_id: int) -> str:
+        """ID of a post's vector"""
+        return f"post_{post_id}"
+
+    @staticmethod
+    def content_hash(content: str) -> str:
+        """Hash stored with a vector to detect edited content"""
+        return ChromaDBService.content_hash(content)
+
+    @staticmethod
+    def timestamp(value: datetime) -> float:
+        """
+        Convert a datetime to the numeric form stored in metadata (ChromaDB
+        range filters only compare numbers). Naive datetimes are taken as UTC.
+
+        Args:
+            value: Datetime
+
+        Returns:
+            Seconds since the epoch
+        """
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+
+    @staticmethod
+    def job_payload(post) -> Dict[str, Any]:
+        """
+        Queue payload carrying everything needed to index a post, so workers
+        do not read the database
+
+        Args:
+            post: Post model instance with an assigned ID
+
+        Returns:
+            Dictionary with "document" and "metadata"
+        """
+        return {
+            "document": post.content,
+            "metadata": {
+                "post_id": post.id,
+                "profile_id": post.profile_id,
+                "created_at": PostIndex.timestamp(post.created_at),
+                "content_hash": PostIndex.content_hash(post.content)
+            }
+        }
+
+    def upsert(self, jobs: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, int]:
+        """
+        Embed queued posts whose content changed since they were last indexed.
+        Also usable as a CoalescingWorkQueue handler.
+
+        Args:
+            jobs: List of (document ID, job payload) tuples
+
+        Returns:
+            Dictionary with the number of embedded and skipped posts
+
+        Raises:
+            RuntimeError: When ChromaDB fails
+        """
+        stored = self.chroma_service.get_metadatas([key for key, _ in jobs])
+        if stored['status'] != 'success':
+            raise RuntimeError(stored.get('message'))
+        changed = [
+            (key, payload) for key, payload in jobs
+            if (stored['metadatas'].get(key) or {}).get('content_hash') != payload['metadata']['content_hash']
+        ]
+
+        if changed:
+            result = self.chroma_service.upsert_batch(
+                [payload["document"] for _, payload in changed],
+                [payload["metadata"] for _, payload in changed],
+                [key for key, _ in changed]
+            )
+            if result['status'] != 'success':
+                raise RuntimeError(result.get('message'))
+
+        self.embedded += len(changed)
+        self.skipped += len(jobs) - len(changed)
+        return {"embedded": len(changed), "skipped": len(jobs) - len(changed)}
+
+    def delete(self, jobs: List[Tuple[str, Any]]) -> None:
+        """
+        Remove queued posts from the index (CoalescingWorkQueue handler)
+
+        Args:
+            jobs: List of (document ID, payload) tuples
+        """
+        result = self.chroma_service.delete_documents([key for key, _ in jobs])
+        if result['status'] != 'success':
+            raise RuntimeError(result.get('message'))
+
+    def delete_profiles(self, jobs: List[Tuple[str, int]]) -> None:
+        """
+        Remove every post of deleted profiles from the index (CoalescingWorkQueue handler)
+
+        Args:
+            jobs: List of (key, profile ID) tuples
+        """
+        for _, profile_id in jobs:
+            result = self.chroma_service.delete_where({"profile_id": int(profile_id)})
+            if result['status'] != 'success':
+                raise RuntimeError(result.get('message'))
+
+    @staticmethod
+    def build_where(profile_ids: Optional[Iterable[int]] = None, since: Optional[datetime] = None,
+                    until: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        Build the metadata filter scoping a search to classrooms and a time window
+
+        Args:
+            profile_ids: Optional author profile IDs
+            since: Optional earliest creation time (inclusive)
+            until: Optional latest creation time (inclusive)
+
+        Returns:
+            ChromaDB where clause, or None when unscoped
+        """
+        clauses = []
+        profile_ids = [int(pid) for pid in profile_ids or []]
+        if len(profile_ids) == 1:
+            clauses.append({"profile_id": profile_ids[0]})
+        elif profile_ids:
+            clauses.append({"profile_id": {"$in": profile_ids}})
+        if since is not None:
+            clauses.append({"created_at": {"$gte": PostIndex.timestamp(since)}})
+        if until is not None:
+            clauses.append({"created_at": {"$lte": PostIndex.timestamp(until)}})
+
+        if not clauses:
+            return None
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"$and": clauses}
+
+    def search(self, query_text: str, n_results: int, profile_ids: Optional[Iterable[int]] = None,
+               since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Find posts semantically similar to a query within an optional scope
+
+        Args:
+            query_text: Search text
+            n_results: Maximum number of hits
+            profile_ids: Optional author profile IDs
+            since: Optional earliest creation time
+            until: Optional latest creation time
+
+        Returns:
+            ChromaDBService.query_documents result
+        """
+        return self.chroma_service.query_documents(
+            query_text, n_results, self.build_where(profile_ids, since, until)
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Number of posts embedded and skipped as unchanged by this process"""
+        return {"embedded": self.embedded, "skipped": self.skipped}
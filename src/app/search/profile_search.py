@@ -0,0 +1,349 @@
+"""
+Multi-stage profile search.
+Candidates are over-fetched from the interest index with metadata pre-filters
+applied inside ChromaDB, loaded in one query, then re-ranked by a vectorized
+scorer combining semantic similarity, interest overlap, distance and
+availability overlap.
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+import numpy as np
+from ..helper import PenpalsHelper
+from ..repository.profile_repository import ProfileRepository
+from .interest_vocabulary import InterestVocabulary, interest_vocabulary
+
+
+class ProfileSearchPipeline:
+    """Retrieve, filter and re-score profile search candidates"""
+    WEIGHT_KEYS = ("semantic", "interests", "distance", "availability")
+    DEFAULT_WEIGHTS = {"semantic": 0.5, "interests": 0.2, "distance": 0.2, "availability": 0.1}
+    DEFAULT_OVERFETCH = 4
+    MAX_CANDIDATES = 200
+
+    def __init__(self, chroma_service, weights: Optional[Any] = None,
+                 overfetch: int = DEFAULT_OVERFETCH, distance_scale_km: float = 1000.0,
+                 vocabulary: Optional[InterestVocabulary] = None):
+        """
+        Initialize the pipeline
+
+        Args:
+            chroma_service: ChromaDBService holding the profile interest index
+            weights: Default score weights, as a dict or a "semantic=0.5,distance=0.2" string
+            overfetch: Number of candidates fetched per requested result
+            distance_scale_km: Distance at which the distance score drops to 0.5
+            vocabulary: Interest vocabulary used for Jaccard scores (defaults to the shared one)
+        """
+        self.chroma_service = chroma_service
+        self.weights: Dict[str, float] = self.parse_weights(weights) if weights else dict(self.DEFAULT_WEIGHTS)
+        self.overfetch: int = max(1, overfetch)
+        self.distance_scale_km: float = distance_scale_km
+        self.vocabulary: InterestVocabulary = vocabulary or interest_vocabulary
+
+    @staticmethod
+    def parse_weights(value: Any) -> Dict[str, float]:
+        """
+        Parse score weights. Missing keys are 0.
+
+        Args:
+            value: Dict of weights or a "key=value,key=value" string
+
+        Returns:
+            Dictionary with one non-negative weight per score
+
+        Raises:
+            ValueError: On unknown keys, negative or non-numeric weights
+        """
+        if isinstance(value, str):
+            pairs = [item.split('=', 1) for item in value.split(',') if item.strip()]
+            if any(len(pair) != 2 for pair in pairs):
+                raise ValueError("Weights must be given as key=value pairs")
+            value = {key.strip(): weight for key, weight in pairs}
+        if not isinstance(value, dict):
+            raise ValueError("Weights must be an object")
+
+        weights = {key: 0.0 for key in ProfileSearchPipeline.WEIGHT_KEYS}
+        for key, weight in value.items():
+            if key not in weights:
+                raise ValueError(f"Unknown weight '{key}'")
+            try:
+                weights[key] = float(weight)
+            except (ValueError, TypeError):
+                raise ValueError(f"Invalid weight for '{key}'")
+            if weights[key] < 0:
+                raise ValueError(f"Weight for '{key}' must not be negative")
+        return weights
+
+    @staticmethod
+    def parse_filters(data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate the filter fields of a search request
+
+        Args:
+            data: Request body; reads latitude, longitude, max_distance_km,
+                  min_class_size, max_class_size, location and availability
+
+        Returns:
+            Dictionary with the filters that were provided
+
+        Raises:
+            ValueError: When a filter is invalid
+        """
+        filters: Dict[str, Any] = {}
+
+        latitude, longitude = data.get('latitude'), data.get('longitude')
+        if latitude is not None or longitude is not None:
+            if not PenpalsHelper.validate_coordinates(latitude, longitude):
+                raise ValueError("Invalid coordinates")
+            latitude, longitude = PenpalsHelper.parse_coordinate(latitude), PenpalsHelper.parse_coordinate(longitude)
+            if latitude is None or longitude is None:
+                raise ValueError("Invalid coordinates")
+            filters['latitude'] = latitude
+            filters['longitude'] = longitude
+
+        if data.get('max_distance_km') is not None:
+            if 'latitude' not in filters:
+                raise ValueError("max_distance_km requires latitude and longitude")
+            try:
+                filters['max_distance_km'] = float(data['max_distance_km'])
+            except (ValueError, TypeError):
+                raise ValueError("Invalid max_distance_km")
+            if filters['max_distance_km'] <= 0:
+                raise ValueError("max_distance_km must be positive")
+
+        for key in ('min_class_size', 'max_class_size'):
+            if data.get(key) is not None:
+                try:
+                    filters[key] = int(data[key])
+                except (ValueError, TypeError):
+                    raise ValueError(f"Invalid {key}")
+
+        location = data.get('location')
+        if location:
+            filters['location'] = str(location).strip()
+
+        availability = data.get('availability')
+        if availability:
+            if not PenpalsHelper.validate_availability_format(availability):
+                raise ValueError("Invalid availability format")
+            filters['availability'] = availability
+
+        return filters
+
+    @staticmethod
+    def build_where(filters: Dict[str, Any], exclude_profile_ids: Optional[List[int]] = None,
+                    exclude_account_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Translate filters into a ChromaDB metadata filter
+
+        The distance filter becomes a latitude/longitude bounding box; the
+        exact radius is checked after retrieval.
+
+        Args:
+            filters: Filters returned by parse_filters
+            exclude_profile_ids: Optional profiles to leave out of the results
+            exclude_account_id: Optional account whose profiles are left out
+
+        Returns:
+            ChromaDB `where` clause, or None when nothing is filtered
+        """
+        conditions: List[Dict[str, Any]] = []
+
+        if exclude_account_id is not None:
+            # Entries indexed before account_id was stored match $ne and are filtered after hydration
+            conditions.append({"account_id": {"$ne": exclude_account_id}})
+
+        if exclude_profile_ids:
+            if len(exclude_profile_ids) == 1:
+                conditions.append({"profile_id": {"$ne": exclude_profile_ids[0]}})
+            else:
+                conditions.append({"profile_id": {"$nin": list(exclude_profile_ids)}})
+        if 'min_class_size' in filters:
+            conditions.append({"class_size": {"$gte": filters['min_class_size']}})
+        if 'max_class_size' in filters:
+            conditions.append({"class_size": {"$lte": filters['max_class_size']}})
+        if 'location' in filters:
+            conditions.append({"location": {"$eq": filters['location']}})
+
+        if 'max_distance_km' in filters:
+            min_lat, max_lat, lng_ranges = PenpalsHelper.bounding_box(
+                filters['latitude'], filters['longitude'], filters['max_distance_km']
+            )
+            conditions.append({"latitude": {"$gte": min_lat}})
+            conditions.append({"latitude": {"$lte": max_lat}})
+            lng_conditions = [
+                {"$and": [{"longitude": {"$gte": low}}, {"longitude": {"$lte": high}}]}
+                for low, high in lng_ranges if (low, high) != (-180.0, 180.0)
+            ]
+            if len(lng_conditions) == 1:
+                conditions.extend(lng_conditions[0]["$and"])
+            elif lng_conditions:
+                conditions.append({"$or": lng_conditions})
+
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+
+    @staticmethod
+    def availability_slots(availability: Optional[List[Dict[str, Any]]]) -> Set[Tuple[str, str]]:
+        """
+        Normalize availability entries to comparable (day, time) slots
+
+        Args:
+            availability: List of {"day": ..., "time": ...} entries
+
+        Returns:
+            Set of lowercased (day, time) tuples
+        """
+        slots = set()
+        for slot in availability or []:
+            if isinstance(slot, dict) and 'day' in slot and 'time' in slot:
+                slots.add((str(slot['day']).strip().lower(), str(slot['time']).strip().lower()))
+        return slots
+
+    @staticmethod
+    def haversine_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        """
+        Great-circle distances from one point to many
+
+        Args:
+            latitude: Origin latitude in degrees
+            longitude: Origin longitude in degrees
+            latitudes: Candidate latitudes in degrees (NaN when unknown)
+            longitudes: Candidate longitudes in degrees (NaN when unknown)
+
+        Returns:
+            Distances in kilometres (NaN where a candidate has no coordinates)
+        """
+        phi1 = np.radians(latitude)
+        phi2 = np.radians(latitudes)
+        d_phi = phi2 - phi1
+        d_lambda = np.radians(longitudes - longitude)
+        a = np.sin(d_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+        return 2 * PenpalsHelper.EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+    def active_weights(self, filters: Dict[str, Any], weights: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """
+        Weights used for a query, normalized to sum to 1.
+        Distance and availability only count when the query provides an origin or slots.
+
+        Args:
+            filters: Filters returned by parse_filters
+            weights: Optional per-request weights overriding the defaults
+
+        Returns:
+            Dictionary of normalized weights
+        """
+        active = dict(weights if weights is not None else self.weights)
+        if 'latitude' not in filters:
+            active['distance'] = 0.0
+        if not filters.get('availability'):
+            active['availability'] = 0.0
+        total = sum(active.values())
+        if total <= 0:
+            return {key: 1.0 if key == 'semantic' else 0.0 for key in self.WEIGHT_KEYS}
+        return {key: value / total for key, value in active.items()}
+
+    def search(self, query_text: str, query_interests: List[str], n_results: int,
+               filters: Optional[Dict[str, Any]] = None, weights: Optional[Dict[str, float]] = None,
+               exclude_profile_ids: Optional[List[int]] = None,
+               exclude_account_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Run the search pipeline
+
+        Args:
+            query_text: Text embedded for the semantic search
+            query_interests: Interests compared by Jaccard similarity
+            n_results: Number of profiles to return
+            filters: Filters returned by parse_filters
+            weights: Optional per-request weights (see parse_weights)
+            exclude_profile_ids: Optional profiles to leave out of the results
+            exclude_account_id: Optional account whose profiles are left out
+
+        Returns:
+            Dictionary with status, ranked (profile, scores) results, missing
+            profile IDs, the weights used and per-stage timings in milliseconds
+        """
+        filters = filters or {}
+        timings: Dict[str, float] = {}
+        started = stage_started = time.perf_counter()
+
+        def lap(stage: str) -> None:
+            nonlocal stage_started
+            now = time.perf_counter()
+            timings[stage] = round((now - stage_started) * 1000, 3)
+            stage_started = now
+
+        # Stage 1: over-fetch candidates with metadata pre-filters applied by ChromaDB
+        n_candidates = min(max(n_results * self.overfetch, n_results), self.MAX_CANDIDATES)
+        where = self.build_where(filters, exclude_profile_ids, exclude_account_id)
+        result = self.chroma_service.query_documents(query_text, n_candidates, where)
+        if result['status'] != 'success':
+            return {"status": "error", "message": result.get('message')}
+        lap("retrieve")
+
+        # Stage 2: load the candidate profiles in one query
+        hydrated, missing_profile_ids = ProfileRepository.hydrate_search_hits(result.get('results') or [])
+        if exclude_account_id is not None:
+            hydrated = [(hit, profile) for hit, profile in hydrated if profile.account_id != exclude_account_id]
+        lap("hydrate")
+
+        # Stage 3: score every candidate at once
+        active = self.active_weights(filters, weights)
+        count = len(hydrated)
+        semantic = np.clip(np.array([hit['similarity'] for hit, _ in hydrated], dtype=float), 0.0, 1.0)
+        interests = self.vocabulary.jaccard_many(query_interests, [profile.interests for _, profile in hydrated])
+
+        distances = np.full(count, np.nan)
+        distance_score = np.zeros(count)
+        keep = np.ones(count, dtype=bool)
+        if 'latitude' in filters and count:
+            latitudes = np.array([p.latitude if p.latitude is not None else np.nan for _, p in hydrated], dtype=float)
+            longitudes = np.array([p.longitude if p.longitude is not None else np.nan for _, p in hydrated], dtype=float)
+            distances = self.haversine_km(filters['latitude'], filters['longitude'], latitudes, longitudes)
+            distance_score = np.nan_to_num(1.0 / (1.0 + distances / self.distance_scale_km), nan=0.0)
+            if 'max_distance_km' in filters:
+                # The bounding box used as pre-filter also admits its corners
+                keep &= np.nan_to_num(distances, nan=np.inf) <= filters['max_distance_km']
+
+        availability_score = np.zeros(count)
+        query_slots = self.availability_slots(filters.get('availability'))
+        if query_slots:
+            availability_score = np.array([
+                len(query_slots & self.availability_slots(profile.availability)) / len(query_slots)
+                for _, profile in hydrated
+            ], dtype=float)
+
+        scores = (
+            active['semantic'] * semantic
+            + active['interests'] * interests
+            + active['distance'] * distance_score
+            + active['availability'] * availability_score
+        )
+        lap("score")
+
+        # Stage 4: keep the best n_results
+        candidates = np.flatnonzero(keep)
+        order = candidates[np.argsort(-scores[candidates], kind='stable')][:n_results]
+        results = []
+        for i in order:
+            results.append((hydrated[i][1], {
+                "score": float(scores[i]),
+                "semantic": float(semantic[i]),
+                "interests": float(interests[i]),
+                "distance_km": None if np.isnan(distances[i]) else float(distances[i]),
+                "availability": float(availability_score[i])
+            }))
+        lap("rank")
+        timings["total"] = round((time.perf_counter() - started) * 1000, 3)
+
+        return {
+            "status": "success",
+            "results": results,
+            "candidates": count,
+            "missing_profile_ids": missing_profile_ids,
+            "weights": active,
+            "timings_ms": timings
+        }
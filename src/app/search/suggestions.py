@@ -0,0 +1,133 @@
+"""
+Penpal suggestions.
+Runs the profile search pipeline once per changed profile and stores its
+top-K in the suggestions table, so reads never touch the vector index.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from ..model import db
+from ..model.profile import Profile
+from ..repository.profile_repository import ProfileRepository
+from ..repository.suggestion_repository import SuggestionRepository
+from .profile_search import ProfileSearchPipeline
+
+
+class SuggestionEngine:
+    """Compute and store the top-K suggested penpals of profiles"""
+    DEFAULT_TOP_K = 20
+
+    def __init__(self, pipeline: ProfileSearchPipeline, top_k: int = DEFAULT_TOP_K):
+        """
+        Initialize the engine
+
+        Args:
+            pipeline: Search pipeline used to rank candidates
+            top_k: Number of suggestions stored per profile
+        """
+        self.pipeline: ProfileSearchPipeline = pipeline
+        self.top_k: int = max(1, top_k)
+        self.app = None
+
+    def init_app(self, app) -> None:
+        """
+        Remember the application, so background refreshes can open an app context
+
+        Args:
+            app: Flask application
+        """
+        self.app = app
+
+    def compute(self, profile: Profile) -> List[Tuple[int, float]]:
+        """
+        Rank candidates for one profile.
+        The profile itself, its friends and other profiles of its account are excluded.
+
+        Args:
+            profile: Profile to compute suggestions for
+
+        Returns:
+            List of (suggested profile ID, score), best first
+
+        Raises:
+            RuntimeError: When the vector search fails
+        """
+        if not profile.interests:
+            return []
+
+        filters: Dict[str, Any] = {}
+        if profile.latitude is not None and profile.longitude is not None:
+            filters['latitude'] = profile.latitude
+            filters['longitude'] = profile.longitude
+        if profile.availability:
+            filters['availability'] = profile.availability
+
+        excluded = [profile.id] + ProfileRepository.get_friend_ids(profile.id)
+        result = self.pipeline.search(
+            " ".join(profile.interests), profile.interests, self.top_k, filters,
+            exclude_profile_ids=excluded, exclude_account_id=profile.account_id
+        )
+        if result['status'] != 'success':
+            raise RuntimeError(result.get('message'))
+        return [(candidate.id, scores["score"]) for candidate, scores in result['results']]
+
+    def refresh(self, profile_ids: List[int]) -> int:
+        """
+        Recompute and store suggestions for profiles, committing once
+
+        Args:
+            profile_ids: Profiles to refresh (deleted profiles are skipped)
+
+        Returns:
+            Number of profiles refreshed
+        """
+        profiles = ProfileRepository.get_profiles_by_ids(profile_ids)
+        try:
+            for profile in profiles.values():
+                SuggestionRepository.replace_suggestions(profile.id, self.compute(profile))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(profiles)
+
+    def handle_jobs(self, jobs: List[Tuple[str, Optional[Any]]]) -> None:
+        """
+        CoalescingWorkQueue handler; job payloads are profile IDs
+
+        Args:
+            jobs: List of (key, profile ID) tuples
+        """
+        if self.app is None:
+            raise RuntimeError("SuggestionEngine.init_app() has not been called")
+        with self.app.app_context():
+            self.refresh([profile_id for _, profile_id in jobs])
+
+    def refresh_changed(self, profile_ids: List[int]) -> List[int]:
+        """
+        Refresh profiles that changed and find the stored lists they make stale:
+        lists that include a changed profile, and the lists of its nearest
+        neighbours (its own new suggestions), which may now rank it
+
+        Args:
+            profile_ids: Changed profiles (deleted profiles are skipped)
+
+        Returns:
+            IDs of the other profiles that need a refresh
+        """
+        self.refresh(profile_ids)
+        return SuggestionRepository.get_linked_profile_ids(profile_ids)
+
+    def handle_change_jobs(self, jobs: List[Tuple[str, Optional[Any]]]) -> List[int]:
+        """
+        CoalescingWorkQueue handler for changed profiles; job payloads are profile IDs
+
+        Args:
+            jobs: List of (key, profile ID) tuples
+
+        Returns:
+            IDs of the other profiles that need a refresh
+        """
+        if self.app is None:
+            raise RuntimeError("SuggestionEngine.init_app() has not been called")
+        with self.app.app_context():
+            return self.refresh_changed([profile_id for _, profile_id in jobs])
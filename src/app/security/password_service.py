@@ -0,0 +1,235 @@
+"""
+Password policy and hashing.
+Hashing and verification are CPU-bound and run on a small bounded executor,
+so a burst of logins queues behind a fixed number of hashing threads instead
+of tying up every request thread.
+"""
+
+import string
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Any, List, Optional, Tuple
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordServiceBusy(RuntimeError):
+    """Raised when too many hashing jobs are already waiting"""
+
+
+class PasswordService:
+    """Validate passwords against the policy, hash them and verify them"""
+    MIN_LENGTH = 8
+    DEFAULT_METHOD = 'scrypt'
+    DEFAULT_SALT_LENGTH = 16
+    DEFAULT_MAX_WORKERS = 2
+    DEFAULT_MAX_PENDING = 32
+    DEFAULT_TIMEOUT = 10.0
+
+    # Character classes of the policy; anything else counts as special
+    _UPPER = frozenset(string.ascii_uppercase)
+    _LOWER = frozenset(string.ascii_lowercase)
+    _DIGITS = frozenset(string.digits)
+
+    def __init__(self, method: str = DEFAULT_METHOD, salt_length: int = DEFAULT_SALT_LENGTH,
+                 max_workers: int = DEFAULT_MAX_WORKERS, max_pending: int = DEFAULT_MAX_PENDING,
+                 timeout: float = DEFAULT_TIMEOUT):
+        """
+        Initialize the service
+
+        Args:
+            method: werkzeug hash method with its work factor, e.g. "scrypt:32768:8:1"
+                    or "pbkdf2:sha256:600000"
+            salt_length: Salt length of new hashes
+            max_workers: Hashing threads
+            max_pending: Hashing jobs allowed to run or wait at once; more raise PasswordServiceBusy
+            timeout: Seconds a request waits for a hashing slot and for its result
+        """
+        self.method: str = method
+        self.salt_length: int = salt_length
+        self.max_workers: int = max(1, max_workers)
+        self.max_pending: int = max(self.max_workers, max_pending)
+        self.timeout: float = timeout
+        self.rejected: int = 0
+        self._canonical_method: Optional[str] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """
+        Read settings from Flask app config
+
+        Args:
+            app: Flask application; uses PASSWORD_HASH_METHOD, PASSWORD_SALT_LENGTH,
+                 PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING and PASSWORD_HASH_TIMEOUT
+        """
+        self.shutdown()
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.salt_length = app.config.get('PASSWORD_SALT_LENGTH', self.salt_length)
+        self.max_workers = max(1, app.config.get('PASSWORD_HASH_WORKERS', self.max_workers))
+        self.max_pending = max(self.max_workers, app.config.get('PASSWORD_HASH_MAX_PENDING', self.max_pending))
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self._canonical_method = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def policy_failures(self, password: str) -> List[str]:
+        """
+        Check a password against the policy in a single pass over its characters
+
+        Args:
+            password: Candidate password
+
+        Returns:
+            Names of the failed rules ("length", "upper", "lower", "digit", "special"),
+            empty when the password is acceptable
+        """
+        upper = lower = digit = special = False
+        for c in password:
+            if c in self._LOWER:
+                lower = True
+            elif c in self._UPPER:
+                upper = True
+            elif c in self._DIGITS:
+                digit = True
+            else:
+                special = True
+            if upper and lower and digit and special:
+                break
+
+        failures = []
+        if len(password) < self.MIN_LENGTH:
+            failures.append("length")
+        for name, present in (("upper", upper), ("lower", lower), ("digit", digit), ("special", special)):
+            if not present:
+                failures.append(name)
+        return failures
+
+    def hash(self, password: str) -> str:
+        """
+        Hash a password with the configured method and work factor
+
+        Args:
+            password: Plain-text password
+
+        Returns:
+            werkzeug password hash string
+
+        Raises:
+            PasswordServiceBusy: When the hashing queue is full
+        """
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """
+        Check a password against a stored hash
+
+        Args:
+            password_hash: Stored werkzeug hash
+            password: Plain-text password
+
+        Returns:
+            True when the password matches
+
+        Raises:
+            PasswordServiceBusy: When the hashing queue is full
+        """
+        return self._run(check_password_hash, password_hash, password)
+
+    def verify_and_update(self, password_hash: str, password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Check a password and, when it matches a hash made with outdated
+        parameters, hash it again with the current ones
+
+        Args:
+            password_hash: Stored werkzeug hash
+            password: Plain-text password
+
+        Returns:
+            Tuple of (password matches, new hash to store or None)
+
+        Raises:
+            PasswordServiceBusy: When the hashing queue is full
+        """
+        if not self.verify(password_hash, password):
+            return False, None
+        if self.needs_rehash(password_hash):
+            return True, self.hash(password)
+        return True, None
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """
+        Whether a stored hash was made with another method, work factor or salt length
+
+        Args:
+            password_hash: Stored werkzeug hash ("method$salt$hash")
+
+        Returns:
+            True when the hash should be replaced
+        """
+        try:
+            method, salt, _ = password_hash.split('$', 2)
+        except ValueError:
+            return True
+        return method != self.canonical_method or len(salt) != self.salt_length
+
+    @property
+    def canonical_method(self) -> str:
+        """Configured method with the defaults werkzeug fills in, as written into hashes"""
+        if self._canonical_method is None:
+            # werkzeug expands e.g. "scrypt" to "scrypt:32768:8:1"; a cheap hash reveals the expansion
+            self._canonical_method = generate_password_hash('', self.method, 1).split('$', 1)[0]
+        return self._canonical_method
+
+    def stats(self) -> dict:
+        """Executor settings and the number of rejected jobs"""
+        return {
+            "method": self.canonical_method,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self) -> None:
+        """Stop the hashing threads"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def reset_after_fork(self) -> None:
+        """Drop the executor inherited from the parent process; a new one starts on first use"""
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+
+    def _run(self, fn, *args: Any) -> Any:
+        """
+        Run a hashing function on the executor. A slot is held until the job
+        finishes, even when the caller stops waiting, so abandoned jobs still
+        count against `max_pending`.
+        """
+        slots = self._slots
+        if not slots.acquire(timeout=self.timeout):
+            self.rejected += 1
+            raise PasswordServiceBusy("Too many password operations in progress")
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            self.rejected += 1
+            raise PasswordServiceBusy("Password operation timed out")
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='password-hash')
+            return self._executor
+
+
+password_service = PasswordService()
@@ -0,0 +1,277 @@
+"""
+Token-bucket rate limiting.
+A bucket holds up to `capacity` tokens and refills at `capacity / period`
+tokens per second; each request takes one token and is rejected when the
+bucket is empty. Buckets live in a pluggable store: in-process by default, or
+a SQLite file shared by every worker on the host as a local stand-in for a
+shared backend such as Redis.
+"""
+
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+
+class RateLimit(NamedTuple):
+    """Bucket capacity and the seconds it takes an empty bucket to refill"""
+    capacity: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        """Tokens added per second"""
+        return self.capacity / self.period
+
+    @staticmethod
+    def parse(value: Optional[str]) -> Optional["RateLimit"]:
+        """
+        Parse a "capacity/period seconds" setting, e.g. "10/60"
+
+        Args:
+            value: Setting value; empty or "0" disables the limit
+
+        Returns:
+            RateLimit, or None when disabled
+
+        Raises:
+            ValueError: When the value is malformed
+        """
+        if value is None or str(value).strip() in ('', '0'):
+            return None
+        try:
+            capacity, period = str(value).split('/')
+            limit = RateLimit(int(capacity), float(period))
+        except ValueError:
+            raise ValueError(f"Invalid rate limit '{value}', expected 'capacity/seconds'")
+        if limit.capacity < 1 or limit.period <= 0:
+            raise ValueError(f"Invalid rate limit '{value}', capacity and seconds must be positive")
+        return limit
+
+
+class TokenBucketStore(ABC):
+    """Interface of bucket stores"""
+    name = 'abstract'
+
+    @abstractmethod
+    def consume(self, key: str, limit: RateLimit, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Refill a bucket for the time elapsed and take `cost` tokens from it if it holds enough
+
+        Args:
+            key: Bucket key
+            limit: Capacity and refill period of the bucket
+            cost: Tokens taken by this request
+
+        Returns:
+            Tuple of (allowed, seconds until enough tokens are available; 0 when allowed)
+        """
+
+    def reset_after_fork(self) -> None:
+        """Drop per-process handles inherited from the parent process"""
+
+    @staticmethod
+    def _take(tokens: float, updated_at: float, now: float,
+              limit: RateLimit, cost: float) -> Tuple[bool, float, float]:
+        """Apply one request to a bucket state; returns (allowed, retry after, remaining tokens)"""
+        tokens = min(float(limit.capacity), tokens + max(0.0, now - updated_at) * limit.rate)
+        if tokens >= cost:
+            return True, 0.0, tokens - cost
+        return False, (cost - tokens) / limit.rate, tokens
+
+
+class InMemoryTokenBucketStore(TokenBucketStore):
+    """
+    Buckets in a dict of the current process. With several worker processes
+    each one enforces the limits on its own share of the traffic.
+    """
+    name = 'memory'
+
+    def __init__(self, maxsize: int = 100000):
+        """
+        Initialize the store
+
+        Args:
+            maxsize: Maximum number of buckets; least recently used ones are dropped
+                     (a dropped bucket starts full again)
+        """
+        self.maxsize: int = maxsize
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, limit: RateLimit, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (float(limit.capacity), now))
+            allowed, retry_after, tokens = self._take(tokens, updated_at, now, limit, cost)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def reset_after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+
+class SqliteTokenBucketStore(TokenBucketStore):
+    """
+    Buckets in a SQLite file, so every worker process on the host shares them.
+    Each request is one IMMEDIATE transaction; idle buckets are pruned periodically.
+    """
+    name = 'sqlite'
+    PRUNE_EVERY = 1000
+    IDLE_SECONDS = 3600.0
+
+    def __init__(self, path: str):
+        """
+        Initialize the store (the file is opened on first use)
+
+        Args:
+            path: SQLite file path
+        """
+        self.path: str = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._calls: int = 0
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, limit: RateLimit, cost: float = 1.0) -> Tuple[bool, float]:
+        # Wall-clock time, since buckets are shared between processes
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT tokens, updated_at FROM token_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, updated_at = row if row else (float(limit.capacity), now)
+                allowed, retry_after, tokens = self._take(tokens, updated_at, now, limit, cost)
+                connection.execute(
+                    "INSERT OR REPLACE INTO token_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    (key, tokens, now)
+                )
+                self._calls += 1
+                if self._calls % self.PRUNE_EVERY == 0:
+                    connection.execute("DELETE FROM token_buckets WHERE updated_at < ?", (now - self.IDLE_SECONDS,))
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        return allowed, retry_after
+
+    def reset_after_fork(self) -> None:
+        # The parent's connection must not be used from this process
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._connection = connection
+        return self._connection
+
+
+class RateLimiter:
+    """
+    Named set of token-bucket limits, one per request dimension (e.g. IP and email).
+    A request is allowed only when every dimension it names has a token left.
+    """
+    def __init__(self, name: str, limits: Optional[Dict[str, Optional[RateLimit]]] = None,
+                 store: Optional[TokenBucketStore] = None):
+        """
+        Initialize the limiter
+
+        Args:
+            name: Limiter name, used in bucket keys and config names
+            limits: Limit per dimension; None disables a dimension
+            store: Bucket store (defaults to an in-memory store)
+        """
+        self.name: str = name
+        self.limits: Dict[str, Optional[RateLimit]] = dict(limits or {})
+        self.store: TokenBucketStore = store or InMemoryTokenBucketStore()
+        self.allowed: int = 0
+        self.rejected: Dict[str, int] = {dimension: 0 for dimension in self.limits}
+        self._counter_lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """
+        Read limits and the store from Flask app config
+
+        Args:
+            app: Flask application; uses <NAME>_RATE_LIMIT_<DIMENSION> for each
+                 dimension, RATE_LIMIT_STORE ("memory" or "sqlite") and RATE_LIMIT_STORE_PATH
+        """
+        for dimension in list(self.limits):
+            config_key = f"{self.name.upper()}_RATE_LIMIT_{dimension.upper()}"
+            if config_key in app.config:
+                self.limits[dimension] = RateLimit.parse(app.config[config_key])
+        self.allowed = 0
+        self.rejected = {dimension: 0 for dimension in self.limits}
+
+        store = app.config.get('RATE_LIMIT_STORE', 'memory')
+        if store == 'sqlite':
+            self.store = SqliteTokenBucketStore(app.config['RATE_LIMIT_STORE_PATH'])
+        elif store == 'memory':
+            self.store = InMemoryTokenBucketStore()
+        else:
+            raise ValueError(f"Unknown RATE_LIMIT_STORE '{store}'")
+
+    def hit(self, **keys: Optional[str]) -> Tuple[bool, float]:
+        """
+        Take one token from the bucket of each given dimension.
+        Dimensions are checked in order and checking stops at the first empty bucket.
+
+        Args:
+            keys: Value per dimension, e.g. ip="10.0.0.1", email="a@b.c"; None values are skipped
+
+        Returns:
+            Tuple of (allowed, seconds the caller should wait before retrying)
+        """
+        for dimension, value in keys.items():
+            limit = self.limits.get(dimension)
+            if limit is None or value is None:
+                continue
+            allowed, retry_after = self.store.consume(f"{self.name}:{dimension}:{value}", limit)
+            if not allowed:
+                with self._counter_lock:
+                    self.rejected[dimension] = self.rejected.get(dimension, 0) + 1
+                return False, retry_after
+        with self._counter_lock:
+            self.allowed += 1
+        return True, 0.0
+
+    def stats(self) -> dict:
+        """Limits, store and allowed/rejected counters of this process"""
+        return {
+            "name": self.name,
+            "store": self.store.name,
+            "limits": {
+                dimension: f"{limit.capacity}/{limit.period:g}" if limit else None
+                for dimension, limit in self.limits.items()
+            },
+            "allowed": self.allowed,
+            "rejected": dict(self.rejected)
+        }
+
+    def reset_after_fork(self) -> None:
+        """Re-create locks and store handles in a freshly forked worker"""
+        self._counter_lock = threading.Lock()
+        self.store.reset_after_fork()
+
+
+login_rate_limiter = RateLimiter('login', {
+    "ip": RateLimit(30, 60.0),
+    "email": RateLimit(10, 300.0)
+})
@@ -0,0 +1,60 @@
+"""
+Streamed JSON responses.
+Large listings are written as NDJSON (one JSON document per line), each row
+serialized as soon as it is produced instead of building the whole payload.
+"""
+
+from itertools import chain
+from typing import Any, Iterable
+from flask import Response, current_app, stream_with_context
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+_END = object()
+
+
+class JsonStream:
+    """Static helpers for streamed JSON responses"""
+
+    @staticmethod
+    def requested(value: Any) -> bool:
+        """
+        Whether a `stream` flag from a JSON body or query string is set
+
+        Args:
+            value: Flag value (bool from JSON, string from the query string)
+
+        Returns:
+            True when a streamed response was asked for
+        """
+        if isinstance(value, str):
+            return value.strip().lower() in ('1', 'true', 'yes', 'ndjson')
+        return bool(value)
+
+    @staticmethod
+    def ndjson(rows: Iterable[Any], status: int = 200) -> Response:
+        """
+        Build an NDJSON response that serializes rows while they are sent.
+
+        The first row is read before the response is returned, so an error
+        raised while running the underlying query still reaches the caller's
+        error handling instead of cutting off a 200 response.
+
+        Args:
+            rows: Iterable of JSON-serializable rows
+            status: HTTP status code
+
+        Returns:
+            Streaming Flask response
+        """
+        rows = iter(rows)
+        first = next(rows, _END)
+
+        def generate():
+            if first is _END:
+                return
+            dumps = current_app.json.dumps
+            for row in chain([first], rows):
+                yield dumps(row, separators=(',', ':')) + "\n"
+
+        return Response(stream_with_context(generate()), status=status, mimetype=NDJSON_MIMETYPE)
@@ -0,0 +1,489 @@
+"""In-process background work queue that coalesces jobs per key"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+Handler = Callable[[List[Tuple[str, Any]]], None]
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingWorkQueue:
+    """
+    Background queue processed by a pool of worker threads.
+
+    Jobs are keyed (e.g. `profile_12`). Enqueuing a key that is already
+    pending replaces its job, so only the latest payload is processed. Workers
+    take up to `batch_size` jobs at a time and hand every job of the same
+    operation to its handler in one call.
+
+    When `outbox_path` is set, pending jobs are also written to a SQLite
+    outbox, so they survive a restart. Several processes (e.g. gunicorn
+    workers) may share one outbox: every row is leased by one process at a
+    time. The process that writes a row owns it; rows whose lease has run out
+    (their owner died or stopped) are claimed atomically by `start()` and
+    periodically by the workers. A job whose row was replaced by a newer job
+    or claimed by another process is skipped instead of processed.
+
+    A failed job is retried in the process with exponential backoff, unless a
+    newer job for its key arrives first. After `max_retries` retries it is
+    moved to the dead letters (a table next to the outbox, or memory without
+    one), counted in `status()` and only run again by `retry_dead_letters()`.
+    """
+    DEFAULT_MAX_RETRIES = 5
+    DEFAULT_RETRY_DELAY = 1.0
+    MAX_RETRY_DELAY = 60.0
+    # Seconds an outbox row stays claimed; owners renew their leases every third of it
+    LEASE_SECONDS = 60.0
+
+    def __init__(self, name: str, workers: int = 1, batch_size: int = 32,
+                 outbox_path: Optional[str] = None, max_retries: int = DEFAULT_MAX_RETRIES,
+                 retry_delay: float = DEFAULT_RETRY_DELAY):
+        """
+        Initialize the queue (no threads are started and no files are opened)
+
+        Args:
+            name: Queue name, used for thread names and status output
+            workers: Number of worker threads
+            batch_size: Maximum number of jobs handed to the handlers per round
+            outbox_path: Optional SQLite file used as a durable outbox
+            max_retries: Retries of a failed job before it is moved to the dead letters
+            retry_delay: Seconds before the first retry; doubles with every
+                         further retry, up to MAX_RETRY_DELAY
+        """
+        self.name: str = name
+        self.workers: int = max(1, workers)
+        self.batch_size: int = max(1, batch_size)
+        self.outbox_path: Optional[str] = outbox_path
+        self.max_retries: int = max(0, max_retries)
+        self.retry_delay: float = retry_delay
+        self._handlers: Dict[str, Handler] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._ready: deque = deque()
+        # key -> (monotonic time due, job) of failed jobs waiting for their retry
+        self._retrying: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        # key -> seq of jobs being processed
+        self._in_flight: Dict[str, int] = {}
+        # key -> job of jobs out of retries, when there is no outbox
+        self._dead_letters: Dict[str, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._running: bool = False
+        self._seq: int = 0
+        self._outbox: Optional[sqlite3.Connection] = None
+        self._outbox_lock = threading.Lock()
+        self._owner: str = self._new_owner()
+        self._next_claim: float = 0.0
+        self.processed: int = 0
+        self.failed: int = 0
+        self.coalesced: int = 0
+        self.superseded: int = 0
+        self.last_error: Optional[str] = None
+
+    def init_app(self, app, config_prefix: str) -> None:
+        """
+        Read worker count and outbox path from Flask app config.
+        A queue already running (e.g. for another app) is stopped first and
+        restarts with the new settings on next use.
+
+        Args:
+            app: Flask application; uses <PREFIX>_WORKERS and <PREFIX>_OUTBOX_PATH
+                 (an empty path keeps jobs in memory only)
+            config_prefix: Config key prefix, e.g. "REINDEX"
+        """
+        if self._running:
+            self.stop()
+        if self._outbox is not None:
+            self._outbox.close()
+            self._outbox = None
+        self.workers = max(1, int(app.config.get(f"{config_prefix}_WORKERS", self.workers)))
+        self.outbox_path = app.config.get(f"{config_prefix}_OUTBOX_PATH", self.outbox_path) or None
+
+    def register_handler(self, op: str, handler: Handler) -> None:
+        """
+        Register the callable that processes jobs of one operation
+
+        Args:
+            op: Operation name, e.g. "upsert"
+            handler: Callable receiving a list of (key, payload) tuples.
+                     Raising marks every job of the call as failed.
+        """
+        self._handlers[op] = handler
+
+    def start(self) -> None:
+        """Open the outbox, claim unowned and expired jobs and start the worker threads"""
+        with self._cond:
+            if self._running:
+                return
+            self._open_outbox()
+            self._claim_outbox()
+            self._running = True
+            self._threads = [
+                threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the worker threads after their current batch
+
+        Args:
+            timeout: Seconds to wait for each thread
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self._outbox is not None:
+            # Let other processes take over the jobs left behind without waiting for the lease
+            with self._outbox_lock:
+                self._outbox.execute("UPDATE outbox SET owner = NULL, lease_until = NULL WHERE owner = ?",
+                                     (self._owner,))
+
+    def reset_after_fork(self) -> None:
+        """
+        Reinitialize state inherited from a parent process.
+        Threads and SQLite connections do not survive fork; jobs still in the
+        outbox are replayed by the next `start()`.
+        """
+        self._cond = threading.Condition()
+        self._outbox_lock = threading.Lock()
+        self._threads = []
+        self._running = False
+        self._outbox = None
+        self._owner = self._new_owner()
+        self._next_claim = 0.0
+        self._pending = {}
+        self._ready = deque()
+        self._retrying = {}
+        self._in_flight = {}
+        self._dead_letters = {}
+
+    def enqueue(self, key: str, op: str, payload: Any = None) -> None:
+        """
+        Schedule a job, replacing any pending job with the same key
+
+        Args:
+            key: Coalescing key
+            op: Operation name with a registered handler
+            payload: JSON-serializable job data
+        """
+        if op not in self._handlers:
+            raise ValueError(f"No handler registered for '{op}'")
+        if not self._running:
+            self.start()
+
+        with self._cond:
+            # Clock-based sequence numbers stay unique across processes sharing the outbox
+            self._seq = max(self._seq + 1, time.time_ns())
+            job = {"op": op, "payload": payload, "seq": self._seq, "enqueued_at": time.time()}
+            previous = self._pending.get(key)
+            # A newer job replaces a failed one waiting for its retry
+            retrying = self._retrying.pop(key, None)
+            earlier = previous or (retrying[1] if retrying else None)
+            if earlier is not None:
+                # Keep the original timestamp so lag reflects the real wait
+                job["enqueued_at"] = earlier["enqueued_at"]
+                self.coalesced += 1
+            self._write_outbox(key, job)
+            self._pending[key] = job
+            if previous is None and key not in self._in_flight:
+                self._ready.append(key)
+                self._cond.notify()
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Get queue depth, lag and counters
+
+        Returns:
+            Dictionary with queue statistics
+        """
+        with self._cond:
+            now = time.time()
+            waiting = list(self._pending.values()) + [job for _, job in self._retrying.values()]
+            oldest = min((job["enqueued_at"] for job in waiting), default=None)
+            return {
+                "name": self.name,
+                "running": self._running,
+                "workers": self.workers,
+                "depth": len(self._pending),
+                "in_flight": len(self._in_flight),
+                "retrying": len(self._retrying),
+                "lag_seconds": round(now - oldest, 3) if oldest is not None else 0.0,
+                "processed": self.processed,
+                "failed": self.failed,
+                "coalesced": self.coalesced,
+                "superseded": self.superseded,
+                "dead_letters": self._count_dead_letters(),
+                "last_error": self.last_error,
+                "durable": self._outbox is not None
+            }
+
+    def retry_dead_letters(self) -> int:
+        """
+        Queue the jobs that ran out of retries again. With an outbox they are
+        moved back into it unowned, so any process sharing it (this one right
+        away, if running) picks them up. Dead letters of keys with a newer job
+        are dropped instead.
+
+        Returns:
+            Number of jobs queued again
+        """
+        with self._cond:
+            self._open_outbox()
+        if self._outbox is None:
+            with self._cond:
+                dead = [(key, job) for key, job in self._dead_letters.items()
+                        if key not in self._pending and key not in self._retrying and key not in self._in_flight]
+                self._dead_letters = {}
+            for key, job in dead:
+                self.enqueue(key, job["op"], job["payload"])
+            return len(dead)
+
+        with self._outbox_lock:
+            self._outbox.execute("BEGIN IMMEDIATE")
+            try:
+                moved = self._outbox.execute(
+                    "INSERT INTO outbox (key, op, payload, seq, enqueued_at) "
+                    "SELECT key, op, payload, seq, enqueued_at FROM dead_letters "
+                    "WHERE key NOT IN (SELECT key FROM outbox)"
+                ).rowcount
+                self._outbox.execute("DELETE FROM dead_letters")
+                self._outbox.execute("COMMIT")
+            except Exception:
+                self._outbox.execute("ROLLBACK")
+                raise
+        with self._cond:
+            if self._running:
+                self._claim_outbox()
+        return moved
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while self._running:
+                    timeout = self._release_due_retries()
+                    claim_timeout = self._claim_outbox_if_due()
+                    if claim_timeout is not None:
+                        timeout = claim_timeout if timeout is None else min(timeout, claim_timeout)
+                    if self._ready:
+                        break
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                batch = []
+                while self._ready and len(batch) < self.batch_size:
+                    key = self._ready.popleft()
+                    job = self._pending.pop(key)
+                    batch.append((key, job))
+                    self._in_flight[key] = job["seq"]
+
+            by_op: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+            for key, job in batch:
+                if not self._renew_lease(key, job["seq"]):
+                    # Replaced by a newer job or claimed by another process
+                    with self._cond:
+                        self.superseded += 1
+                    continue
+                by_op.setdefault(job["op"], []).append((key, job))
+
+            for op, jobs in by_op.items():
+                try:
+                    self._handlers[op]([(key, job["payload"]) for key, job in jobs])
+                    for key, job in jobs:
+                        self._delete_outbox(key, job["seq"])
+                    with self._cond:
+                        self.processed += len(jobs)
+                except Exception as e:
+                    logger.warning("%s: %s failed for %d jobs: %s", self.name, op, len(jobs), e)
+                    with self._cond:
+                        self.failed += len(jobs)
+                        self.last_error = str(e)
+                        for key, job in jobs:
+                            self._schedule_retry(key, job, str(e))
+
+            with self._cond:
+                for key, _ in batch:
+                    self._in_flight.pop(key, None)
+                    # A newer job arrived while this key was being processed
+                    if key in self._pending:
+                        self._ready.append(key)
+                        self._cond.notify()
+
+    def _schedule_retry(self, key: str, job: Dict[str, Any], error: str) -> None:
+        """Put a failed job aside for a delayed retry, or dead-letter it (caller holds the lock)"""
+        if key in self._pending:
+            # A newer job for the key was enqueued meanwhile and supersedes this one
+            return
+        attempts = job.get("attempts", 0) + 1
+        if attempts > self.max_retries:
+            logger.error("%s: giving up on %s after %d retries, moved to dead letters",
+                         self.name, key, self.max_retries)
+            self._dead_letter(key, job, error)
+            return
+        delay = min(self.MAX_RETRY_DELAY, self.retry_delay * 2 ** (attempts - 1))
+        self._retrying[key] = (time.monotonic() + delay, dict(job, attempts=attempts))
+        self._cond.notify()
+
+    def _release_due_retries(self) -> Optional[float]:
+        """
+        Move failed jobs whose retry is due back to the ready queue (caller holds the lock)
+
+        Returns:
+            Seconds until the next retry is due, or None when none is waiting
+        """
+        now = time.monotonic()
+        next_due = None
+        for key, (due, job) in list(self._retrying.items()):
+            if due <= now:
+                del self._retrying[key]
+                self._pending[key] = job
+                if key not in self._in_flight:
+                    self._ready.append(key)
+            elif next_due is None or due < next_due:
+                next_due = due
+        return next_due - now if next_due is not None else None
+
+    @staticmethod
+    def _new_owner() -> str:
+        """Lease owner name, unique per process and queue instance"""
+        return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def _open_outbox(self) -> None:
+        if not self.outbox_path or self._outbox is not None:
+            return
+        outbox_dir = os.path.dirname(self.outbox_path)
+        if outbox_dir:
+            os.makedirs(outbox_dir, exist_ok=True)
+        self._outbox = sqlite3.connect(self.outbox_path, timeout=5.0, check_same_thread=False,
+                                       isolation_level=None)
+        self._outbox.execute("PRAGMA journal_mode=WAL")
+        self._outbox.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "key TEXT PRIMARY KEY, op TEXT NOT NULL, payload TEXT, seq INTEGER NOT NULL, enqueued_at REAL NOT NULL, "
+            "owner TEXT, lease_until REAL)"
+        )
+        # Outboxes written before leases existed
+        columns = {row[1] for row in self._outbox.execute("PRAGMA table_info(outbox)")}
+        for column, column_type in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                self._outbox.execute(f"ALTER TABLE outbox ADD COLUMN {column} {column_type}")
+        self._outbox.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters ("
+            "key TEXT PRIMARY KEY, op TEXT NOT NULL, payload TEXT, seq INTEGER NOT NULL, enqueued_at REAL NOT NULL, "
+            "failed_at REAL NOT NULL, error TEXT)"
+        )
+
+    def _claim_outbox(self) -> None:
+        """
+        Renew the leases of this process and atomically claim rows that are
+        unowned or whose lease ran out (caller holds the lock)
+        """
+        if self._outbox is None:
+            return
+        now = time.time()
+        lease_until = now + self.LEASE_SECONDS
+        with self._outbox_lock:
+            self._outbox.execute("UPDATE outbox SET lease_until = ? WHERE owner = ?", (lease_until, self._owner))
+            rows = self._outbox.execute(
+                "UPDATE outbox SET owner = ?, lease_until = ? WHERE owner IS NULL OR lease_until < ? "
+                "RETURNING key, op, payload, seq, enqueued_at",
+                (self._owner, lease_until, now)
+            ).fetchall()
+        self._next_claim = time.monotonic() + self.LEASE_SECONDS / 3
+        for key, op, payload, seq, enqueued_at in sorted(rows, key=lambda row: row[3]):
+            self._seq = max(self._seq, seq)
+            known = self._pending.get(key) or (self._retrying[key][1] if key in self._retrying else None)
+            if (known is not None and known["seq"] >= seq) or self._in_flight.get(key, -1) >= seq:
+                continue
+            self._retrying.pop(key, None)
+            had_pending = key in self._pending
+            self._pending[key] = {"op": op, "payload": json.loads(payload), "seq": seq, "enqueued_at": enqueued_at}
+            if not had_pending and key not in self._in_flight:
+                self._ready.append(key)
+        if self._ready:
+            self._cond.notify_all()
+
+    def _claim_outbox_if_due(self) -> Optional[float]:
+        """
+        Run `_claim_outbox()` when the last claim is a third of a lease old (caller holds the lock)
+
+        Returns:
+            Seconds until the next claim, or None without an outbox
+        """
+        if self._outbox is None:
+            return None
+        if time.monotonic() >= self._next_claim:
+            self._claim_outbox()
+        return max(0.0, self._next_claim - time.monotonic())
+
+    def _renew_lease(self, key: str, seq: int) -> bool:
+        """Extend the lease of a job's row; False when the row no longer holds this job of this process"""
+        if self._outbox is None:
+            return True
+        with self._outbox_lock:
+            cursor = self._outbox.execute(
+                "UPDATE outbox SET lease_until = ? WHERE key = ? AND seq = ? AND owner = ?",
+                (time.time() + self.LEASE_SECONDS, key, seq, self._owner)
+            )
+        return cursor.rowcount == 1
+
+    def _write_outbox(self, key: str, job: Dict[str, Any]) -> None:
+        if self._outbox is None:
+            return
+        with self._outbox_lock:
+            # The process writing the latest job of a key owns its row
+            self._outbox.execute(
+                "INSERT OR REPLACE INTO outbox (key, op, payload, seq, enqueued_at, owner, lease_until) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, job["op"], json.dumps(job["payload"]), job["seq"], job["enqueued_at"],
+                 self._owner, time.time() + self.LEASE_SECONDS)
+            )
+
+    def _delete_outbox(self, key: str, seq: int) -> None:
+        if self._outbox is None:
+            return
+        with self._outbox_lock:
+            # Only remove the row if no newer job replaced it meanwhile
+            self._outbox.execute("DELETE FROM outbox WHERE key = ? AND seq = ?", (key, seq))
+
+    def _dead_letter(self, key: str, job: Dict[str, Any], error: str) -> None:
+        """Move a job out of retries from the outbox to the dead letters (caller holds the lock)"""
+        if self._outbox is None:
+            self._dead_letters[key] = dict(job, error=error, failed_at=time.time())
+            return
+        with self._outbox_lock:
+            self._outbox.execute("BEGIN IMMEDIATE")
+            try:
+                moved = self._outbox.execute(
+                    "DELETE FROM outbox WHERE key = ? AND seq = ? AND owner = ?", (key, job["seq"], self._owner)
+                ).rowcount
+                if moved:
+                    self._outbox.execute(
+                        "INSERT OR REPLACE INTO dead_letters (key, op, payload, seq, enqueued_at, failed_at, error) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (key, job["op"], json.dumps(job["payload"]), job["seq"], job["enqueued_at"],
+                         time.time(), error)
+                    )
+                self._outbox.execute("COMMIT")
+            except Exception:
+                self._outbox.execute("ROLLBACK")
+                raise
+
+    def _count_dead_letters(self) -> int:
+        if self._outbox is None:
+            return len(self._dead_letters)
+        with self._outbox_lock:
+            return self._outbox.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
@@ -0,0 +1,18 @@
+"""
+ASGI entry point for uvicorn.
+Run from the repository root: `uvicorn asgi:application --app-dir src --workers 4`
+
+Each uvicorn worker is a fresh process that imports this module, so no
+state is shared across workers.
+"""
+
+import threading
+from asgiref.wsgi import WsgiToAsgi
+from app.main import create_app, warmup
+
+flask_application = create_app()
+
+if flask_application.config['REQUIRE_WARMUP']:
+    threading.Thread(target=warmup, args=(flask_application,), name="warmup", daemon=True).start()
+
+application = WsgiToAsgi(flask_application)
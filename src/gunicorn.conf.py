@@ -0,0 +1,28 @@
+"""
+Gunicorn settings for production serving.
+Run from the repository root: `gunicorn -c src/gunicorn.conf.py --pythonpath src wsgi:application`
+All settings can be overridden with the environment variables below.
+"""
+
+import multiprocessing
+import os
+import threading
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+# Import the app once in the master so workers share its read-only pages
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+
+def post_fork(server, worker):
+    """Give each worker its own database, ChromaDB and SQLite connections"""
+    from wsgi import application
+    from app.main import reset_after_fork, warmup
+
+    reset_after_fork(application)
+    if application.config['REQUIRE_WARMUP']:
+        threading.Thread(target=warmup, args=(application,), name="warmup", daemon=True).start()
@@ -0,0 +1,86 @@
+"""Behaviour tests for the account blueprint"""
+
+import json
+
+
+def test_classrooms_are_paged_with_a_cursor(client, auth, create_profile):
+    classroom_ids = [create_profile(f'Class {i}')['id'] for i in range(3)]
+
+    first = client.get('/api/account/classrooms?limit=2', headers=auth).json
+    second = client.get(f"/api/account/classrooms?limit=2&cursor={first['next_cursor']}", headers=auth).json
+
+    assert first['total_count'] == 3
+    assert len(first['classrooms']) == 2 and first['next_cursor'] is not None
+    assert len(second['classrooms']) == 1 and second['next_cursor'] is None
+    assert sorted(c['id'] for c in first['classrooms'] + second['classrooms']) == classroom_ids
+
+
+def test_classroom_pages_reflect_new_friendships(client, auth, create_profile, connect):
+    first, second = create_profile('Class A'), create_profile('Class B')
+    assert [c['friends_count'] for c in client.get('/api/account/classrooms', headers=auth).json['classrooms']] == [0, 0]
+
+    connect(first['id'], second['id'])
+
+    classrooms = client.get('/api/account/classrooms', headers=auth).json['classrooms']
+    assert [c['friends_count'] for c in classrooms] == [1, 1]
+
+
+def test_classrooms_stream_as_ndjson(client, auth, create_profile):
+    classroom_ids = [create_profile(f'Class {i}')['id'] for i in range(3)]
+
+    response = client.get('/api/account/classrooms?stream=1', headers=auth)
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert sorted(json.loads(line)['id'] for line in response.get_data(as_text=True).splitlines()) == classroom_ids
+
+
+def test_classrooms_reject_invalid_page_arguments(client, auth):
+    assert client.get('/api/account/classrooms?limit=-1', headers=auth).status_code == 400
+    assert client.get('/api/account/classrooms?cursor=x', headers=auth).status_code == 400
+
+
+def test_account_pages_classrooms_with_a_cursor(client, auth, other_auth, create_profile):
+    classroom_ids = [create_profile(f'Class {i}')['id'] for i in range(3)]
+    create_profile('Other school', headers=other_auth)
+
+    first = client.get('/api/account?limit=2', headers=auth).json
+    second = client.get(f"/api/account?limit=2&cursor={first['next_cursor']}", headers=auth).json
+
+    assert first['account']['classroom_count'] == 3
+    assert [c['id'] for c in first['classrooms']] == classroom_ids[:2]
+    assert first['next_cursor'] == classroom_ids[1]
+    assert [c['id'] for c in second['classrooms']] == classroom_ids[2:]
+    assert second['next_cursor'] is None
+
+
+def test_account_page_size_is_capped(app, client, auth, create_profile, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAX_PAGE_SIZE', 2)
+    for i in range(3):
+        create_profile(f'Class {i}')
+
+    page = client.get('/api/account?limit=50', headers=auth).json
+
+    assert len(page['classrooms']) == 2 and page['next_cursor'] is not None
+    assert client.get('/api/account?limit=0', headers=auth).status_code == 400
+
+
+def test_stats_aggregate_every_classroom(client, auth, create_profile, connect):
+    first = create_profile('Class A', ['robots', 'music'])
+    second = create_profile('Class B', ['music', 'art'])
+    create_profile('Class C')
+    connect(first['id'], second['id'])
+
+    stats = client.get('/api/account/stats', headers=auth).json
+
+    assert (stats['total_classrooms'], stats['total_connections'], stats['unique_interests']) == (3, 2, 3)
+
+
+def test_stats_are_refreshed_after_writes(client, auth, create_profile, connect):
+    first = create_profile('Class A', ['robots'])
+    assert client.get('/api/account/stats', headers=auth).json['total_classrooms'] == 1
+
+    second = create_profile('Class B', ['art'])
+    connect(first['id'], second['id'])
+
+    stats = client.get('/api/account/stats', headers=auth).json
+    assert (stats['total_classrooms'], stats['total_connections'], stats['unique_interests']) == (2, 2, 2)
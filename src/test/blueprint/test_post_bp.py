@@ -0,0 +1,111 @@
+"""Behaviour tests for the post blueprint"""
+
+from conftest import wait_for_queues
+
+
+def publish(client, auth, profile_id, content):
+    response = client.post(f'/api/profiles/{profile_id}/posts', json={'content': content}, headers=auth)
+    assert response.status_code == 201, response.json
+    return response.json['post']
+
+
+def test_timeline_lists_friends_posts_newest_first(client, auth, create_profile, connect):
+    reader, friend, stranger = (create_profile(name)['id'] for name in ('Reader', 'Friend', 'Stranger'))
+    connect(reader, friend)
+    older = publish(client, auth, friend, 'First letter')
+    newer = publish(client, auth, friend, 'Second letter')
+    publish(client, auth, stranger, 'Not a friend')
+
+    response = client.get(f'/api/profiles/{reader}/timeline', headers=auth)
+
+    assert response.status_code == 200
+    assert [post['id'] for post in response.json['posts']] == [newer['id'], older['id']]
+
+
+def test_timeline_pages_with_a_cursor(client, auth, create_profile, connect):
+    reader, friend = create_profile('Reader')['id'], create_profile('Friend')['id']
+    connect(reader, friend)
+    post_ids = [publish(client, auth, friend, f'Letter {i}')['id'] for i in range(3)]
+
+    first = client.get(f'/api/profiles/{reader}/timeline?limit=2', headers=auth).json
+    second = client.get(f"/api/profiles/{reader}/timeline?limit=2&cursor={first['next_cursor']}", headers=auth).json
+
+    assert [post['id'] for post in first['posts'] + second['posts']] == post_ids[::-1]
+    assert second['next_cursor'] is None
+
+
+def test_timeline_cache_is_invalidated_by_new_posts(client, auth, create_profile, connect):
+    reader, friend = create_profile('Reader')['id'], create_profile('Friend')['id']
+    connect(reader, friend)
+    publish(client, auth, friend, 'First letter')
+    assert client.get(f'/api/profiles/{reader}/timeline', headers=auth).json['cached'] is False
+    assert client.get(f'/api/profiles/{reader}/timeline', headers=auth).json['cached'] is True
+
+    publish(client, auth, friend, 'Second letter')
+    response = client.get(f'/api/profiles/{reader}/timeline', headers=auth).json
+
+    assert response['cached'] is False
+    assert len(response['posts']) == 2
+
+
+def test_timeline_shows_renamed_authors(client, auth, create_profile, connect):
+    reader, friend = create_profile('Reader')['id'], create_profile('Friend')['id']
+    connect(reader, friend)
+    publish(client, auth, friend, 'First letter')
+    client.get(f'/api/profiles/{reader}/timeline', headers=auth)
+
+    renamed = client.put(f'/api/profiles/{friend}', json={'name': 'Renamed friend'}, headers=auth)
+    response = client.get(f'/api/profiles/{reader}/timeline', headers=auth).json
+
+    assert renamed.status_code == 200
+    assert response['posts'][0]['profile_name'] == 'Renamed friend'
+
+
+def test_timeline_is_private_to_the_owner(client, other_auth, create_profile):
+    reader = create_profile('Reader')['id']
+
+    response = client.get(f'/api/profiles/{reader}/timeline', headers=other_auth)
+
+    assert response.status_code == 403
+
+
+def test_post_search_matches_content(client, auth, create_profile):
+    author = create_profile('Author')['id']
+    robots = publish(client, auth, author, 'We built robots in class today')
+    publish(client, auth, author, 'Our painting exhibition opens soon')
+    wait_for_queues()
+
+    response = client.post('/api/posts/search', json={'query': 'robots class', 'n_results': 1}, headers=auth)
+
+    assert response.status_code == 200
+    assert [post['id'] for post in response.json['results']] == [robots['id']]
+
+
+def test_post_search_filters_by_profile(client, auth, create_profile):
+    first, second = create_profile('First')['id'], create_profile('Second')['id']
+    publish(client, auth, first, 'Robots everywhere')
+    theirs = publish(client, auth, second, 'Robots everywhere too')
+    wait_for_queues()
+
+    response = client.post('/api/posts/search', json={'query': 'robots', 'profile_ids': [second]}, headers=auth)
+
+    assert [post['id'] for post in response.json['results']] == [theirs['id']]
+
+
+def test_post_search_forgets_deleted_posts(client, auth, create_profile):
+    author = create_profile('Author')['id']
+    post = publish(client, auth, author, 'Robots everywhere')
+    wait_for_queues()
+
+    deleted = client.delete(f"/api/posts/{post['id']}", headers=auth)
+    wait_for_queues()
+    response = client.post('/api/posts/search', json={'query': 'robots'}, headers=auth)
+
+    assert deleted.status_code == 200
+    assert response.json['results'] == [] and response.json['missing_post_ids'] == []
+
+
+def test_post_search_validates_the_query(client, auth):
+    assert client.post('/api/posts/search', json={'query': ' '}, headers=auth).status_code == 400
+    assert client.post('/api/posts/search', json={'query': 'robots', 'profile_ids': 'x'},
+                       headers=auth).status_code == 400
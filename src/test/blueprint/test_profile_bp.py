@@ -0,0 +1,259 @@
+"""Behaviour tests for the profile blueprint"""
+
+import json
+
+from conftest import wait_for_queues
+from app.model import db
+from app.model.profile import Profile
+from app.blueprint.profile_bp import chroma_service
+
+
+def test_search_ranks_profiles_sharing_interests(client, auth, create_profile):
+    robots = create_profile('Robotics club', ['robots', 'coding'])
+    create_profile('Painters', ['painting', 'drawing'])
+    wait_for_queues()
+
+    response = client.post('/api/profiles/search', json={'interests': ['robots', 'coding']}, headers=auth)
+
+    assert response.status_code == 200
+    assert response.json['matched_profiles'][0]['id'] == robots['id']
+    assert response.json['cached'] is False
+
+
+def test_search_serves_repeated_queries_from_cache(client, auth, create_profile):
+    create_profile('Robotics club', ['robots'])
+    wait_for_queues()
+
+    first = client.post('/api/profiles/search', json={'interests': ['robots']}, headers=auth)
+    second = client.post('/api/profiles/search', json={'interests': ['robots']}, headers=auth)
+
+    assert first.json['cached'] is False
+    assert second.json['cached'] is True
+    assert second.json['matched_profiles'] == first.json['matched_profiles']
+
+
+def test_search_ranks_nearer_profiles_first_when_distance_counts(client, auth, other_auth, create_profile):
+    create_profile('Paris club', ['robots'], headers=other_auth, latitude=48.8566, longitude=2.3522)
+    london = create_profile('London club', ['robots'], headers=other_auth, latitude=51.5074, longitude=-0.1278)
+    wait_for_queues()
+
+    response = client.post('/api/profiles/search', json={
+        'interests': ['robots'], 'latitude': 51.5, 'longitude': -0.12,
+        'weights': {'semantic': 0.1, 'distance': 0.9}
+    }, headers=auth)
+
+    assert response.status_code == 200
+    profiles = response.json['matched_profiles']
+    assert profiles[0]['id'] == london['id'] and profiles[0]['distance_km'] < 5
+    assert response.json['weights']['distance'] == 0.9
+
+
+def test_search_rejects_invalid_weights(client, auth):
+    response = client.post('/api/profiles/search', json={'interests': ['robots'], 'weights': 'colour=1'},
+                           headers=auth)
+
+    assert response.status_code == 400
+
+
+def test_search_requires_interests(client, auth):
+    response = client.post('/api/profiles/search', json={'interests': []}, headers=auth)
+
+    assert response.status_code == 400
+
+
+def test_search_drops_stale_index_entries(app, client, auth, create_profile):
+    stale = create_profile('Robotics club', ['robots'])
+    wait_for_queues()
+    with app.app_context():
+        # Delete behind the API's back so the index still holds the profile
+        db.session.delete(db.session.get(Profile, stale['id']))
+        db.session.commit()
+
+    response = client.post('/api/profiles/search', json={'interests': ['robots']}, headers=auth)
+    wait_for_queues()
+
+    assert response.status_code == 200
+    assert response.json['matched_profiles'] == []
+    assert response.json['missing_profile_ids'] == [stale['id']]
+    assert chroma_service.collection.get(ids=[f"profile_{stale['id']}"])['ids'] == []
+
+
+def test_nearby_from_profile_excludes_the_profile_itself(client, auth, create_profile):
+    centre = create_profile('Paris', latitude=48.8566, longitude=2.3522)
+    versailles = create_profile('Versailles', latitude=48.8049, longitude=2.1204)
+    create_profile('Lyon', latitude=45.7640, longitude=4.8357)
+
+    response = client.get(f"/api/profiles/nearby?profile_id={centre['id']}&radius_km=50", headers=auth)
+
+    assert response.status_code == 200
+    assert [profile['id'] for profile in response.json['profiles']] == [versailles['id']]
+    assert 15 < response.json['profiles'][0]['distance_km'] < 20
+
+
+def test_nearby_from_coordinates_orders_by_distance(client, auth, create_profile):
+    lyon = create_profile('Lyon', latitude=45.7640, longitude=4.8357)
+    paris = create_profile('Paris', latitude=48.8566, longitude=2.3522)
+
+    response = client.get('/api/profiles/nearby?latitude=48.85&longitude=2.35&radius_km=1000&limit=5',
+                          headers=auth)
+
+    assert response.status_code == 200
+    assert [profile['id'] for profile in response.json['profiles']] == [paris['id'], lyon['id']]
+
+
+def test_nearby_requires_a_centre(client, auth):
+    response = client.get('/api/profiles/nearby', headers=auth)
+
+    assert response.status_code == 400
+
+
+def test_disconnect_refreshes_suggestions(client, auth, other_auth, create_profile, connect):
+    ours = create_profile('Robotics club', ['robots', 'coding'])
+    theirs = create_profile('Coders', ['robots', 'coding'], headers=other_auth)
+    connect(ours['id'], theirs['id'])
+    wait_for_queues()
+    assert client.get(f"/api/profiles/{ours['id']}/suggestions", headers=auth).json['suggestions'] == []
+
+    response = client.delete(f"/api/profiles/{theirs['id']}/disconnect",
+                             json={'from_profile_id': ours['id']}, headers=auth)
+    wait_for_queues()
+
+    assert response.status_code == 200
+    suggestions = client.get(f"/api/profiles/{ours['id']}/suggestions", headers=auth).json['suggestions']
+    assert [suggestion['id'] for suggestion in suggestions] == [theirs['id']]
+
+
+def test_friends_are_paged_with_a_cursor(client, auth, create_profile, connect):
+    hub = create_profile('Hub')
+    friend_ids = [create_profile(f'Friend {i}')['id'] for i in range(3)]
+    for friend_id in friend_ids:
+        connect(hub['id'], friend_id)
+
+    first = client.get(f"/api/profiles/{hub['id']}/friends?limit=2", headers=auth).json
+    second = client.get(f"/api/profiles/{hub['id']}/friends?limit=2&cursor={first['next_cursor']}",
+                        headers=auth).json
+
+    assert first['friends_count'] == 2 and first['next_cursor'] is not None
+    assert second['friends_count'] == 1 and second['next_cursor'] is None
+    assert sorted(friend['id'] for friend in first['friends'] + second['friends']) == friend_ids
+
+
+def test_friends_stream_as_ndjson(client, auth, create_profile, connect):
+    hub = create_profile('Hub')
+    friend_ids = [create_profile(f'Friend {i}')['id'] for i in range(3)]
+    for friend_id in friend_ids:
+        connect(hub['id'], friend_id)
+
+    response = client.get(f"/api/profiles/{hub['id']}/friends?stream=true", headers=auth)
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert sorted(json.loads(line)['id'] for line in response.get_data(as_text=True).splitlines()) == friend_ids
+
+
+def test_friends_reject_invalid_page_arguments(client, auth, create_profile):
+    hub = create_profile('Hub')
+
+    assert client.get(f"/api/profiles/{hub['id']}/friends?limit=0", headers=auth).status_code == 400
+    assert client.get(f"/api/profiles/{hub['id']}/friends?cursor=abc", headers=auth).status_code == 400
+
+
+def test_bulk_connections_report_each_pair(client, auth, other_auth, create_profile, connect):
+    first, second, third = (create_profile(name)['id'] for name in ('A', 'B', 'C'))
+    foreign = create_profile('Foreign', headers=other_auth)['id']
+    connect(first, third)
+
+    response = client.post('/api/profiles/connections/bulk', json={
+        'connect': [
+            {'from_profile_id': first, 'to_profile_id': second},
+            {'from_profile_id': second, 'to_profile_id': first},
+            {'from_profile_id': foreign, 'to_profile_id': first},
+            {'from_profile_id': first}
+        ],
+        'disconnect': [{'from_profile_id': first, 'to_profile_id': third}]
+    }, headers=auth)
+
+    assert response.status_code == 207
+    assert [result['status'] for result in response.json['results']] == [
+        'connected', 'duplicate', 'not_authorized', 'invalid', 'disconnected'
+    ]
+    friends = client.get(f'/api/profiles/{first}/friends', headers=auth).json['friends']
+    assert [friend['id'] for friend in friends] == [second]
+
+
+def test_bulk_connections_refresh_suggestions(client, auth, other_auth, create_profile):
+    ours = create_profile('Robotics club', ['robots'])['id']
+    theirs = create_profile('Coders', ['robots'], headers=other_auth)['id']
+
+    def suggested_ids():
+        wait_for_queues()
+        return [s['id'] for s in client.get(f'/api/profiles/{ours}/suggestions', headers=auth).json['suggestions']]
+
+    connected = client.post('/api/profiles/connections/bulk', json={
+        'connect': [{'from_profile_id': ours, 'to_profile_id': theirs}]
+    }, headers=auth)
+    assert connected.status_code == 200
+    assert suggested_ids() == []
+
+    disconnected = client.post('/api/profiles/connections/bulk', json={
+        'disconnect': [{'from_profile_id': ours, 'to_profile_id': theirs}]
+    }, headers=auth)
+    assert disconnected.status_code == 200
+    assert suggested_ids() == [theirs]
+
+
+def test_bulk_connections_require_pairs(client, auth):
+    response = client.post('/api/profiles/connections/bulk', json={'connect': []}, headers=auth)
+
+    assert response.status_code == 400
+
+
+def test_profile_coordinates_are_validated_one_by_one(client, auth, create_profile):
+    half = create_profile('Half', latitude='45.5')
+    invalid = client.post('/api/profiles', json={'name': 'Bad', 'latitude': 'abc'}, headers=auth)
+    update = client.put(f"/api/profiles/{half['id']}", json={'longitude': 'abc'}, headers=auth)
+
+    assert (half['latitude'], half['longitude']) == (45.5, None)
+    assert invalid.status_code == 400
+    assert update.status_code == 400
+
+
+def test_nearby_rejects_blank_coordinates(client, auth):
+    response = client.get('/api/profiles/nearby?latitude=&longitude=2', headers=auth)
+
+    assert response.status_code == 400
+
+
+def suggested_ids(client, auth, profile_id):
+    wait_for_queues()
+    response = client.get(f'/api/profiles/{profile_id}/suggestions', headers=auth)
+    return [suggestion['id'] for suggestion in response.json['suggestions']]
+
+
+def test_new_profiles_appear_in_existing_suggestions(client, auth, other_auth, create_profile):
+    ours = create_profile('Robotics club', ['robots', 'coding'])['id']
+    assert suggested_ids(client, auth, ours) == []
+
+    theirs = create_profile('Coders', ['robots', 'coding'], headers=other_auth)['id']
+
+    assert suggested_ids(client, auth, ours) == [theirs]
+
+
+def test_edited_profiles_update_existing_suggestions(client, auth, other_auth, create_profile):
+    ours = create_profile('Robotics club', ['robots'])['id']
+    theirs = create_profile('Coders', ['robots'], headers=other_auth)['id']
+    assert suggested_ids(client, auth, ours) == [theirs]
+
+    client.put(f'/api/profiles/{theirs}', json={'interests': []}, headers=other_auth)
+
+    assert suggested_ids(client, auth, ours) == []
+
+
+def test_deleted_profiles_leave_existing_suggestions(client, auth, other_auth, create_profile):
+    ours = create_profile('Robotics club', ['robots'])['id']
+    first = create_profile('Coders', ['robots'], headers=other_auth)['id']
+    second = create_profile('Makers', ['robots'], headers=other_auth)['id']
+    assert sorted(suggested_ids(client, auth, ours)) == [first, second]
+
+    client.delete(f'/api/profiles/{first}', headers=other_auth)
+
+    assert suggested_ids(client, auth, ours) == [second]
@@ -0,0 +1,76 @@
+"""
+Cache invalidation across worker processes.
+Two cache instances sharing one generation store stand in for the same
+cache in two gunicorn workers.
+"""
+
+import pytest
+from flask import Flask
+
+from app.cache.generation_store import SqliteGenerationStore
+from app.cache.ttl_cache import TTLCache, VersionedTTLCache
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / 'cache_generations.db')
+
+
+def test_invalidate_reaches_other_workers(store_path):
+    first = TTLCache(ttl=60, generations=SqliteGenerationStore(store_path, 'account_cache'))
+    second = TTLCache(ttl=60, generations=SqliteGenerationStore(store_path, 'account_cache'))
+    first.set(1, 'old')
+    second.set(1, 'old')
+    second.set(2, 'other')
+
+    first.invalidate(1)
+
+    assert second.get(1) is None
+    assert second.get(2) == 'other'
+    second.set(1, 'new')
+    assert second.get(1) == 'new'
+
+
+def test_bump_version_reaches_other_workers(store_path):
+    first = VersionedTTLCache(ttl=60, generations=SqliteGenerationStore(store_path, 'search_cache'))
+    second = VersionedTTLCache(ttl=60, generations=SqliteGenerationStore(store_path, 'search_cache'))
+    version = second.version
+    second.set('query', ['a'], version)
+
+    assert first.bump_version() == version + 1
+
+    assert second.get('query') is None
+    # A result computed before the bump is not stored
+    second.set('query', ['stale'], version)
+    assert second.get('query') is None
+
+
+def test_namespaces_are_independent(store_path):
+    accounts = TTLCache(ttl=60, generations=SqliteGenerationStore(store_path, 'account_cache'))
+    timelines = TTLCache(ttl=60, generations=SqliteGenerationStore(store_path, 'timeline_cache'))
+    timelines.set(1, 'head')
+
+    accounts.invalidate(1)
+
+    assert timelines.get(1) == 'head'
+
+
+def test_memory_store_keeps_invalidations_per_process(store_path):
+    application = Flask(__name__)
+    application.config.update({'CACHE_STORE': 'memory', 'SEARCH_CACHE_SIZE': 8, 'SEARCH_CACHE_TTL': 10})
+    cache = VersionedTTLCache()
+    cache.init_app(application, 'SEARCH_CACHE')
+
+    assert cache.generations is None
+    assert cache.stats()["maxsize"] == 8
+    assert cache.bump_version() == 1
+
+    application.config['CACHE_STORE'] = 'redis'
+    with pytest.raises(ValueError):
+        cache.init_app(application, 'SEARCH_CACHE')
+
+
+def test_app_caches_share_invalidations_by_default(app):
+    from app.repository.account_repository import account_cache
+    assert app.config['CACHE_STORE'] == 'sqlite'
+    assert account_cache.stats()["shared"] is True
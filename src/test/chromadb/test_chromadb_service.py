@@ -0,0 +1,37 @@
+"""Behaviour tests for formatting ChromaDB query results"""
+
+from app.chromadb.chromadb_service import ChromaDBService
+
+
+def query_results(rows):
+    """collection.query result of one query from (id, metadata, distance) rows"""
+    return {
+        'ids': [[row[0] for row in rows]],
+        'documents': [[f"text of {row[0]}" for row in rows]],
+        'metadatas': [[row[1] for row in rows]],
+        'distances': [[row[2] for row in rows]]
+    }
+
+
+def test_matches_collapse_into_their_parents():
+    results = query_results([
+        ('robots#1', {ChromaDBService.PARENT_ID_KEY: 'robots'}, 0.1),
+        ('robots#0', {ChromaDBService.PARENT_ID_KEY: 'robots'}, 0.2),
+        ('painting', None, 0.3)
+    ])
+
+    matches = list(ChromaDBService._iter_matches(results, 0, 5, collapse_parents=True))
+
+    assert [(match['id'], match['chunk_id']) for match in matches] == [('robots', 'robots#1'), ('painting', 'painting')]
+
+
+def test_matches_collapse_by_a_custom_parent_key():
+    results = query_results([
+        ('a', {'thread': 't1'}, 0.1),
+        ('b', {'thread': 't1'}, 0.2),
+        ('c', {'thread': 't2'}, 0.3)
+    ])
+
+    matches = list(ChromaDBService._iter_matches(results, 0, 2, collapse_parents=True, parent_key='thread'))
+
+    assert [match['id'] for match in matches] == ['t1', 't2']
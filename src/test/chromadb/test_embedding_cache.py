@@ -0,0 +1,66 @@
+"""Behaviour tests for the content-addressed embedding cache"""
+
+from flask import Flask
+
+from app.chromadb.embedding_cache import EmbeddingCache, embedding_cache
+
+
+class CountingEmbeddingFunction:
+    """Embeds a text as (length, word count) and records every text it was asked to embed"""
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), float(len(text.split()))] for text in texts]
+
+
+def test_repeated_texts_are_embedded_once():
+    function = CountingEmbeddingFunction()
+    cache = EmbeddingCache(function)
+
+    first = cache.embed(['Football  Music', 'art'])
+    second = cache.embed(['football music', 'art', 'art'])
+
+    assert function.calls == [['football music', 'art']]
+    assert second == [first[0], first[1], first[1]]
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (2, 2)
+
+
+def test_persisted_vectors_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'embeddings.db')
+    EmbeddingCache(CountingEmbeddingFunction(), persist_path=path).embed(['robots'])
+
+    function = CountingEmbeddingFunction()
+    restarted = EmbeddingCache(function, persist_path=path)
+
+    assert restarted.embed(['robots']) == [[6.0, 1.0]]
+    assert function.calls == []
+    assert restarted.stats()['disk_hits'] == 1
+
+
+def test_settings_come_from_app_config(tmp_path):
+    application = Flask(__name__)
+    function = CountingEmbeddingFunction()
+    application.config.update({
+        'EMBEDDING_CACHE_SIZE': 1,
+        'EMBEDDING_CACHE_PATH': str(tmp_path / 'embeddings.db'),
+        'CHROMA_EMBEDDING_FUNCTION': function
+    })
+    cache = EmbeddingCache(maxsize=10)
+
+    cache.init_app(application)
+    cache.embed(['robots', 'art'])
+
+    assert cache.stats()['size'] == 1 and cache.stats()['persistent'] is True
+    assert (tmp_path / 'embeddings.db').exists()
+
+
+def test_every_collection_shares_the_cache(app):
+    from app.main import chroma_service as document_service
+    from app.blueprint.profile_bp import chroma_service as profile_service
+    from app.blueprint.post_bp import chroma_service as post_service
+
+    assert document_service.embedding_cache is embedding_cache
+    assert profile_service.embedding_cache is embedding_cache
+    assert post_service.embedding_cache is embedding_cache
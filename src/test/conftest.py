@@ -0,0 +1,164 @@
+"""
+Shared fixtures for the behaviour tests.
+One application is created per test session on a temporary SQLite database
+and ChromaDB directory; every test starts from empty tables, collections and
+caches. Texts are embedded with a deterministic bag-of-words function, so the
+tests neither download nor run the embedding model.
+"""
+
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+from chromadb.api.types import EmbeddingFunction
+from flask_jwt_extended import create_access_token
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import create_app, initialize, chroma_service as document_chroma_service  # noqa: E402
+from app.model import db  # noqa: E402
+from app.model.account import Account  # noqa: E402
+from app.blueprint.profile_bp import chroma_service as profile_chroma_service  # noqa: E402
+from app.blueprint.profile_bp import reindex_queue, suggestion_queue, search_cache  # noqa: E402
+from app.blueprint.post_bp import chroma_service as post_chroma_service, post_index_queue  # noqa: E402
+from app.repository.account_repository import account_cache  # noqa: E402
+from app.repository.post_repository import timeline_cache  # noqa: E402
+from app.security.rate_limiter import login_rate_limiter  # noqa: E402
+
+
+class BagOfWordsEmbeddingFunction(EmbeddingFunction):
+    """Hashes each word into one of DIMENSIONS buckets; texts sharing words are similar"""
+    DIMENSIONS = 64
+
+    def __init__(self):
+        pass
+
+    def __call__(self, input):
+        vectors = []
+        for text in input:
+            vector = np.zeros(self.DIMENSIONS, dtype=np.float32)
+            for word in text.lower().replace('.', ' ').split():
+                vector[int(hashlib.sha256(word.encode('utf-8')).hexdigest(), 16) % self.DIMENSIONS] += 1.0
+            vector[0] += 0.01  # keep blank texts off the zero vector
+            vectors.append(vector / np.linalg.norm(vector))
+        return vectors
+
+    @staticmethod
+    def name():
+        return "bag-of-words-test"
+
+    def get_config(self):
+        return {}
+
+    @staticmethod
+    def build_from_config(config):
+        return BagOfWordsEmbeddingFunction()
+
+
+QUEUES = (reindex_queue, suggestion_queue, post_index_queue)
+CHROMA_SERVICES = (document_chroma_service, profile_chroma_service, post_chroma_service)
+
+
+def wait_for_queues(timeout: float = 10.0) -> None:
+    """Block until every background queue has processed its jobs"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        statuses = [queue.status() for queue in QUEUES]
+        if all(s["depth"] == 0 and s["in_flight"] == 0 and s["retrying"] == 0 for s in statuses):
+            return
+        time.sleep(0.02)
+    raise AssertionError(f"Background queues did not drain: {statuses}")
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    base = tmp_path_factory.mktemp('penpals')
+    application = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{base / 'penpals.db'}",
+        'CHROMA_PERSIST_DIRECTORY': str(base / 'chroma'),
+        'CHROMA_EMBEDDING_FUNCTION': BagOfWordsEmbeddingFunction(),
+        'REINDEX_OUTBOX_PATH': '',
+        'SUGGESTION_OUTBOX_PATH': '',
+        'POST_INDEX_OUTBOX_PATH': '',
+        'CACHE_STORE_PATH': str(base / 'cache_generations.db'),
+        # Keep hashing cheap; the method itself is covered by werkzeug
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'
+    })
+    initialize(application)
+    yield application
+    for queue in QUEUES:
+        queue.stop(timeout=5)
+
+
+@pytest.fixture(autouse=True)
+def clean_state(app):
+    yield
+    wait_for_queues()
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+    for service in CHROMA_SERVICES:
+        stored_ids = service.collection.get(include=[])['ids']
+        if stored_ids:
+            service.collection.delete(ids=stored_ids)
+    for cache in (search_cache, account_cache, timeline_cache):
+        cache.clear()
+    login_rate_limiter.init_app(app)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def create_account(app, email: str):
+    """Insert an account and return (account ID, auth headers)"""
+    with app.app_context():
+        account = Account(email=email, password_hash='unused')
+        db.session.add(account)
+        db.session.commit()
+        token = create_access_token(identity=str(account.id))
+        return account.id, {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def account(app):
+    """An account with a JWT; returns (account ID, auth headers)"""
+    return create_account(app, 'teacher@school.test')
+
+
+@pytest.fixture
+def auth(account):
+    return account[1]
+
+
+@pytest.fixture
+def other_auth(app):
+    """Auth headers of a second account"""
+    return create_account(app, 'other@school.test')[1]
+
+
+@pytest.fixture
+def create_profile(client, auth):
+    """Create a profile through the API (as the first account unless headers are given) and return its JSON"""
+    def create(name, interests=None, headers=None, **fields):
+        response = client.post('/api/profiles', json=dict(name=name, interests=interests or [], **fields),
+                               headers=headers or auth)
+        assert response.status_code == 201, response.json
+        return response.json['profile']
+    return create
+
+
+@pytest.fixture
+def connect(client, auth):
+    """Make two profiles of the current account friends"""
+    def make_friends(from_profile_id, to_profile_id):
+        response = client.post(f'/api/profiles/{to_profile_id}/connect',
+                               json={'from_profile_id': from_profile_id}, headers=auth)
+        assert response.status_code == 201, response.json
+    return make_friends
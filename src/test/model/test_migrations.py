@@ -0,0 +1,35 @@
+"""Tests for the schema migrations"""
+
+from sqlalchemy import text
+
+from app.model import db
+from app.model.migrations import migrate_profile_coordinates
+
+
+def create_legacy_profiles(rows):
+    """Replace the profiles table with the text-coordinate schema and fill it"""
+    with db.engine.begin() as connection:
+        connection.execute(text("DROP TABLE profiles"))
+        connection.execute(text(
+            "CREATE TABLE profiles (id INTEGER PRIMARY KEY, account_id INTEGER NOT NULL, "
+            "name VARCHAR(100) NOT NULL, latitude VARCHAR(50), longitude VARCHAR(50))"
+        ))
+        connection.execute(text(
+            "INSERT INTO profiles (id, account_id, name, latitude, longitude) VALUES (:id, 1, 'Class', :lat, :lng)"
+        ), [{"id": index + 1, "lat": lat, "lng": lng} for index, (lat, lng) in enumerate(rows)])
+
+
+def test_coordinates_become_numbers_and_garbage_becomes_null(app):
+    with app.app_context():
+        create_legacy_profiles([(' 48.85 ', '2.35'), ('abc', '2.35'), ('', None), ('95', '-200'), ('12x', '1e1')])
+
+        counts = migrate_profile_coordinates()
+
+        rows = db.session.execute(text("SELECT latitude, longitude FROM profiles ORDER BY id")).all()
+        assert counts == {"migrated": 5, "cleared": 4}
+        assert [tuple(row) for row in rows] == [(48.85, 2.35), (None, 2.35), (None, None), (None, None), (None, 10.0)]
+
+
+def test_migrating_an_up_to_date_database_is_a_no_op(app):
+    with app.app_context():
+        assert migrate_profile_coordinates() == {"migrated": 0, "cleared": 0}
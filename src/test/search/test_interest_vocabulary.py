@@ -0,0 +1,43 @@
+"""Tests for batched Jaccard similarity over encoded interest lists"""
+
+import pytest
+
+from app.helper import PenpalsHelper
+from app.search.interest_vocabulary import InterestVocabulary
+
+
+def test_jaccard_many_matches_the_pairwise_similarity():
+    vocabulary = InterestVocabulary()
+    query = ["Art", " music ", "chess"]
+    others = [["art", "Music"], ["chess", "art", "music"], ["football"], [], ["ART", "art", "history"]]
+
+    similarities = vocabulary.jaccard_many(query, others)
+
+    for other, similarity in zip(others, similarities):
+        assert similarity == pytest.approx(PenpalsHelper.calculate_interest_similarity(query, other))
+
+
+def test_unknown_query_interests_do_not_grow_the_vocabulary():
+    vocabulary = InterestVocabulary()
+
+    similarities = vocabulary.jaccard_many(["art", "knitting"], [["art"]])
+
+    assert similarities[0] == pytest.approx(0.5)
+    assert vocabulary.stats()["terms"] == 1
+
+
+def test_empty_inputs():
+    vocabulary = InterestVocabulary()
+
+    assert len(vocabulary.jaccard_many(["art"], [])) == 0
+    assert vocabulary.jaccard_many([], [[], ["art"]]).tolist() == [0.0, 0.0]
+
+
+def test_encoded_lists_are_evicted_beyond_maxsize():
+    vocabulary = InterestVocabulary(maxsize=2)
+
+    for interests in (["a"], ["b"], ["c"]):
+        vocabulary.encode(interests)
+
+    assert vocabulary.stats()["cached_lists"] == 2
+    assert vocabulary.encode(["a"]).tolist() == [0]
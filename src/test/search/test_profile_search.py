@@ -0,0 +1,61 @@
+"""Tests for the profile search pipeline"""
+
+import numpy as np
+import pytest
+
+from app.search.profile_search import ProfileSearchPipeline
+
+
+def test_build_where_excludes_the_account_before_retrieval():
+    where = ProfileSearchPipeline.build_where({}, [3], exclude_account_id=7)
+
+    assert where == {"$and": [{"account_id": {"$ne": 7}}, {"profile_id": {"$ne": 3}}]}
+
+
+def test_build_where_without_filters_is_empty():
+    assert ProfileSearchPipeline.build_where({}) is None
+
+
+def test_weights_parse_from_config_strings_and_objects():
+    assert ProfileSearchPipeline.parse_weights("semantic=0.6, distance=0.4") == {
+        "semantic": 0.6, "interests": 0.0, "distance": 0.4, "availability": 0.0
+    }
+    assert ProfileSearchPipeline.parse_weights({"interests": 1})["interests"] == 1.0
+
+
+@pytest.mark.parametrize('weights', ["semantic", "colour=1", {"semantic": -1}, {"semantic": "high"}, ["semantic"]])
+def test_invalid_weights_are_rejected(weights):
+    with pytest.raises(ValueError):
+        ProfileSearchPipeline.parse_weights(weights)
+
+
+def test_active_weights_drop_scores_the_query_cannot_use():
+    pipeline = ProfileSearchPipeline(None)
+
+    without_origin = pipeline.active_weights({})
+    with_origin = pipeline.active_weights({"latitude": 51.5, "longitude": -0.1})
+
+    assert without_origin["distance"] == 0.0 and without_origin["availability"] == 0.0
+    assert without_origin["semantic"] == pytest.approx(0.5 / 0.7)
+    assert with_origin["distance"] == pytest.approx(0.2 / 0.9)
+    assert pipeline.active_weights({}, {key: 0.0 for key in ProfileSearchPipeline.WEIGHT_KEYS})["semantic"] == 1.0
+
+
+def test_haversine_handles_candidates_without_coordinates():
+    distances = ProfileSearchPipeline.haversine_km(51.5074, -0.1278, np.array([48.8566, np.nan]),
+                                                   np.array([2.3522, np.nan]))
+
+    assert distances[0] == pytest.approx(343.5, abs=1.0)
+    assert np.isnan(distances[1])
+
+
+@pytest.mark.parametrize('data', [
+    {"latitude": 51.5},
+    {"max_distance_km": 10},
+    {"latitude": 51.5, "longitude": -0.1, "max_distance_km": 0},
+    {"min_class_size": "many"},
+    {"availability": [{"day": "Monday"}]},
+])
+def test_invalid_filters_are_rejected(data):
+    with pytest.raises(ValueError):
+        ProfileSearchPipeline.parse_filters(data)
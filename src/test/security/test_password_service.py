@@ -0,0 +1,49 @@
+"""Behaviour tests for password hashing on the bounded executor"""
+
+import threading
+
+import pytest
+
+from app.security.password_service import PasswordService, PasswordServiceBusy
+
+
+def test_jobs_beyond_max_pending_are_rejected():
+    service = PasswordService(method='pbkdf2:sha256:1000', max_workers=1, max_pending=1, timeout=0.05)
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+
+    def hold_the_only_slot():
+        # Gives up waiting after the timeout, but the job keeps its slot until it finishes
+        with pytest.raises(PasswordServiceBusy):
+            service._run(blocking)
+    holder = threading.Thread(target=hold_the_only_slot)
+    holder.start()
+    started.wait(5)
+    try:
+        with pytest.raises(PasswordServiceBusy):
+            service.hash('Secret#123')
+    finally:
+        release.set()
+        holder.join(5)
+        service.shutdown()
+
+    assert service.rejected == 2
+
+
+def test_hashes_with_other_parameters_need_a_rehash():
+    old = PasswordService(method='pbkdf2:sha256:1000', salt_length=8)
+    current = PasswordService(method='pbkdf2:sha256:1000', salt_length=16)
+    try:
+        old_hash = old.hash('Secret#123')
+
+        assert current.verify_and_update(old_hash, 'Wrong#123') == (False, None)
+        valid, new_hash = current.verify_and_update(old_hash, 'Secret#123')
+        assert valid and new_hash is not None and not current.needs_rehash(new_hash)
+        assert current.verify_and_update(new_hash, 'Secret#123') == (True, None)
+    finally:
+        old.shutdown()
+        current.shutdown()
@@ -0,0 +1,70 @@
+"""Tests for PenpalsHelper"""
+
+import pytest
+
+from app.helper import PenpalsHelper
+
+
+@pytest.mark.parametrize('latitude, longitude, valid', [
+    (48.85, 2.35, True),
+    ('48.85', '2.35', True),
+    (None, None, True),
+    ('', ' ', True),
+    (0, 0, True),
+    ('45', None, True),
+    ('abc', None, False),
+    (None, 'abc', False),
+    (91, 0, False),
+    (0, -181, False),
+    ('nan', 0, False),
+    (True, 0, False),
+    ([1], 0, False)
+])
+def test_validate_coordinates_checks_each_supplied_value(latitude, longitude, valid):
+    assert PenpalsHelper.validate_coordinates(latitude, longitude) is valid
+
+
+@pytest.mark.parametrize('value, parsed', [
+    ('12.5', 12.5), (3, 3.0), (None, None), ('  ', None), ('abc', None), ({}, None), (False, None)
+])
+def test_parse_coordinate_never_raises(value, parsed):
+    assert PenpalsHelper.parse_coordinate(value) == parsed
+
+
+def test_haversine_matches_known_distances():
+    assert PenpalsHelper.haversine_km(48.8566, 2.3522, 51.5074, -0.1278) == pytest.approx(343.5, abs=1)
+    assert PenpalsHelper.haversine_km(10, 20, 10, 20) == 0
+    assert PenpalsHelper.haversine_km(0, 0, 0, 180) == pytest.approx(20015, abs=5)
+
+
+def test_bounding_box_encloses_the_circle():
+    min_lat, max_lat, ranges = PenpalsHelper.bounding_box(48.8566, 2.3522, 100)
+
+    assert min_lat < 48.8566 - 0.89 and max_lat > 48.8566 + 0.89
+    assert len(ranges) == 1 and ranges[0][0] < 2.3522 - 1.3 < 2.3522 + 1.3 < ranges[0][1]
+
+
+def test_bounding_box_splits_at_the_antimeridian():
+    _, _, ranges = PenpalsHelper.bounding_box(0, 179.5, 200)
+
+    assert ranges[0][1] == 180.0 and ranges[1][0] == -180.0
+    assert ranges[1][1] == pytest.approx(179.5 + 1.8 - 360, abs=0.1)
+
+
+def test_bounding_box_covers_every_longitude_near_a_pole():
+    assert PenpalsHelper.bounding_box(89.5, 0, 100)[2] == [(-180.0, 180.0)]
+
+
+@pytest.mark.parametrize('args, page', [
+    ({}, (20, None)),
+    ({'limit': '5', 'cursor': '12'}, (5, 12)),
+    ({'limit': '500', 'cursor': ''}, (100, None)),
+])
+def test_parse_page_args_defaults_and_caps_the_page_size(args, page):
+    assert PenpalsHelper.parse_page_args(args, 20, 100) == page
+
+
+@pytest.mark.parametrize('args', [{'limit': '0'}, {'limit': 'ten'}, {'cursor': 'x'}])
+def test_parse_page_args_rejects_invalid_arguments(args):
+    with pytest.raises(ValueError):
+        PenpalsHelper.parse_page_args(args, 20, 100)
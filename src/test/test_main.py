@@ -0,0 +1,284 @@
+"""Behaviour tests for the authentication and document routes"""
+
+import json
+
+import pytest
+
+from app.main import chroma_service
+from app.model.account import Account
+from app.security.password_service import PasswordServiceBusy, password_service
+from app.security.rate_limiter import login_rate_limiter
+
+PASSWORD = 'Secret#123'
+
+
+def register(client, email):
+    response = client.post('/api/auth/register', json={'email': email, 'password': PASSWORD})
+    assert response.status_code == 201, response.json
+
+
+def test_login_returns_a_token(client):
+    register(client, 'teacher@school.test')
+
+    response = client.post('/api/auth/login', json={'email': 'teacher@school.test', 'password': PASSWORD})
+
+    assert response.status_code == 200
+    assert response.json['access_token']
+
+
+def test_login_throttles_repeated_failures_per_email(client):
+    register(client, 'teacher@school.test')
+    wrong = {'email': 'teacher@school.test', 'password': 'Wrong#123'}
+
+    statuses = [client.post('/api/auth/login', json=wrong).status_code for _ in range(10)]
+    throttled = client.post('/api/auth/login', json={'email': 'Teacher@School.test ', 'password': PASSWORD})
+
+    assert statuses == [401] * 10
+    assert throttled.status_code == 429
+    assert int(throttled.headers['Retry-After']) > 0
+    other = client.post('/api/auth/login', json={'email': 'other@school.test', 'password': PASSWORD})
+    assert other.status_code == 401
+
+
+def test_login_throttles_per_client_address(app, client):
+    default_limit = login_rate_limiter.limits['ip']
+    app.config['LOGIN_RATE_LIMIT_IP'] = '2/60'
+    try:
+        login_rate_limiter.init_app(app)
+        statuses = [
+            client.post('/api/auth/login', json={'email': f'user{i}@school.test', 'password': PASSWORD}).status_code
+            for i in range(3)
+        ]
+    finally:
+        del app.config['LOGIN_RATE_LIMIT_IP']
+        login_rate_limiter.limits['ip'] = default_limit
+
+    assert statuses == [401, 401, 429]
+
+
+def test_login_rejects_non_string_credentials(client):
+    response = client.post('/api/auth/login', json={'email': ['teacher@school.test'], 'password': PASSWORD})
+
+    assert response.status_code == 400
+
+
+def stored_hash(app, email):
+    with app.app_context():
+        return Account.query.filter_by(email=email).first().password_hash
+
+
+def test_login_rehashes_passwords_made_with_old_parameters(app, client, monkeypatch):
+    register(client, 'teacher@school.test')
+    old_hash = stored_hash(app, 'teacher@school.test')
+    monkeypatch.setattr(password_service, 'method', 'pbkdf2:sha256:2000')
+    monkeypatch.setattr(password_service, '_canonical_method', None)
+    login = {'email': 'teacher@school.test', 'password': PASSWORD}
+
+    assert client.post('/api/auth/login', json=login).status_code == 200
+    new_hash = stored_hash(app, 'teacher@school.test')
+    assert old_hash.startswith('pbkdf2:sha256:1000$') and new_hash.startswith('pbkdf2:sha256:2000$')
+
+    # The upgraded hash still verifies and is kept
+    assert client.post('/api/auth/login', json=login).status_code == 200
+    assert stored_hash(app, 'teacher@school.test') == new_hash
+
+
+def test_login_answers_503_while_hashing_is_saturated(client, monkeypatch):
+    register(client, 'teacher@school.test')
+
+    def busy(password_hash, password):
+        raise PasswordServiceBusy("Too many password operations in progress")
+    monkeypatch.setattr(password_service, 'verify_and_update', busy)
+    response = client.post('/api/auth/login', json={'email': 'teacher@school.test', 'password': PASSWORD})
+
+    assert response.status_code == 503
+
+
+def test_me_pages_classrooms_with_a_cursor(client, auth, create_profile):
+    classroom_ids = [create_profile(f'Class {i}')['id'] for i in range(3)]
+
+    first = client.get('/api/auth/me?limit=2', headers=auth).json
+    second = client.get(f"/api/auth/me?limit=2&cursor={first['next_cursor']}", headers=auth).json
+
+    assert [c['id'] for c in first['classrooms'] + second['classrooms']] == classroom_ids
+    assert second['next_cursor'] is None
+    assert client.get('/api/auth/me?cursor=abc', headers=auth).status_code == 400
+
+
+@pytest.fixture
+def small_chunks(app, monkeypatch):
+    """Split documents into chunks of at most four words"""
+    monkeypatch.setitem(app.config, 'DOCUMENT_CHUNK_TOKENS', 4)
+    monkeypatch.setitem(app.config, 'DOCUMENT_CHUNK_OVERLAP', 0)
+
+
+def stored_chunk_ids(parent_id):
+    return sorted(chroma_service.collection.get(where={'parent_id': parent_id}, include=[])['ids'])
+
+
+def test_upload_stores_chunks_and_query_returns_documents(client, small_chunks):
+    response = client.post('/api/documents/upload', json={
+        'documents': ['Robots are fun. We build robots weekly.', 'Painting is calm.'],
+        'ids': ['robots', 'painting']
+    })
+    matches = client.post('/api/documents/query', json={'query': 'build robots', 'n_results': 2}).json['results']
+
+    assert response.status_code == 201
+    assert stored_chunk_ids('robots') == ['robots#0', 'robots#1']
+    assert [match['id'] for match in matches] == ['robots', 'painting']
+
+
+def test_upload_replaces_every_chunk_of_a_changed_document(client, small_chunks):
+    client.post('/api/documents/upload', json={
+        'documents': ['Robots are fun. We build robots weekly. Come and join us.'], 'ids': ['robots']
+    })
+    assert stored_chunk_ids('robots') == ['robots#0', 'robots#1', 'robots#2']
+
+    response = client.post('/api/documents/upload', json={'documents': ['Robots are fun.'], 'ids': ['robots']})
+
+    assert response.status_code == 201
+    assert stored_chunk_ids('robots') == ['robots#0']
+
+
+def test_failed_upload_keeps_the_stored_chunks(client, small_chunks, monkeypatch):
+    client.post('/api/documents/upload', json={
+        'documents': ['Robots are fun. We build robots weekly.'], 'ids': ['robots']
+    })
+
+    def unavailable(texts):
+        raise RuntimeError('embedding model unavailable')
+    monkeypatch.setattr(chroma_service, '_embed', unavailable)
+    response = client.post('/api/documents/upload', json={'documents': ['Robots are fun.'], 'ids': ['robots']})
+
+    assert response.status_code == 500
+    assert stored_chunk_ids('robots') == ['robots#0', 'robots#1']
+
+
+def test_chunked_upload_replaces_a_document_stored_whole(client, small_chunks):
+    client.post('/api/documents/upload', json={
+        'documents': ['Robots are fun. We build robots weekly.'], 'ids': ['robots'], 'chunk': False
+    })
+
+    client.post('/api/documents/upload', json={
+        'documents': ['Robots are fun. We build robots weekly.'], 'ids': ['robots'], 'skip_existing': False
+    })
+
+    assert sorted(chroma_service.collection.get(include=[])['ids']) == ['robots#0', 'robots#1']
+
+
+def test_upload_streams_progress(client, small_chunks):
+    response = client.post('/api/documents/upload', json={'documents': ['Robots are fun.'], 'stream': True})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert lines[-1] == {'status': 'skipped', 'items': []}
+
+
+def test_upload_stream_flag_false_returns_json(client, small_chunks):
+    response = client.post('/api/documents/upload', json={'documents': ['Robots are fun.'], 'stream': 'false'})
+
+    assert response.status_code == 201
+    assert response.mimetype == 'application/json'
+    assert response.json['status'] == 'success'
+
+
+def test_query_streams_matches(client, small_chunks):
+    client.post('/api/documents/upload', json={'documents': ['Robots are fun.'], 'ids': ['robots']})
+
+    response = client.post('/api/documents/query', json={'query': 'robots', 'stream': 'true'})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert [line['id'] for line in lines] == ['robots']
+
+
+def test_upload_validates_fields(client):
+    assert client.post('/api/documents/upload', json={'documents': []}).status_code == 400
+    assert client.post('/api/documents/upload', json={'documents': ['a'], 'ids': ['a', 'b']}).status_code == 400
+
+
+def test_query_requires_text(client):
+    assert client.post('/api/documents/query', json={'query': ' '}).status_code == 400
+
+
+def test_batch_query_answers_each_query_by_key(client, small_chunks):
+    client.post('/api/documents/upload', json={
+        'documents': ['Robots are fun.', 'Painting is calm.'],
+        'ids': ['robots', 'painting'],
+        'metadatas': [{'topic': 'science'}, {'topic': 'art'}]
+    })
+
+    response = client.post('/api/documents/query/batch', json={'queries': [
+        {'key': 'robots', 'query': 'robots', 'n_results': 1},
+        {'query': 'robots', 'n_results': 1, 'where': {'topic': 'art'}}
+    ]})
+
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [match['id'] for match in results['robots']['results']] == ['robots']
+    assert [match['id'] for match in results['1']['results']] == ['painting']
+
+
+def test_batch_query_validates_queries(client):
+    assert client.post('/api/documents/query/batch', json={'queries': []}).status_code == 400
+    assert client.post('/api/documents/query/batch', json={'queries': [
+        {'key': 'a', 'query': 'robots'}, {'key': 'a', 'query': 'painting'}
+    ]}).status_code == 400
+    assert client.post('/api/documents/query/batch', json={'queries': [
+        {'query': 'robots', 'n_results': 0}
+    ]}).status_code == 400
+
+
+def test_upload_skips_unchanged_and_duplicate_documents(client, small_chunks):
+    first = client.post('/api/documents/upload', json={'documents': ['Robots are fun.', 'Robots are fun.']})
+    second = client.post('/api/documents/upload', json={'documents': ['Robots are fun.', 'Painting is calm.']})
+
+    assert [item['reason'] for item in first.json['skipped']] == ['duplicate']
+    assert second.json['skipped'] == [{'id': first.json['parent_ids'][0], 'reason': 'unchanged'}]
+    assert len(chroma_service.collection.get(include=[])['ids']) == 2
+
+
+def test_upload_can_re_embed_unchanged_documents(client, small_chunks):
+    client.post('/api/documents/upload', json={'documents': ['Robots are fun.'], 'ids': ['robots']})
+
+    response = client.post('/api/documents/upload', json={
+        'documents': ['Robots are fun.'], 'ids': ['robots'], 'skip_existing': False
+    })
+
+    assert response.status_code == 201
+    assert response.json['skipped'] == []
+
+
+def test_upload_updates_metadata_of_unchanged_documents(client, small_chunks):
+    client.post('/api/documents/upload', json={
+        'documents': ['Robots are fun. We build robots weekly.'], 'ids': ['robots'],
+        'metadatas': [{'topic': 'science', 'level': 1}]
+    })
+
+    response = client.post('/api/documents/upload', json={
+        'documents': ['Robots are fun. We build robots weekly.'], 'ids': ['robots'],
+        'metadatas': [{'topic': 'engineering'}]
+    })
+
+    assert response.json['skipped'] == [{'id': 'robots', 'reason': 'metadata_updated'}]
+    stored = chroma_service.collection.get(where={'parent_id': 'robots'}, include=['metadatas'])
+    assert sorted((m['chunk_index'], m['topic'], 'level' in m) for m in stored['metadatas']) == [
+        (0, 'engineering', False), (1, 'engineering', False)
+    ]
+    matches = client.post('/api/documents/query', json={
+        'query': 'robots', 'where': {'topic': 'engineering'}
+    }).json['results']
+    assert [match['id'] for match in matches] == ['robots']
+
+
+def test_upload_without_metadata_keeps_the_stored_metadata(client):
+    client.post('/api/documents/upload', json={
+        'documents': ['Painting is calm.'], 'ids': ['painting'], 'metadatas': [{'topic': 'art'}], 'chunk': False
+    })
+
+    response = client.post('/api/documents/upload', json={
+        'documents': ['Painting is calm.'], 'ids': ['painting'], 'chunk': False
+    })
+
+    assert response.json['skipped'] == [{'id': 'painting', 'reason': 'unchanged'}]
+    assert chroma_service.get_metadatas(['painting'])['metadatas']['painting']['topic'] == 'art'
@@ -0,0 +1,15 @@
+"""Behaviour tests for the stream flag of streamed listings"""
+
+import pytest
+
+from app.streaming import JsonStream
+
+
+@pytest.mark.parametrize('value', [True, 1, 'true', 'TRUE', ' 1 ', 'yes', 'ndjson'])
+def test_stream_flag_is_set(value):
+    assert JsonStream.requested(value) is True
+
+
+@pytest.mark.parametrize('value', [None, False, 0, '', 'false', '0', 'no'])
+def test_stream_flag_is_not_set(value):
+    assert JsonStream.requested(value) is False
@@ -0,0 +1,204 @@
+"""Behaviour tests for the coalescing work queue"""
+
+import threading
+import time
+
+import pytest
+
+from app.worker.coalescing_queue import CoalescingWorkQueue
+
+
+def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not met in time")
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def queues():
+    """Create queues that are stopped after the test"""
+    created = []
+
+    def create(**kwargs):
+        queue = CoalescingWorkQueue('test', **kwargs)
+        created.append(queue)
+        return queue
+    yield create
+    for queue in created:
+        queue.stop(timeout=5)
+
+
+def test_pending_jobs_for_a_key_are_coalesced(queues):
+    queue = queues()
+    release = threading.Event()
+    handled = []
+
+    def handler(jobs):
+        release.wait(5)
+        handled.extend(jobs)
+    queue.register_handler('op', handler)
+
+    queue.enqueue('busy', 'op', 0)
+    wait_until(lambda: queue.status()['in_flight'] == 1)
+    queue.enqueue('key', 'op', 1)
+    queue.enqueue('key', 'op', 2)
+    release.set()
+    wait_until(lambda: queue.status()['processed'] == 2)
+
+    assert handled == [('busy', 0), ('key', 2)]
+    assert queue.status()['coalesced'] == 1
+
+
+def test_failed_jobs_are_retried_with_backoff(queues):
+    queue = queues(retry_delay=0.01)
+    attempts = []
+
+    def flaky(jobs):
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise RuntimeError('unavailable')
+    queue.register_handler('op', flaky)
+
+    queue.enqueue('key', 'op')
+    wait_until(lambda: queue.status()['processed'] == 1)
+
+    status = queue.status()
+    assert len(attempts) == 3
+    assert attempts[1] - attempts[0] >= 0.01 and attempts[2] - attempts[1] >= 0.02
+    assert (status['failed'], status['retrying'], status['last_error']) == (2, 0, 'unavailable')
+
+
+def test_newer_job_supersedes_a_waiting_retry(queues):
+    queue = queues(retry_delay=60)
+    handled = []
+
+    def handler(jobs):
+        handled.extend(jobs)
+        if jobs == [('key', 'old')]:
+            raise RuntimeError('unavailable')
+    queue.register_handler('op', handler)
+
+    queue.enqueue('key', 'op', 'old')
+    wait_until(lambda: queue.status()['retrying'] == 1)
+    queue.enqueue('key', 'op', 'new')
+    wait_until(lambda: queue.status()['processed'] == 1)
+
+    assert handled == [('key', 'old'), ('key', 'new')]
+    assert queue.status()['retrying'] == 0
+
+
+def test_jobs_out_of_retries_are_dead_lettered(tmp_path, queues):
+    outbox_path = str(tmp_path / 'outbox.db')
+    failing = queues(outbox_path=outbox_path, max_retries=1, retry_delay=0.01)
+    calls = []
+
+    def broken(jobs):
+        calls.append(jobs)
+        raise RuntimeError('unavailable')
+    failing.register_handler('op', broken)
+    failing.enqueue('key', 'op', 'payload')
+    wait_until(lambda: failing.status()['failed'] == 2 and failing.status()['in_flight'] == 0)
+    assert (failing.status()['retrying'], failing.status()['dead_letters']) == (0, 1)
+    failing.stop(timeout=5)
+
+    # A restart does not replay dead letters
+    replayed = []
+    restarted = queues(outbox_path=outbox_path)
+    restarted.register_handler('op', replayed.extend)
+    restarted.start()
+    assert restarted.status()['depth'] == 0 and restarted.status()['dead_letters'] == 1
+
+    assert restarted.retry_dead_letters() == 1
+    wait_until(lambda: restarted.status()['processed'] == 1)
+    assert len(calls) == 2
+    assert replayed == [('key', 'payload')]
+    assert restarted.status()['dead_letters'] == 0
+
+
+def test_dead_letters_without_outbox(queues):
+    queue = queues(max_retries=0)
+    attempts = []
+
+    def flaky(jobs):
+        attempts.extend(jobs)
+        if len(attempts) == 1:
+            raise RuntimeError('unavailable')
+    queue.register_handler('op', flaky)
+    queue.enqueue('key', 'op', 'payload')
+    wait_until(lambda: queue.status()['dead_letters'] == 1)
+
+    assert queue.retry_dead_letters() == 1
+    wait_until(lambda: queue.status()['processed'] == 1)
+    assert attempts == [('key', 'payload'), ('key', 'payload')]
+
+
+def test_processes_sharing_an_outbox_do_not_replay_each_others_jobs(tmp_path, queues):
+    outbox_path = str(tmp_path / 'outbox.db')
+    release = threading.Event()
+    first_handled, second_handled = [], []
+
+    def blocked(jobs):
+        release.wait(5)
+        first_handled.extend(jobs)
+    first = queues(outbox_path=outbox_path)
+    first.register_handler('op', blocked)
+    first.enqueue('busy', 'op', 0)
+    wait_until(lambda: first.status()['in_flight'] == 1)
+    first.enqueue('key', 'op', 1)
+
+    # A second worker process starting meanwhile leaves the leased rows alone
+    second = queues(outbox_path=outbox_path)
+    second.register_handler('op', second_handled.extend)
+    second.start()
+    assert second.status()['depth'] == 0
+
+    release.set()
+    wait_until(lambda: first.status()['processed'] == 2)
+    assert first_handled == [('busy', 0), ('key', 1)]
+    assert second_handled == []
+
+
+def test_job_replaced_by_another_process_is_skipped(tmp_path, queues):
+    outbox_path = str(tmp_path / 'outbox.db')
+    release = threading.Event()
+    first_handled, second_handled = [], []
+
+    def blocked(jobs):
+        release.wait(5)
+        first_handled.extend(jobs)
+    first = queues(outbox_path=outbox_path)
+    first.register_handler('op', blocked)
+    first.enqueue('busy', 'op', 0)
+    wait_until(lambda: first.status()['in_flight'] == 1)
+    first.enqueue('key', 'op', 'stale')
+
+    second = queues(outbox_path=outbox_path)
+    second.register_handler('op', second_handled.extend)
+    second.enqueue('key', 'op', 'fresh')
+    wait_until(lambda: second.status()['processed'] == 1)
+
+    release.set()
+    wait_until(lambda: first.status()['superseded'] == 1)
+    assert first_handled == [('busy', 0)]
+    assert second_handled == [('key', 'fresh')]
+
+
+def test_expired_leases_are_claimed_by_another_process(tmp_path, queues, monkeypatch):
+    outbox_path = str(tmp_path / 'outbox.db')
+    monkeypatch.setattr(CoalescingWorkQueue, 'LEASE_SECONDS', 0.05)
+    release = threading.Event()
+    # A worker that hangs on its first job, standing in for one that died
+    hung = queues(outbox_path=outbox_path)
+    hung.register_handler('op', lambda jobs: release.wait(5))
+    hung.enqueue('busy', 'op', 0)
+    wait_until(lambda: hung.status()['in_flight'] == 1)
+    hung.enqueue('key', 'op', 1)
+
+    handled = []
+    other = queues(outbox_path=outbox_path)
+    other.register_handler('op', handled.extend)
+    other.start()
+    wait_until(lambda: ('key', 1) in handled)
+    release.set()
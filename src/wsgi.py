@@ -0,0 +1,8 @@
+"""
+WSGI entry point for production servers.
+Run from the repository root: `gunicorn -c src/gunicorn.conf.py --pythonpath src wsgi:application`
+"""
+
+from app.main import create_app
+
+application = create_app()